@@ -1,7 +1,72 @@
+""" pylirious package
 
-from .pylirious import *
-from .setup_exe_paths import * 
-from . import filename
-from . import write_bpy
-from . import write_mmpy
+The functions of pylirious.pylirious and setup_exe_paths are available
+at the package level, as are the submodules. On Python 3.7+ they are
+loaded on first use (module __getattr__), so "import pylirious" doesn't
+pay for meshlabxml, NumPy or the script writers until they are needed.
+Python 3.6 and older import them up front; Python 2 (MeshMixer, for
+mmlirious) only imports filename.
 
+"from pylirious import *" gives the public names of pylirious.pylirious
+and setup_exe_paths and the submodules, except bpylirious and mmlirious,
+which only import inside Blender and MeshMixer.
+
+"""
+
+import sys
+
+# Submodules that can be reached as attributes of the package
+_SUBMODULES = ('aiolirious', 'bpylirious', 'bvh', 'components', 'convert', 'decimate',
+               'filename', 'mesh', 'mmlirious', 'mmsession', 'nplirious', 'obj', 'ply',
+               'pylirious', 'setup_exe_paths', 'stl', 'voxel', 'write_bpy', 'write_mmpy')
+
+# Submodules that only import inside their host application
+_HOST_MODULES = ('bpylirious', 'mmlirious')
+
+
+def _all(modules):
+    """ __all__: the submodules plus the names "import *" gives of modules """
+    names = set(_SUBMODULES) - set(_HOST_MODULES)
+    for module in modules:
+        names.update(getattr(module, '__all__',
+                             [name for name in vars(module) if not name.startswith('_')]))
+    return sorted(names)
+
+if sys.version_info < (3,):
+    # Only mmlirious runs on Python 2 (inside MeshMixer); the rest of the
+    # package is Python 3
+    from . import filename
+elif sys.version_info < (3, 7):
+    from .pylirious import *
+    from .setup_exe_paths import *
+    from . import filename
+    from . import write_bpy
+    from . import write_mmpy
+    __all__ = _all([sys.modules[__name__ + '.pylirious'],
+                    sys.modules[__name__ + '.setup_exe_paths']])
+else:
+    import importlib
+
+    def _load(module_name):
+        module = importlib.import_module('.' + module_name, __name__)
+        if module_name == 'setup_exe_paths':
+            # The setup_exe_paths function shadows its module, as with "import *"
+            globals()['setup_exe_paths'] = module.setup_exe_paths
+        return module
+
+    def __getattr__(name):
+        if name == '__all__':
+            globals()['__all__'] = _all([_load('pylirious'), _load('setup_exe_paths')])
+            return globals()['__all__']
+        if name in _SUBMODULES and name != 'setup_exe_paths':
+            return _load(name)
+        if not name.startswith('_'):
+            for module_name in ('pylirious', 'setup_exe_paths'):
+                module = _load(module_name)
+                if hasattr(module, name):
+                    globals()[name] = getattr(module, name)
+                    return globals()[name]
+        raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+
+    def __dir__():
+        return sorted(set(globals()) | set(_SUBMODULES))
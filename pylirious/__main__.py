@@ -0,0 +1,32 @@
+""" pylirious command line
+
+Usage:
+    python -m pylirious <command> [arguments]
+
+Commands:
+    convert     convert mesh files between STL, PLY and obj (see convert.py)
+
+"""
+
+import sys
+
+COMMANDS = ('convert',)
+
+
+def main(argv=None):
+    """Run a pylirious command"""
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv or argv[0] in ('-h', '--help'):
+        print(__doc__)
+        return 0
+    command = argv[0]
+    if command == 'convert':
+        from . import convert
+        return convert.main(argv[1:])
+    print('Error: unknown command "%s". Commands are: %s' % (
+        command, ', '.join(COMMANDS)))
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
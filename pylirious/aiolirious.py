@@ -0,0 +1,192 @@
+"""Asyncio functions to run external programs concurrently
+
+Native async counterparts of pylirious.blend, pylirious.render_scad and
+write_bpy.run, built on asyncio.create_subprocess_exec so that a single
+event loop can drive many Blender and OpenSCAD jobs at once.
+
+Each program has its own concurrency limit (see LIMITS and set_limit);
+jobs beyond the limit wait for a free slot. Cancelling a job kills the
+child process. Program output is streamed line by line into the log file,
+or printed if there is no log.
+
+Unlike the blocking versions, these functions never prompt the user on
+failure; they just return the program's return code.
+
+"""
+
+import os
+import sys
+import shlex
+import asyncio
+import weakref
+import platform
+
+from .pylirious import parse_module_function
+from . import write_bpy
+
+# Maximum number of simultaneous jobs per program
+LIMITS = {
+    'blender': os.cpu_count() or 1,
+    'openscad': os.cpu_count() or 1}
+
+# Semaphores per event loop (a semaphore is bound to the loop that first
+# waits on it): {loop: {program: semaphore}}
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def set_limit(program, limit):
+    """Set the maximum number of simultaneous jobs for a program.
+
+    Takes effect for jobs started after the call; jobs already waiting
+    keep the old limit.
+
+    Args:
+        program (str): one of the keys of LIMITS, e.g. 'blender'
+        limit (int): maximum number of simultaneous jobs
+    """
+    LIMITS[program] = limit
+    for loop_semaphores in _semaphores.values():
+        loop_semaphores.pop(program, None)
+    return None
+
+
+def _semaphore(program):
+    """Return the semaphore limiting concurrent jobs of program in the
+    running event loop"""
+    loop_semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    if program not in loop_semaphores:
+        loop_semaphores[program] = asyncio.Semaphore(LIMITS.get(program, 1))
+    return loop_semaphores[program]
+
+
+def _log_write(log, text):
+    """Append text to the log file, or print it if there is no log"""
+    if log is not None:
+        log_file = open(log, 'a')
+        log_file.write(text)
+        log_file.close()
+    else:
+        print(text, end='')
+    return None
+
+
+async def _stream(reader, log):
+    """Copy a subprocess output stream into the log line by line"""
+    if log is not None:
+        log_file = open(log, 'a')
+    else:
+        log_file = sys.stdout
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            log_file.write(line.decode(errors='replace'))
+            log_file.flush()
+    finally:
+        if log is not None:
+            log_file.close()
+    return None
+
+
+async def run(cmd, program='blender', log=None):
+    """Run a program asynchronously and stream its output to the log.
+
+    Waits for a free slot of the program's concurrency limit first.
+    If the job is cancelled the child process is killed.
+
+    Args:
+        cmd (list): the program and its arguments
+        program (str): program name; selects the concurrency limit and
+            is used in the log headers
+        log (str): filename of the log file (optional). Concurrent jobs
+            writing to the same log will have their lines interleaved.
+
+    Returns:
+        return_code (int): the program return code
+    """
+    async with _semaphore(program):
+        _log_write(log, 'cmd = %s\n***START OF %s STDOUT & STDERR***\n' % (
+            ' '.join(cmd), program.upper()))
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT)
+        try:
+            await _stream(proc.stdout, log)
+            return_code = await proc.wait()
+        except BaseException as error:
+            # Don't leave the child running, whatever went wrong
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            reason = 'job cancelled' if isinstance(error, asyncio.CancelledError) else \
+                '%s: %s' % (type(error).__name__, error)
+            _log_write(log, '***%s KILLED: %s***\n\n' % (program.upper(), reason))
+            raise
+        _log_write(log, '***END OF %s STDOUT & STDERR***\n%s return code = %s\n\n' % (
+            program.upper(), program, return_code))
+    return return_code
+
+
+async def blend(module_function=None, log=None, module_path=None, cmd=None):
+    """Async version of pylirious.blend.
+
+    Args:
+        module_function (str): the module, function and parameters you want to  run.
+            example: 'bpylirious.boolean(source, operation, target, output)'
+        module_path (str): full path to the module. If omitted it will use the
+            path of the pylirious package.
+        log (str): filename of the log file (optional)
+        cmd (list): a full command to run with blender. This will override
+            module_function and module_path.
+
+    Returns:
+        return_code (int): the blender return code
+    """
+    if cmd is None:
+        if module_function is None:
+            raise ValueError('you must provide a python function')
+        module_full, function, parameters = parse_module_function(
+            module_function, module_path)
+        cmd = ['blender', '--background', '--factory-startup', '--python',
+               module_full, '--', '-f', function, '-p'] + shlex.split(parameters)
+    return await run(cmd, program='blender', log=log)
+
+
+async def run_bpy(script='TEMP3D_blender_default.py', log=None):
+    """Async version of write_bpy.run; run Blender and execute script."""
+    write_bpy.flush_transforms(script)
+    cmd = ['blender', '--background', '--factory-startup', '--python', script]
+    return await run(cmd, program='blender', log=log)
+
+
+async def render_scad(script=None, log=None, file_out=None, constants=None):
+    """Async version of pylirious.render_scad.
+
+    file_out (str): output filename. Default is "<script name>.stl".
+    constants (dict): dictionary of variable:value pairs to override with
+        constants (uses -D switch)
+
+    Returns:
+        return_code (int): the openscad return code
+    """
+    if platform.system() == 'Windows':
+        cmd = ['openscad.com']
+    else:
+        cmd = ['openscad']
+    if file_out is None:
+        file_out = '%s.stl' % os.path.splitext(script)[0]
+    cmd += ['-o', file_out]
+    log_text = '//OpenSCAD constants for %s\n\n' % script
+    if constants is not None:
+        for key, value in constants.items():
+            if isinstance(value, str):
+                cmd += ['-D', '%s="%s"' % (key, value)]
+                log_text += '%s="%s";\n' % (key, value)
+            else:
+                cmd += ['-D', '%s=%s' % (key, value)]
+                log_text += '%s=%s;\n' % (key, value)
+    cmd.append(script)
+    if log is not None:
+        _log_write(log, log_text + '\n\n')
+    return await run(cmd, program='openscad', log=log)
@@ -11,11 +11,12 @@ import sys
 import argparse
 import inspect
 import math
+import time
 
 # Blender modules
 import bpy
 import bmesh
-from mathutils import Vector
+from mathutils import Vector, Matrix
 
 # http://blender.stackexchange.com/questions/58202/how-can-i-import-an-addon-into-a-blender-script
 import addon_utils
@@ -25,6 +26,53 @@ from . import filename
 
 # TODO: add baking functions, bake texture to texture, vertex colors to texture
 
+# Operator calls skipped by select_only and set_mode because the state was
+# already right; see operator_stats
+_skipped = {'select': 0, 'mode_set': 0}
+
+
+def select_only(mesh_object):
+    """ Select only mesh_object and make it active
+
+    Skips the operators if it is already the only selected object and the
+    active object.
+
+    """
+    scene = bpy.context.scene
+    if (scene.objects.active == mesh_object and mesh_object.select and
+            len(bpy.context.selected_objects) == 1):
+        _skipped['select'] += 1
+        return None
+    bpy.ops.object.select_all(action='DESELECT')
+    mesh_object.select = True
+    scene.objects.active = mesh_object
+    return None
+
+
+def set_mode(mode='OBJECT'):
+    """ Switch the active object to mode ('OBJECT' or 'EDIT')
+
+    Skips mode_set if the object is already in that mode; each real switch
+    copies the whole mesh between the object and edit mode data.
+
+    """
+    active = bpy.context.scene.objects.active
+    if active is not None and active.mode == mode:
+        _skipped['mode_set'] += 1
+        return None
+    bpy.ops.object.mode_set(mode=mode)
+    return None
+
+
+def operator_stats(reset=False):
+    """ Number of select and mode_set operator calls skipped so far """
+    stats = dict(_skipped)
+    if reset:
+        _skipped['select'] = 0
+        _skipped['mode_set'] = 0
+    return stats
+
+
 def begin():
     """Start of new Blender script; set the scene and clear existing objects"""
     scene = bpy.context.scene
@@ -35,7 +83,13 @@ def begin():
     return None
 
 
-def import_mesh(file_in=None):
+def import_mesh(file_in=None, fast=False):
+    """ Import a STL, obj or PLY mesh using the filename "up" metadata
+
+    fast: use import_mesh_fast instead of the import operators
+    """
+    if fast:
+        return import_mesh_fast(file_in)
     _, _, up_meta, fext = filename.parse(file_in)
 
     if up_meta is not None:
@@ -96,23 +150,86 @@ def import_mesh(file_in=None):
     # Deselect all in edit mode
     # Object must be active to switch into edit mode
     bpy.context.scene.objects.active = mesh_object
-    bpy.ops.object.mode_set(mode='EDIT')
+    set_mode('EDIT')
     bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.mode_set(mode='OBJECT')
+    set_mode('OBJECT')
 
     return mesh_object
 
 
-def export_mesh(mesh_object=None, file_out=None, texture=None, triangulate=True):
+def import_mesh_fast(file_in=None):
+    """ Import a STL, obj or PLY mesh from NumPy arrays
+
+    The file is parsed outside Blender with the pylirious readers (see
+    convert.read) and the mesh is built in bulk with foreach_set, which is
+    much faster than the import operators on large scans. The "up"
+    direction is handled the same as import_mesh, STL vertices are welded,
+    and uvs and vertex colors are kept. Unlike the obj operator, an obj file
+    is always imported as a single object.
+
+    """
+    import numpy as np
+    from . import convert
+    from . import obj
+
+    fprefix, _, _, fext = filename.parse(os.path.basename(file_in))
+    if fext == 'obj':
+        data = obj.read(file_in)
+    elif fext in ('stl', 'ply'):
+        data = convert.read(file_in)
+    else:
+        print('Error: filetype "%s" is not supported. Exiting ...' % fext)
+        sys.exit(1)
+    up = convert.up_direction(os.path.basename(file_in))
+    vertices = np.dot(data['vertices'], convert.up_matrix(up, 'Z').T)
+    faces = data['faces']
+    num_faces = len(faces)
+
+    mesh = bpy.data.meshes.new(fprefix)
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set('co', vertices.astype(np.float32).ravel())
+    mesh.loops.add(num_faces * 3)
+    mesh.loops.foreach_set('vertex_index', faces.astype(np.int32).ravel())
+    mesh.polygons.add(num_faces)
+    mesh.polygons.foreach_set('loop_start', np.arange(0, num_faces * 3, 3, dtype=np.int32))
+    mesh.polygons.foreach_set('loop_total', np.full(num_faces, 3, dtype=np.int32))
+
+    uvs = data.get('uvs')
+    if uvs is not None and len(uvs):
+        face_uvs = data.get('face_uvs')
+        if face_uvs is None:
+            face_uvs = faces
+        # Corners without uvs (-1) get the first uv
+        face_uvs = np.maximum(face_uvs, 0)
+        mesh.uv_textures.new()
+        mesh.uv_layers[-1].data.foreach_set(
+            'uv', uvs[face_uvs][:, :, :2].astype(np.float32).ravel())
+    colors = data.get('colors')
+    if colors is not None and len(colors) == len(vertices):
+        if colors.dtype.kind != 'f':
+            colors = colors / 255.0
+        mesh.vertex_colors.new()
+        mesh.vertex_colors[-1].data.foreach_set(
+            'color', colors[faces][:, :, :3].astype(np.float32).ravel())
+
+    mesh.validate()
+    mesh.update(calc_edges=True)
+    mesh_object = bpy.data.objects.new(fprefix, mesh)
+    bpy.context.scene.objects.link(mesh_object)
+    select_only(mesh_object)
+    return mesh_object
+
+
+def export_mesh(mesh_object=None, file_out=None, texture=None, triangulate=True,
+                fast=False):
     """
 
     blend: saves as blend file, all other options are ignored
+    fast: write STL and PLY files with export_mesh_fast
     """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    if fast and file_out.lower().endswith(('.stl', '.ply')):
+        return export_mesh_fast(mesh_object, file_out, texture)
+    select_only(mesh_object)
 
     _, _, up_meta, fext = filename.parse(file_out)
     return_code = 0
@@ -174,23 +291,25 @@ def export_mesh(mesh_object=None, file_out=None, texture=None, triangulate=True)
         if texture is None:
             texture = False
         if triangulate:
-            # TODO: this will triangulate the source mesh, which may not be what you want.
-            # Should duplicate the mesh first.
-            bpy.ops.object.mode_set(mode='EDIT')
-            bpy.ops.mesh.select_all(action='SELECT')
-            bpy.ops.mesh.quads_convert_to_tris(
-                quad_method='BEAUTY', ngon_method='BEAUTY')
-            bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.export_mesh.ply(
-            filepath=file_out,
-            check_existing=True,
-            axis_forward=fwd,
-            axis_up=up,
-            use_mesh_modifiers=True,
-            use_normals=True,
-            use_uv_coords=texture,
-            use_colors=True,
-            global_scale=1.0)
+            # Triangulate with a temporary modifier so the source mesh is
+            # left alone (the exporter applies modifiers)
+            modifier = mesh_object.modifiers.new('export_triangulate', 'TRIANGULATE')
+            modifier.quad_method = 'BEAUTY'
+            modifier.ngon_method = 'BEAUTY'
+        try:
+            bpy.ops.export_mesh.ply(
+                filepath=file_out,
+                check_existing=True,
+                axis_forward=fwd,
+                axis_up=up,
+                use_mesh_modifiers=True,
+                use_normals=True,
+                use_uv_coords=texture,
+                use_colors=True,
+                global_scale=1.0)
+        finally:
+            if triangulate:
+                mesh_object.modifiers.remove(modifier)
     elif fext == 'blend':
         bpy.ops.wm.save_as_mainfile(
             filepath=file_out,
@@ -207,6 +326,96 @@ def export_mesh(mesh_object=None, file_out=None, texture=None, triangulate=True)
     return return_code
 
 
+def export_mesh_fast(mesh_object=None, file_out=None, texture=None):
+    """ Write a binary STL or PLY file straight from the mesh arrays
+
+    The mesh with modifiers applied is read with foreach_get, fan
+    triangulated with NumPy (Blender 2.7x has no loop_triangles) and
+    written with stl.write or ply.write. The object is not changed and edit
+    mode is not used. The "up" direction is handled the same as
+    export_mesh. PLY files get vertex normals and colors, and uvs if
+    texture is True; vertices are split where the uvs or colors of their
+    corners differ.
+
+    """
+    import numpy as np
+    from . import convert
+    from . import ply
+    from . import stl
+
+    _, _, _, fext = filename.parse(os.path.basename(file_out))
+    up = convert.up_direction(os.path.basename(file_out), default=convert.UP_OUT)
+    mesh = mesh_object.to_mesh(bpy.context.scene, True, 'PREVIEW')
+    try:
+        num_verts = len(mesh.vertices)
+        num_loops = len(mesh.loops)
+        num_polys = len(mesh.polygons)
+        vertices = np.empty(num_verts * 3, dtype=np.float32)
+        mesh.vertices.foreach_get('co', vertices)
+        loop_verts = np.empty(num_loops, dtype=np.int32)
+        mesh.loops.foreach_get('vertex_index', loop_verts)
+        loop_start = np.empty(num_polys, dtype=np.int32)
+        mesh.polygons.foreach_get('loop_start', loop_start)
+        loop_total = np.empty(num_polys, dtype=np.int32)
+        mesh.polygons.foreach_get('loop_total', loop_total)
+
+        # Fan triangulate: loops (start, start + j, start + j + 1)
+        tri_counts = loop_total - 2
+        starts = np.repeat(loop_start, tri_counts)
+        fan = np.arange(len(starts)) - np.repeat(np.cumsum(tri_counts) - tri_counts, tri_counts)
+        tri_loops = np.stack((starts, starts + fan + 1, starts + fan + 2), axis=1)
+
+        # World coordinates, rotated to the file "up" direction
+        matrix = np.array(mesh_object.matrix_world, dtype=np.float64)
+        rotation = convert.up_matrix('Z', up)
+        vertices = vertices.reshape(-1, 3)
+        vertices = np.dot(vertices, matrix[:3, :3].T) + matrix[:3, 3]
+        vertices = np.dot(vertices, rotation.T)
+
+        if fext == 'stl':
+            stl.write(file_out, vertices, loop_verts[tri_loops])
+        else:
+            normals = np.empty(num_verts * 3, dtype=np.float32)
+            mesh.vertices.foreach_get('normal', normals)
+            normal_matrix = np.linalg.inv(matrix[:3, :3]).T
+            normals = np.dot(np.dot(normals.reshape(-1, 3), normal_matrix.T), rotation.T)
+            length = np.linalg.norm(normals, axis=1)
+            length[length == 0] = 1.0
+            normals /= length[:, None]
+            # Per corner attributes; split vertices where they differ
+            # (the vertex index bits are viewed as float32 so large indices stay exact)
+            corners = [loop_verts[:, None].view(np.float32)]
+            colors = uvs = None
+            if len(mesh.vertex_colors):
+                colors = np.empty(num_loops * 3, dtype=np.float32)
+                mesh.vertex_colors.active.data.foreach_get('color', colors)
+                colors = colors.reshape(-1, 3)
+                corners.append(colors)
+            if texture and len(mesh.uv_layers):
+                uvs = np.empty(num_loops * 2, dtype=np.float32)
+                mesh.uv_layers.active.data.foreach_get('uv', uvs)
+                uvs = uvs.reshape(-1, 2)
+                corners.append(uvs)
+            corners = np.ascontiguousarray(np.concatenate(corners, axis=1))
+            keys = corners.view(np.dtype((np.void, corners.dtype.itemsize *
+                                          corners.shape[1]))).ravel()
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            split_verts = loop_verts[first]
+            if colors is not None:
+                colors = np.clip(colors[first] * 255.0 + 0.5, 0, 255).astype(np.uint8)
+            if uvs is not None:
+                uvs = uvs[first]
+            ply.write(file_out, vertices[split_verts], inverse.ravel()[tri_loops],
+                      normals=normals[split_verts], colors=colors, uvs=uvs)
+    finally:
+        bpy.data.meshes.remove(mesh)
+
+    if not os.path.isfile(file_out):
+        print('Error: output file was not created')
+        return 1
+    return 0
+
+
 def duplicate_mesh(mesh_object):
     """ Duplicate mesh object
     
@@ -218,11 +427,7 @@ def duplicate_mesh(mesh_object):
     e.g. duplicating, dropping colors, then duplicating again.
     Workaround is to duplicate the original multiple times.
     """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     bpy.ops.object.duplicate(linked=False, mode="TRANSLATION")
     #bpy.ops.object.duplicate()
@@ -235,11 +440,7 @@ def duplicate_mesh(mesh_object):
 
 def rotate(mesh_object=None, axis='z', angle=0.0, apply=True):
     """ Rotate object """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     angle = math.radians(angle)
     if axis.lower() == 'x':
@@ -259,11 +460,7 @@ def rotate(mesh_object=None, axis='z', angle=0.0, apply=True):
 
 def translate(mesh_object=None, value=(0.0, 0.0, 0.0), apply=True):
     """ translate object """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     mesh_object.location += Vector(value)
 
@@ -274,11 +471,7 @@ def translate(mesh_object=None, value=(0.0, 0.0, 0.0), apply=True):
 
 def scale(mesh_object=None, value=(0.0, 0.0, 0.0), apply=True):
     """ scale object """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     mesh_object.scale = Vector(value)
 
@@ -287,6 +480,41 @@ def scale(mesh_object=None, value=(0.0, 0.0, 0.0), apply=True):
     return None
 
 
+def rotation_matrix(axis='z', angle=0.0):
+    """ 4x4 matrix rotating angle degrees about axis """
+    if axis.lower() not in ('x', 'y', 'z'):
+        print('Axis name is not valid; exiting ...')
+        sys.exit(1)
+    return Matrix.Rotation(math.radians(angle), 4, axis.upper())
+
+
+def translation_matrix(value=(0.0, 0.0, 0.0)):
+    """ 4x4 matrix translating by value """
+    return Matrix.Translation(Vector(value))
+
+
+def scale_matrix(value=(0.0, 0.0, 0.0)):
+    """ 4x4 matrix scaling by value along each axis """
+    matrix = Matrix.Identity(4)
+    for i in range(3):
+        matrix[i][i] = value[i]
+    return matrix
+
+
+def transform(mesh_object=None, matrix=None):
+    """ Transform the mesh data by a 4x4 matrix in one pass
+
+    Same result as rotate, translate or scale with apply=True (for an
+    object with no unapplied transforms), but the vertices are only
+    rewritten once, however many transforms are multiplied into matrix,
+    and the selection and active object are left alone.
+
+    """
+    mesh_object.data.transform(matrix)
+    mesh_object.data.update()
+    return None
+
+
 def join(objects=None):
     """ Join selected objects into first object. Objects must be iterable (list, tuple, etc.) """
     # Deselect All
@@ -314,14 +542,10 @@ def separate(mesh_object):
         list: list of the separated objects
 
     """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     # Switch to edit mode
-    bpy.ops.object.mode_set(mode='EDIT')
+    set_mode('EDIT')
 
     # List of all the mesh objects in the session before separating
     meshes_old = [obj for obj in bpy.data.objects if obj.type == 'MESH']
@@ -336,7 +560,7 @@ def separate(mesh_object):
         meshes_new.remove(i)
 
     # Switch to object mode
-    bpy.ops.object.mode_set(mode='OBJECT')
+    set_mode('OBJECT')
     return meshes_new
 
 
@@ -349,14 +573,10 @@ def plane_cut(mesh_object=None, axis='z', offset=0.0, direction=1,
     End mode: OBJECT
 
     """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     # Switch to edit mode
-    bpy.ops.object.mode_set(mode='EDIT')
+    set_mode('EDIT')
 
     if axis.lower() == 'x':
         plane_co = (offset, 0.0, 0.0)
@@ -404,24 +624,20 @@ def plane_cut(mesh_object=None, axis='z', offset=0.0, direction=1,
                 quad_method='BEAUTY', ngon_method='BEAUTY')
 
     # Switch to object mode
-    bpy.ops.object.mode_set(mode='OBJECT')
+    set_mode('OBJECT')
     return None
 
 
 def select_plane(mesh_object=None, axis='z', offset=0.0,
                  threshold=0.00001, method='FACE', clear_selection=False):
     """ Select all the vertices or faces along a plane """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     # Clear any existing selections
     if clear_selection:
-        bpy.ops.object.mode_set(mode='EDIT')
+        set_mode('EDIT')
         bpy.ops.mesh.select_all(action='DESELECT')
-        bpy.ops.object.mode_set(mode='OBJECT')
+        set_mode('OBJECT')
 
     # Get a BMesh representation
     bm = bmesh.new()
@@ -448,7 +664,7 @@ def select_plane(mesh_object=None, axis='z', offset=0.0,
     bm.free()
 
     # Switch to edit mode to view selection
-    bpy.ops.object.mode_set(mode='EDIT')
+    set_mode('EDIT')
 
     # Change to vertex selection mode to ensure that vertices are selected
     bpy.ops.mesh.select_mode(type='VERT')
@@ -469,17 +685,13 @@ def spherical_select(mesh_object=None, center=(0.0, 0.0, 0.0),
     At the end, will be in edit mode with the faces or vertices selected.
     """
     center = Vector(center)
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     # Clear any exisitng selections
     if clear_selection:
-        bpy.ops.object.mode_set(mode='EDIT')
+        set_mode('EDIT')
         bpy.ops.mesh.select_all(action='DESELECT')
-        bpy.ops.object.mode_set(mode='OBJECT')
+        set_mode('OBJECT')
 
     # Get a BMesh representation
     bm = bmesh.new()
@@ -501,7 +713,7 @@ def spherical_select(mesh_object=None, center=(0.0, 0.0, 0.0),
     bm.free()
 
     # Switch to edit mode to view selection
-    bpy.ops.object.mode_set(mode='EDIT')
+    set_mode('EDIT')
 
     if method == 'FACE':
         # Change to face select mode
@@ -534,7 +746,7 @@ def extrude_bottom(mesh_object=None, threshold=0.00001, distance=6, angle=1, cle
             "constraint_orientation": "GLOBAL"})
 
     # Switch to object mode
-    bpy.ops.object.mode_set(mode='OBJECT')
+    set_mode('OBJECT')
     return None
 
 
@@ -555,7 +767,7 @@ def extrude_plane(mesh_object=None, center=(0.0, 0.0, 0.0),
             "constraint_orientation": 'GLOBAL'})
 
     # Switch to OBJECT mode
-    bpy.ops.object.mode_set(mode='OBJECT')
+    set_mode('OBJECT')
     return None
 
 
@@ -574,11 +786,7 @@ def tex2vc(mesh_object, alpha_color=(0, 0, 0), replace_active_layer=True,
     mirror_y (bool)
     del_tex (bool): delete texture and material after conversion
     """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     """
     # http://blender.stackexchange.com/questions/15638/how-to-distinguish-between-addon-is-not-installed-and-addon-is-not-enabled
@@ -612,11 +820,7 @@ def tex2vc(mesh_object, alpha_color=(0, 0, 0), replace_active_layer=True,
 
 def remove_vert_color(mesh_object=None):
     """ Drop vertex colors from mesh """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     bpy.ops.mesh.vertex_color_remove()
     return None
@@ -626,11 +830,7 @@ def remove_tex_color(mesh_object=None):
     """Unlink images, textures, UV maps and materials from source object
 
     """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     # Remove images
     for texlay in mesh_object.data.uv_textures:
@@ -653,21 +853,17 @@ def create_tex_mat(mesh_object=None, image_file=None,
                    tex_name='texture_0', mat_name='material_0'):
     """ Create texture and material for mesh object.
 
-    Presumes that UV map and image file already exist
+    Presumes that the image file already exists. The image is assigned to
+    the faces of the active UV map; an empty UV map is created (with a
+    warning) if the mesh has none.
     """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
-
-    bpy.ops.object.mode_set(mode='EDIT')
+    select_only(mesh_object)
 
     # Create image texture from image.
     tex = bpy.data.textures.new(tex_name, type="IMAGE")
 
     # Note: this needs to be the full path to the file
-    tex.image = bpy.data.images.load(image_file)
+    tex.image = bpy.data.images.load(image_file, check_existing=True)
 
     # Create Material
     mat = bpy.data.materials.new(mat_name)
@@ -678,13 +874,18 @@ def create_tex_mat(mesh_object=None, image_file=None,
     mtex.use_map_color_diffuse = True
     mesh_object.data.materials.append(mat)
 
-    # Set image in UV Editing window
-    bpy.data.screens["UV Editing"].areas[1].spaces[0].image = tex.image
+    # Assign the image to the faces of the active UV map (what the UV editor
+    # would do), through the data so no UI is needed
+    uv_texture = mesh_object.data.uv_textures.active
+    if uv_texture is None:
+        print('Warning: %s has no UV map; creating an empty one for %s'
+              % (mesh_object.name, image_file))
+        uv_texture = mesh_object.data.uv_textures.new()
+    for face in uv_texture.data:
+        face.image = tex.image
 
     # This is not needed. Not sure under what circumstances it would be needed.
     # bpy.context.object.active_material.texture_slots[0].uv_layer = "UVMap"
-
-    bpy.ops.object.mode_set(mode="OBJECT")
     return
 
 
@@ -692,58 +893,144 @@ def uv_smart_project(mesh_object=None, angle_limit=66.0,
                      island_margin=0.0, user_area_weight=0.0,
                      use_aspect=True, stretch_to_bounds=True):
     """ UV map the selected mesh using smart project"""
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
-    bpy.ops.object.mode_set(mode='EDIT')
+    set_mode('EDIT')
     bpy.ops.mesh.select_all(action='SELECT')
     bpy.ops.uv.smart_project(angle_limit=angle_limit, island_margin=island_margin, user_area_weight=user_area_weight, use_aspect=use_aspect, stretch_to_bounds=stretch_to_bounds)
-    bpy.ops.object.mode_set(mode="OBJECT")
+    set_mode('OBJECT')
     return None
 
 
+def _view3d_context():
+    """ Context override for the first 3D view, or None without a UI
+    (--background mode) """
+    screen = bpy.context.screen
+    if bpy.app.background or screen is None:
+        return None
+    for area in screen.areas:
+        if area.type == "VIEW_3D":
+            break
+    else:
+        return None
+    for region in area.regions:
+        if region.type == "WINDOW":
+            break
+    context = bpy.context.copy()
+    context['area'] = area
+    context['region'] = region
+    context['space_data'] = area.spaces[0]
+    return context
+
+
+def view_matrix(view='TOP'):
+    """ World to view rotation (3x3 Matrix) of a numpad view
+
+    view (enum in ['LEFT', 'RIGHT', 'BOTTOM', 'TOP', 'FRONT', 'BACK', 'CAMERA'])
+        CAMERA uses the scene camera
+
+    """
+    if view == 'CAMERA':
+        return bpy.context.scene.camera.matrix_world.inverted().to_3x3()
+    from . import nplirious
+    return Matrix(nplirious.view_matrix(view).tolist())
+
+
 def rotate_view(view='TOP', perspective='ORTHO'):
     """ Rotate to a numpad view
 
     view (enum in ['LEFT', 'RIGHT', 'BOTTOM', 'TOP', 'FRONT', 'BACK', 'CAMERA'])
     perspective (enum in ['ORTHO', 'PERSP']): perspective/orthographic projection
 
-    http://blender.stackexchange.com/questions/34488/view3d-operations-problem
+    The view rotation is set directly from view_matrix rather than with the
+    viewnumpad operator, which had to be run twice to not project at an
+    intermediate (smooth view) rotation.
+
+    Returns the context override for the 3D view, or None if there is no
+    3D view (--background mode); use uv_project_native then.
     """
-    # Need to set correct context to modify 3D View
-    for area in bpy.context.screen.areas:
-        if area.type == "VIEW_3D":
-            break
+    context = _view3d_context()
+    if context is None:
+        return None
+    region_3d = context['space_data'].region_3d
+    if view == 'CAMERA':
+        region_3d.view_perspective = 'CAMERA'
+    else:
+        region_3d.view_perspective = perspective
+        region_3d.view_rotation = view_matrix(view).transposed().to_quaternion()
+    return context
 
-    for region in area.regions:
-        if region.type == "WINDOW":
-            break
 
-    space = area.spaces[0]
+def uv_project_native(mesh_object=None, method='VIEW', view='TOP', selected_only=False,
+                      **kwargs):
+    """ Project the uvs of all faces without a 3D view
 
-    context = bpy.context.copy()
-    context['area'] = area
-    context['region'] = region
-    context['space_data'] = space
+    Reads the vertices and loops in bulk, projects them with
+    nplirious.project_uvs and writes the active uv layer (created if
+    needed) with foreach_set, so it also works in --background mode.
 
-    space.region_3d.view_perspective = perspective
+    If mesh_object is None, project the selected faces of the active
+    object (in EDIT mode).
 
-    # This needs to be run twice, otherwise the projection will happen
-    # at some intermediate rotation point.
-    # I'm not sure why this is.
-    # Adding a time delay after this command has no impact on this
-    # I'm also not sure what the 'EXEC_DEFAULT' argument does, or if it's really needed
-    bpy.ops.view3d.viewnumpad(context, 'EXEC_DEFAULT', type=view)
-    bpy.ops.view3d.viewnumpad(context, 'EXEC_DEFAULT', type=view)
+    method (enum in ['VIEW', 'CYLINDER', 'SPHERE'])
+    view (enum in ['LEFT', 'RIGHT', 'BOTTOM', 'TOP', 'FRONT', 'BACK', 'CAMERA'])
+        relative to the world, like the numpad views (see view_matrix); or
+        a world to view Matrix
+    selected_only (bool): only project the selected faces
+    kwargs: see nplirious.project_uvs
+
+    """
+    edit_mode = mesh_object is None
+    if edit_mode:
+        mesh_object = bpy.context.scene.objects.active
+        selected_only = True
+        # Write the edit mesh (and its selection) to the mesh data
+        set_mode('OBJECT')
+    try:
+        _project_uvs_native(mesh_object, method, view, selected_only, **kwargs)
+    finally:
+        if edit_mode:
+            set_mode('EDIT')
+    return None
 
-    return context
+
+def _project_uvs_native(mesh_object, method, view, selected_only, **kwargs):
+    """ uv_project_native in OBJECT mode """
+    import numpy as np
+    from . import nplirious
+
+    mesh = mesh_object.data
+    vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', vertices)
+    loop_verts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loop_verts)
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+    loop_faces = np.repeat(np.arange(len(loop_totals)), loop_totals)
+    if selected_only:
+        selected = np.empty(len(mesh.polygons), dtype=bool)
+        mesh.polygons.foreach_get('select', selected)
+        loops = np.flatnonzero(selected[loop_faces])
+    else:
+        loops = np.arange(len(loop_verts))
+
+    if isinstance(view, str):
+        view = view_matrix(view)
+    rotation = view * mesh_object.matrix_world.to_3x3()
+    if not mesh.uv_layers:
+        mesh.uv_textures.new()
+    uvs = np.zeros(len(loop_verts) * 2, dtype=np.float32)
+    mesh.uv_layers.active.data.foreach_get('uv', uvs)
+    uvs = uvs.reshape(-1, 2)
+    uvs[loops] = nplirious.project_uvs(
+        vertices.reshape(-1, 3), loop_verts[loops], loop_faces[loops], method=method,
+        view=np.array(rotation), **kwargs)
+    mesh.uv_layers.active.data.foreach_set('uv', uvs.ravel())
+    mesh.update()
 
 
 def uv_project_from_view(mesh_object=None, view='TOP', perspective='ORTHO', camera_bounds=False,
-                         correct_aspect=True, scale_to_bounds=True):
+                         correct_aspect=True, scale_to_bounds=True, native=False):
     """
     If mesh_object is not None, then assume we're starting in OBJECT mode and will select all
     vertices of the mesh object.
@@ -753,29 +1040,34 @@ def uv_project_from_view(mesh_object=None, view='TOP', perspective='ORTHO', came
 
     view (enum in ['LEFT', 'RIGHT', 'BOTTOM', 'TOP', 'FRONT', 'BACK', 'CAMERA'])
     perspective (enum in ['ORTHO', 'PERSP']): perspective/orthographic projection
+    native (bool): project orthographically with uv_project_native instead
+        of the operator. Always used when there is no 3D view
+        (--background mode).
 
     """
+    context = None if native else rotate_view(view=view, perspective=perspective)
+    if context is None:
+        if perspective != 'ORTHO' or camera_bounds:
+            raise ValueError('native projection is orthographic without camera_bounds')
+        return uv_project_native(mesh_object, method='VIEW', view=view,
+                                 correct_aspect=correct_aspect,
+                                 scale_to_bounds=scale_to_bounds)
     if mesh_object is not None:
-        # Deselect All
-        bpy.ops.object.select_all(action='DESELECT')
-        # Select Source and make active
-        mesh_object.select = True
-        bpy.context.scene.objects.active = mesh_object
+        select_only(mesh_object)
 
-        bpy.ops.object.mode_set(mode='EDIT')
+        set_mode('EDIT')
         bpy.ops.mesh.select_all(action='SELECT')
 
-    context = rotate_view(view=view, perspective=perspective)
     bpy.ops.uv.project_from_view(context, 'EXEC_DEFAULT', camera_bounds=camera_bounds, correct_aspect=correct_aspect, scale_to_bounds=scale_to_bounds)
 
     if mesh_object is not None:
-        bpy.ops.object.mode_set(mode="OBJECT")
+        set_mode('OBJECT')
     return None
 
 
 def uv_cylinder_project(mesh_object=None, view=None, direction='VIEW_ON_EQUATOR',
     align='POLAR_ZX', radius=1.0, correct_aspect=True, clip_to_bounds=False,
-    scale_to_bounds=True):
+    scale_to_bounds=True, native=False):
     """ Project the UV vertices of the mesh over the curved wall of a cylinder
 
     view (enum in ['LEFT', 'RIGHT', 'BOTTOM', 'TOP', 'FRONT', 'BACK', 'CAMERA'])
@@ -796,40 +1088,36 @@ def uv_cylinder_project(mesh_object=None, view=None, direction='VIEW_ON_EQUATOR'
     correct_aspect (boolean, (optional)) – Correct Aspect, Map UVs taking image aspect ratio into account
     clip_to_bounds (boolean, (optional)) – Clip to Bounds, Clip UV coordinates to bounds after unwrapping
     scale_to_bounds (boolean, (optional)) – Scale to Bounds, Scale UV coordinates to bounds after unwrapping
-
-
+    native (bool): project with uv_project_native instead of the operator.
+        Always used when there is no 3D view (--background mode); view then
+        defaults to FRONT, or the current view if there is one.
 
     """
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
-
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_all(action='SELECT')
-
-    if view is not None:
+    if native:
+        context = _view3d_context() if view is None else None
+    elif view is not None:
         context = rotate_view(view=view)
-    else: # Get current context from 3D view instead
-        for area in bpy.context.screen.areas:
-            if area.type == "VIEW_3D":
-                break
-        for region in area.regions:
-            if region.type == "WINDOW":
-                break
-        space = area.spaces[0]
-        context = bpy.context.copy()
-        context['area'] = area
-        context['region'] = region
-        context['space_data'] = space
+    else: # Use the current 3D view
+        context = _view3d_context()
+    if native or context is None:
+        if view is None:
+            view = 'FRONT' if context is None else \
+                context['space_data'].region_3d.view_matrix.to_3x3()
+        return uv_project_native(
+            mesh_object, method='CYLINDER', view=view,
+            direction=direction, align=align, radius=radius, correct_aspect=correct_aspect,
+            clip_to_bounds=clip_to_bounds, scale_to_bounds=scale_to_bounds)
+    select_only(mesh_object)
+
+    set_mode('EDIT')
+    bpy.ops.mesh.select_all(action='SELECT')
 
     bpy.ops.uv.cylinder_project(
         context, 'EXEC_DEFAULT',
         direction=direction, align=align, radius=radius,
         correct_aspect=correct_aspect, clip_to_bounds=clip_to_bounds,
         scale_to_bounds=scale_to_bounds)
-    bpy.ops.object.mode_set(mode="OBJECT")
+    set_mode('OBJECT')
 
     #bpy.ops.uv.cylinder_project(context, direction='VIEW_ON_EQUATOR', scale_to_bounds=True)
     return None
@@ -841,11 +1129,7 @@ def translate_uv(mesh_object=None, value=(0.0, 0.0)):
     """
     list(value)
 
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     # Get a BMesh representation
     bm = bmesh.new()
@@ -876,11 +1160,7 @@ def scale_uv(mesh_object=None, value=(0.0, 0.0), center=(0.5, 0.5)):
     list(value)
     list(center)
 
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    mesh_object.select = True
-    bpy.context.scene.objects.active = mesh_object
+    select_only(mesh_object)
 
     # Get a BMesh representation
     bm = bmesh.new()
@@ -926,67 +1206,147 @@ def bevel():
     pass
 
 
+def world_aabb(mesh_object):
+    """ World axis aligned bounding box of an object from its bound_box
+
+    Returns:
+        min, max (lists of 3 floats)
+    """
+    corners = [mesh_object.matrix_world * Vector(corner) for corner in mesh_object.bound_box]
+    return ([min(corner[i] for corner in corners) for i in range(3)],
+            [max(corner[i] for corner in corners) for i in range(3)])
+
+
+def _aabb_overlap(aabb_a, aabb_b):
+    """True if two (min, max) boxes overlap"""
+    return all(aabb_a[0][i] <= aabb_b[1][i] and aabb_b[0][i] <= aabb_a[1][i]
+               for i in range(3))
+
+
+def _combine_meshes(objects, name='boolean_targets'):
+    """ New object with the (world space, modifiers applied) meshes of objects
+
+    The meshes are just put together; nothing is merged.
+    """
+    scene = bpy.context.scene
+    bm = bmesh.new()
+    for mesh_object in objects:
+        mesh = mesh_object.to_mesh(scene, True, 'PREVIEW')
+        mesh.transform(mesh_object.matrix_world)
+        bm.from_mesh(mesh)
+        bpy.data.meshes.remove(mesh)
+    mesh = bpy.data.meshes.new(name)
+    bm.to_mesh(mesh)
+    bm.free()
+    combined = bpy.data.objects.new(name, mesh)
+    scene.objects.link(combined)
+    return combined
+
+
 def boolean(obj_src=None, operation='+', obj_trgt=None, solver='CARVE'):
-    """Perform a boolean operation on a source mesh with a target mesh.
+    """Perform a boolean operation on a source mesh with one or more target meshes.
 
-    The result of the operation will be exported to the output file.
+    For DIFFERENCE, targets whose world AABB doesn't overlap the source
+    are skipped, since they can't remove anything. With several targets:
+        - for DIFFERENCE and UNION, targets whose AABBs don't overlap each
+          other are combined into one mesh, so they need only one modifier.
+        - all the modifiers are evaluated and applied together.
+    Targets are applied one after another for INTERSECT. Other modifiers
+    on the source are left as they are, unapplied.
 
     Args:
-        source (str): filename of mesh to be modified.
+        obj_src (Blender object): mesh to be modified.
         operation(str) = symbol for the boolean operation to perform:
             + = UNION
             - = DIFFERENCE
             * = INTERSECT
-        target (str): filename of mesh to act on the source
-        output (str): filename to export the result to
+        obj_trgt (Blender object or list of objects): mesh(es) to act on the source
         solver (enum in ['BMESH', 'CARVE']): the boolean solver to use
 
     Returns:
-        None
+        dict: time in seconds of each stage: prefilter, combine, apply
+            and total, plus the number of targets skipped and modifiers used
     """
     operation_dict = {'+': 'UNION', '-': 'DIFFERENCE', '*': 'INTERSECT'}
+    timings = {'prefilter': 0.0, 'combine': 0.0, 'apply': 0.0, 'skipped': 0,
+               'modifiers': 0}
+    start_time = time.time()
+    targets = obj_trgt if isinstance(obj_trgt, (list, tuple)) else [obj_trgt]
 
     print(
         '\nPerforming boolean:\n'
-        '%s %s %s\n' % (obj_src.name, operation, obj_trgt.name)
+        '%s %s %s\n' % (obj_src.name, operation, ', '.join(t.name for t in targets))
     )
 
-    #obj_src = import_mesh(source)
-    #obj_trgt = import_mesh(target)
-    print('obj_src: %s' % obj_src.name)
-    print('obj_trgt: %s' % obj_trgt.name)
-
-    #active = bpy.context.active_object
-    #selection = bpy.context.selected_objects
-    #print('active:', active.name)
-    #print('selection:', [o.name for o in selection])
-
-    # Deselect All
-    bpy.ops.object.select_all(action='DESELECT')
-    # Select Source and make active
-    obj_src.select = True
-    bpy.context.scene.objects.active = obj_src
-
-    # Add a modifier
-    bpy.ops.object.modifier_add(type='BOOLEAN')
-
-    mod = obj_src.modifiers[0]
-    mod.name = 'mybool'
-    mod.object = obj_trgt
-    mod.operation = operation_dict[operation]
-    mod.solver = solver
-    #mod[0].operation = 'DIFFERENCE'
-    #mod[0].operation = 'INTERSECT'
-    #mod[0].operation = 'UNION'
-
-    # Apply modifier
-    bpy.ops.object.modifier_apply(apply_as='DATA', modifier=mod.name)
-    # bpy.ops.object.select_all(action='DESELECT')
-    #obj_src.select = True
-    #bpy.context.scene.objects.active = obj_src
-    #return_code = export_mesh(output, texture=False)
-    # return return_code
-    return None
+    stage_time = time.time()
+    if operation == '-':
+        src_aabb = world_aabb(obj_src)
+        overlapping = [t for t in targets if _aabb_overlap(src_aabb, world_aabb(t))]
+        timings['skipped'] = len(targets) - len(overlapping)
+        targets = overlapping
+    groups = [[target] for target in targets]
+    if len(targets) > 1 and operation != '*':
+        # Group targets so none of a group's AABBs overlap
+        groups = []
+        for target in targets:
+            aabb = world_aabb(target)
+            for group in groups:
+                if not any(_aabb_overlap(aabb, other) for _, other in group):
+                    group.append((target, aabb))
+                    break
+            else:
+                groups.append([(target, aabb)])
+        groups = [[target for target, _ in group] for group in groups]
+    timings['prefilter'] = time.time() - stage_time
+
+    stage_time = time.time()
+    temporary = []
+    modifier_objects = []
+    for group in groups:
+        if len(group) == 1:
+            modifier_objects.append(group[0])
+        else:
+            combined = _combine_meshes(group)
+            temporary.append(combined)
+            modifier_objects.append(combined)
+    timings['combine'] = time.time() - stage_time
+
+    stage_time = time.time()
+    select_only(obj_src)
+    # The caller's modifiers are hidden while the booleans are evaluated,
+    # so only the booleans end up applied
+    hidden = [mod for mod in obj_src.modifiers if mod.show_viewport]
+    booleans = []
+    for i, target in enumerate(modifier_objects):
+        mod = obj_src.modifiers.new('mybool%d' % i, 'BOOLEAN')
+        mod.object = target
+        mod.operation = operation_dict[operation]
+        mod.solver = solver
+        booleans.append(mod)
+    timings['modifiers'] = len(modifier_objects)
+    if booleans:
+        for mod in hidden:
+            mod.show_viewport = False
+        try:
+            # Evaluate the boolean modifiers once and keep the result
+            old_mesh = obj_src.data
+            obj_src.data = obj_src.to_mesh(bpy.context.scene, True, 'PREVIEW')
+            if old_mesh.users == 0:
+                bpy.data.meshes.remove(old_mesh)
+        finally:
+            for mod in booleans:
+                obj_src.modifiers.remove(mod)
+            for mod in hidden:
+                mod.show_viewport = True
+    for combined in temporary:
+        mesh = combined.data
+        bpy.context.scene.objects.unlink(combined)
+        bpy.data.objects.remove(combined)
+        bpy.data.meshes.remove(mesh)
+    timings['apply'] = time.time() - stage_time
+    timings['total'] = time.time() - start_time
+    print('boolean timings: %s' % timings)
+    return timings
 
 
 def measure_aabb(mesh_object, coord_system='CARTESIAN'):
@@ -0,0 +1,404 @@
+""" Bounding volume hierarchy (BVH) over triangle meshes
+
+Answers spatial queries on mesh arrays without Blender: ray casts,
+closest surface points, inside/outside tests and sphere selections.
+Queries are batched: each step of the tree traversal handles every
+(query, node) pair at once with NumPy.
+
+Usage:
+    tree = bvh.BVH(mesh.vertices, mesh.faces)
+    distance, face = tree.ray_cast(origins, directions)
+
+"""
+
+import numpy as np
+
+LEAF_SIZE = 4
+
+# (query, node) pairs expanded per step of the best first closest point search
+FRONTIER_SIZE = 1 << 18
+
+# Directions of the rays used by contains; skewed so they rarely run
+# exactly along edges or through vertices
+CONTAINS_DIRECTIONS = np.array([[0.8263, 0.4529, 0.3349],
+                                [-0.3821, 0.8651, -0.3250],
+                                [-0.2914, -0.3877, 0.8746]])
+
+
+def closest_point_on_triangles(points, tri_a, tri_b, tri_c):
+    """ Closest point on each triangle to each point (Ericson's method)
+
+    Args:
+        points, tri_a, tri_b, tri_c (numpy arrays (n, 3)): the points and the
+            corners of the triangle to test each against
+
+    Returns:
+        numpy array (n, 3): the closest points
+    """
+    def dot(vec_a, vec_b):
+        return np.einsum('ij,ij->i', vec_a, vec_b)
+
+    edge_ab = tri_b - tri_a
+    edge_ac = tri_c - tri_a
+    edge_bc = tri_c - tri_b
+    d_1 = dot(edge_ab, points - tri_a)
+    d_2 = dot(edge_ac, points - tri_a)
+    d_3 = dot(edge_ab, points - tri_b)
+    d_4 = dot(edge_ac, points - tri_b)
+    d_5 = dot(edge_ab, points - tri_c)
+    d_6 = dot(edge_ac, points - tri_c)
+    v_a = d_3 * d_6 - d_5 * d_4
+    v_b = d_5 * d_2 - d_1 * d_6
+    v_c = d_1 * d_4 - d_3 * d_2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = 1.0 / (v_a + v_b + v_c)
+        result = tri_a + edge_ab * (v_b * denom)[:, None] + edge_ac * (v_c * denom)[:, None]
+        # Voronoi regions, lowest priority first so the earlier tests win
+        t_bc = (d_4 - d_3) / ((d_4 - d_3) + (d_5 - d_6))
+        region = (v_a <= 0) & (d_4 - d_3 >= 0) & (d_5 - d_6 >= 0)
+        result = np.where(region[:, None], tri_b + edge_bc * t_bc[:, None], result)
+        region = (v_b <= 0) & (d_2 >= 0) & (d_6 <= 0)
+        result = np.where(region[:, None], tri_a + edge_ac * (d_2 / (d_2 - d_6))[:, None],
+                          result)
+        region = (d_6 >= 0) & (d_5 <= d_6)
+        result = np.where(region[:, None], tri_c, result)
+        region = (v_c <= 0) & (d_1 >= 0) & (d_3 <= 0)
+        result = np.where(region[:, None], tri_a + edge_ab * (d_1 / (d_1 - d_3))[:, None],
+                          result)
+        region = (d_3 >= 0) & (d_4 <= d_3)
+        result = np.where(region[:, None], tri_b, result)
+        region = (d_1 <= 0) & (d_2 <= 0)
+        result = np.where(region[:, None], tri_a, result)
+    # Degenerate triangles
+    bad = ~np.isfinite(result).all(axis=1)
+    result[bad] = tri_a[bad]
+    return result
+
+
+class BVH(object):
+    """ Bounding volume hierarchy of a triangle mesh, stored as flat arrays
+
+    Built top down by splitting each node's faces at the median centroid
+    along the longest axis, one tree level at a time.
+
+    Attributes:
+        vertices (float64 numpy array (n, 3))
+        faces (int32 numpy array (m, 3)): faces in tree order
+        order (numpy int array (m,)): original index of each face in faces
+        node_min, node_max (numpy arrays (k, 3)): node bounding boxes
+        node_child (numpy int array (k,)): first child of each node (the
+            second is node_child + 1), -1 for leaves
+        node_start, node_count (numpy int arrays (k,)): faces of each leaf
+    """
+    __slots__ = ('vertices', 'faces', 'order', 'node_min', 'node_max',
+                 'node_child', 'node_start', 'node_count')
+
+    def __init__(self, vertices, faces, leaf_size=LEAF_SIZE):
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        faces = np.asarray(faces, dtype=np.int32)
+        num_faces = len(faces)
+        if num_faces == 0:
+            raise ValueError('cannot build a BVH of a mesh with no faces')
+        tris = self.vertices[faces]
+        centroids = tris.mean(axis=1)
+        order = np.arange(num_faces)
+
+        max_nodes = 2 * num_faces
+        node_child = np.full(max_nodes, -1, dtype=np.int64)
+        node_start = np.zeros(max_nodes, dtype=np.int64)
+        node_count = np.zeros(max_nodes, dtype=np.int64)
+        node_count[0] = num_faces
+        levels = [np.array([0])]
+        num_nodes = 1
+        while True:
+            ids = levels[-1]
+            ids = ids[node_count[ids] > leaf_size]
+            if not len(ids):
+                break
+            starts = node_start[ids]
+            counts = node_count[ids]
+            # Faces of all the splitting nodes, segment by segment
+            offsets = np.cumsum(counts) - counts
+            segment = np.repeat(np.arange(len(ids)), counts)
+            positions = np.repeat(starts, counts) + np.arange(counts.sum()) - \
+                np.repeat(offsets, counts)
+            face_ids = order[positions]
+            points = centroids[face_ids]
+            extent = (np.maximum.reduceat(points, offsets) -
+                      np.minimum.reduceat(points, offsets))
+            axis = np.argmax(extent, axis=1)
+            keys = points[np.arange(len(points)), axis[segment]]
+            order[positions] = face_ids[np.lexsort((keys, segment))]
+
+            half = counts // 2
+            children = num_nodes + 2 * np.arange(len(ids))
+            num_nodes += 2 * len(ids)
+            node_child[ids] = children
+            node_start[children] = starts
+            node_count[children] = half
+            node_start[children + 1] = starts + half
+            node_count[children + 1] = counts - half
+            levels.append(np.concatenate((children, children + 1)))
+
+        node_child = node_child[:num_nodes]
+        node_start = node_start[:num_nodes]
+        node_count = node_count[:num_nodes]
+        self.faces = faces[order]
+        self.order = order
+
+        # Bounds: leaves from their triangles, then parents level by level
+        tri_min = tris.min(axis=1)[order]
+        tri_max = tris.max(axis=1)[order]
+        node_min = np.zeros((num_nodes, 3))
+        node_max = np.zeros((num_nodes, 3))
+        leaves = np.flatnonzero(node_child == -1)
+        leaves = leaves[np.argsort(node_start[leaves])]
+        node_min[leaves] = np.minimum.reduceat(tri_min, node_start[leaves])
+        node_max[leaves] = np.maximum.reduceat(tri_max, node_start[leaves])
+        for ids in reversed(levels):
+            ids = ids[node_child[ids] >= 0]
+            children = node_child[ids]
+            node_min[ids] = np.minimum(node_min[children], node_min[children + 1])
+            node_max[ids] = np.maximum(node_max[children], node_max[children + 1])
+        self.node_min = node_min
+        self.node_max = node_max
+        self.node_child = node_child
+        self.node_start = node_start
+        self.node_count = node_count
+
+    def __repr__(self):
+        return 'BVH(%d faces, %d nodes)' % (len(self.faces), len(self.node_child))
+
+    def _leaf_faces(self, queries, nodes):
+        """ Expand (query, leaf) pairs to (query, face in tree order) pairs """
+        counts = self.node_count[nodes]
+        offsets = np.cumsum(counts) - counts
+        pair_queries = np.repeat(queries, counts)
+        pair_faces = np.repeat(self.node_start[nodes], counts) + \
+            np.arange(counts.sum()) - np.repeat(offsets, counts)
+        return pair_queries, pair_faces
+
+    def _expand(self, queries, nodes):
+        """ Split (query, node) pairs into leaf pairs and child pairs """
+        children = self.node_child[nodes]
+        leaf = children < 0
+        inner = ~leaf
+        child_queries = np.concatenate((queries[inner], queries[inner]))
+        child_nodes = np.concatenate((children[inner], children[inner] + 1))
+        return queries[leaf], nodes[leaf], child_queries, child_nodes
+
+    def _box_distance2(self, points, nodes):
+        """Squared distance from each point to its node's box"""
+        below = np.maximum(self.node_min[nodes] - points, 0.0)
+        above = np.maximum(points - self.node_max[nodes], 0.0)
+        return np.sum((below + above) ** 2, axis=1)
+
+    def _ray_triangles(self, origins, directions, faces):
+        """ Möller-Trumbore ray/triangle distances; inf for misses """
+        tris = self.vertices[self.faces[faces]]
+        edge_1 = tris[:, 1] - tris[:, 0]
+        edge_2 = tris[:, 2] - tris[:, 0]
+        p_vec = np.cross(directions, edge_2)
+        det = np.einsum('ij,ij->i', edge_1, p_vec)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv_det = 1.0 / det
+            t_vec = origins - tris[:, 0]
+            u = np.einsum('ij,ij->i', t_vec, p_vec) * inv_det
+            q_vec = np.cross(t_vec, edge_1)
+            v = np.einsum('ij,ij->i', directions, q_vec) * inv_det
+            t = np.einsum('ij,ij->i', edge_2, q_vec) * inv_det
+            hit = (np.abs(det) > 1e-12) & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 0)
+        return np.where(hit, t, np.inf)
+
+    def _ray_boxes(self, origins, inv_directions, nodes):
+        """Entry and exit distances of each ray through its node's box"""
+        with np.errstate(invalid='ignore'):
+            t_1 = (self.node_min[nodes] - origins) * inv_directions
+            t_2 = (self.node_max[nodes] - origins) * inv_directions
+        t_near = np.nanmax(np.fmin(t_1, t_2), axis=1)
+        t_far = np.nanmin(np.fmax(t_1, t_2), axis=1)
+        return t_near, t_far
+
+    def ray_cast(self, origins, directions, max_distance=np.inf):
+        """ Find the first face hit by each ray
+
+        Args:
+            origins, directions (numpy arrays (n, 3)): the rays; directions
+                need not be normalized, distances are in units of their length
+            max_distance (float): ignore hits further than this
+
+        Returns:
+            distance (numpy array (n,)): distance along each ray, inf if missed
+            face (numpy int array (n,)): face index hit, -1 if missed
+        """
+        origins = np.atleast_2d(np.asarray(origins, dtype=np.float64))
+        directions = np.atleast_2d(np.asarray(directions, dtype=np.float64))
+        directions = np.broadcast_to(directions, origins.shape)
+        with np.errstate(divide='ignore'):
+            inv_directions = 1.0 / directions
+        best = np.full(len(origins), float(max_distance))
+        best_face = np.full(len(origins), -1, dtype=np.int64)
+        queries = np.arange(len(origins))
+        nodes = np.zeros(len(origins), dtype=np.int64)
+        while len(queries):
+            t_near, t_far = self._ray_boxes(origins[queries], inv_directions[queries], nodes)
+            keep = (t_near <= t_far) & (t_far >= 0) & (t_near <= best[queries])
+            leaf_queries, leaf_nodes, queries, nodes = self._expand(queries[keep], nodes[keep])
+            if len(leaf_queries):
+                pair_queries, pair_faces = self._leaf_faces(leaf_queries, leaf_nodes)
+                t = self._ray_triangles(origins[pair_queries], directions[pair_queries],
+                                       pair_faces)
+                np.minimum.at(best, pair_queries, t)
+                won = (t == best[pair_queries]) & np.isfinite(t)
+                best_face[pair_queries[won]] = pair_faces[won]
+        distance = np.where(best_face >= 0, best, np.inf)
+        face = np.where(best_face >= 0, self.order[np.maximum(best_face, 0)], -1)
+        return distance, face
+
+    def ray_hits(self, origins, directions):
+        """ Find every face hit by each ray (in front of its origin)
+
+        Returns:
+            ray (numpy int array (k,)): index of the ray of each hit
+            distance (numpy array (k,)): distance of each hit along its ray
+        """
+        origins = np.atleast_2d(np.asarray(origins, dtype=np.float64))
+        directions = np.broadcast_to(np.asarray(directions, dtype=np.float64),
+                                     origins.shape)
+        with np.errstate(divide='ignore'):
+            inv_directions = 1.0 / directions
+        rays = []
+        distances = []
+        queries = np.arange(len(origins))
+        nodes = np.zeros(len(origins), dtype=np.int64)
+        while len(queries):
+            t_near, t_far = self._ray_boxes(origins[queries], inv_directions[queries], nodes)
+            keep = (t_near <= t_far) & (t_far >= 0)
+            leaf_queries, leaf_nodes, queries, nodes = self._expand(queries[keep], nodes[keep])
+            if len(leaf_queries):
+                pair_queries, pair_faces = self._leaf_faces(leaf_queries, leaf_nodes)
+                t = self._ray_triangles(origins[pair_queries], directions[pair_queries],
+                                       pair_faces)
+                hit = np.isfinite(t)
+                rays.append(pair_queries[hit])
+                distances.append(t[hit])
+        if not rays:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.concatenate(rays), np.concatenate(distances)
+
+    def count_hits(self, origins, directions):
+        """ Count the faces hit by each ray (in front of its origin) """
+        origins = np.atleast_2d(np.asarray(origins, dtype=np.float64))
+        rays, _ = self.ray_hits(origins, directions)
+        return np.bincount(rays, minlength=len(origins))
+
+    def contains(self, points):
+        """ Test if points are inside the mesh, which must be closed
+
+        Counts the crossings of three skewed rays from each point and takes
+        the majority, so a ray grazing an edge doesn't flip the answer.
+
+        Returns:
+            numpy bool array (n,)
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        votes = np.zeros(len(points), dtype=np.int64)
+        for direction in CONTAINS_DIRECTIONS:
+            votes += self.count_hits(points, direction) % 2
+        return votes >= 2
+
+    def closest_point(self, points, max_distance=np.inf):
+        """ Find the closest point on the surface to each point
+
+        Returns:
+            closest (numpy array (n, 3)): closest surface points (nan if
+                further than max_distance)
+            distance (numpy array (n,)): distances, inf if further than
+                max_distance
+            face (numpy int array (n,)): face of each closest point, -1 if
+                further than max_distance
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        num_points = len(points)
+        best = np.full(num_points, float(max_distance) ** 2)
+        best_face = np.full(num_points, -1, dtype=np.int64)
+        closest = np.full((num_points, 3), np.nan)
+
+        def test_leaves(queries, nodes):
+            pair_queries, pair_faces = self._leaf_faces(queries, nodes)
+            tris = self.vertices[self.faces[pair_faces]]
+            candidates = closest_point_on_triangles(
+                points[pair_queries], tris[:, 0], tris[:, 1], tris[:, 2])
+            dist2 = np.sum((candidates - points[pair_queries]) ** 2, axis=1)
+            np.minimum.at(best, pair_queries, dist2)
+            won = dist2 == best[pair_queries]
+            best_face[pair_queries[won]] = pair_faces[won]
+            closest[pair_queries[won]] = candidates[won]
+
+        # Initial bound: walk down to the nearer child until a leaf
+        nodes = np.zeros(num_points, dtype=np.int64)
+        while True:
+            children = self.node_child[nodes]
+            inner = children >= 0
+            if not inner.any():
+                break
+            first = children[inner]
+            nearer_second = (self._box_distance2(points[inner], first + 1) <
+                             self._box_distance2(points[inner], first))
+            nodes[inner] = first + nearer_second
+        test_leaves(np.arange(num_points), nodes)
+
+        # Best first: expand the nearest (point, node) pairs first so the
+        # bounds tighten early and the frontier stays small
+        queries = np.arange(num_points)
+        nodes = np.zeros(num_points, dtype=np.int64)
+        dist2 = np.zeros(num_points)
+        while len(queries):
+            keep = dist2 <= best[queries]
+            queries, nodes, dist2 = queries[keep], nodes[keep], dist2[keep]
+            if len(queries) > FRONTIER_SIZE:
+                nearest = np.argpartition(dist2, FRONTIER_SIZE)[:FRONTIER_SIZE]
+                later = np.ones(len(queries), dtype=bool)
+                later[nearest] = False
+                rest = (queries[later], nodes[later], dist2[later])
+                queries, nodes = queries[nearest], nodes[nearest]
+            else:
+                rest = None
+            leaf_queries, leaf_nodes, queries, nodes = self._expand(queries, nodes)
+            if len(leaf_queries):
+                test_leaves(leaf_queries, leaf_nodes)
+            dist2 = self._box_distance2(points[queries], nodes)
+            if rest is not None:
+                queries = np.concatenate((queries, rest[0]))
+                nodes = np.concatenate((nodes, rest[1]))
+                dist2 = np.concatenate((dist2, rest[2]))
+        found = best_face >= 0
+        distance = np.where(found, np.sqrt(best), np.inf)
+        face = np.where(found, self.order[np.maximum(best_face, 0)], -1)
+        return closest, distance, face
+
+    def faces_in_sphere(self, center, radius):
+        """ Faces with their centroid within radius of center
+
+        Same selection as bpylirious.spherical_select with method='FACE'.
+
+        Returns:
+            numpy int array: sorted face indices
+        """
+        center = np.asarray(center, dtype=np.float64).reshape(1, 3)
+        nodes = np.zeros(1, dtype=np.int64)
+        found = []
+        while len(nodes):
+            keep = self._box_distance2(np.repeat(center, len(nodes), axis=0), nodes) <= \
+                radius ** 2
+            leaf_queries, leaf_nodes, _, nodes = self._expand(
+                np.zeros(np.count_nonzero(keep), dtype=np.int64), nodes[keep])
+            if len(leaf_nodes):
+                _, pair_faces = self._leaf_faces(leaf_queries, leaf_nodes)
+                centroids = self.vertices[self.faces[pair_faces]].mean(axis=1)
+                inside = np.sum((centroids - center) ** 2, axis=1) <= radius ** 2
+                found.append(pair_faces[inside])
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(self.order[np.concatenate(found)])
@@ -0,0 +1,180 @@
+""" Connected component (shell) analysis of triangle meshes
+
+Counts the separate shells of a mesh, measures them and removes small
+fragments, e.g. the floating noise in 3D scans. Runs in-process with
+NumPy; an alternative to bpylirious.separate and mlx.delete.small_parts.
+
+Faces are connected if they share a vertex, so meshes read from STL must
+be welded first (stl.read does this by default).
+
+"""
+
+import numpy as np
+
+from . import convert
+
+
+def union_find(edges_a, edges_b, num_verts):
+    """ Find the connected components of a graph with a vectorized union-find.
+
+    All edges are processed at once: each round hooks the root of the higher
+    endpoint onto the root of the lower one, then compresses the paths by
+    pointer jumping, until no edge joins two different roots.
+
+    Args:
+        edges_a, edges_b (numpy int arrays): the two endpoints of each edge
+        num_verts (int): number of vertices
+
+    Returns:
+        numpy int array: the root (smallest vertex index) of each vertex's
+            component
+    """
+    parent = np.arange(num_verts)
+    while True:
+        roots_a = parent[edges_a]
+        roots_b = parent[edges_b]
+        low = np.minimum(roots_a, roots_b)
+        high = np.maximum(roots_a, roots_b)
+        merge = low != high
+        if not merge.any():
+            break
+        np.minimum.at(parent, high[merge], low[merge])
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return parent
+
+
+def label(faces, num_verts=None):
+    """ Label the connected components of a triangle mesh.
+
+    Args:
+        faces (numpy int array (m, 3)): vertex indices of each face
+        num_verts (int): number of vertices; default is the highest index + 1
+
+    Returns:
+        labels (numpy int array (m,)): component number of each face,
+            numbered from 0
+        count (int): number of components
+    """
+    faces = np.asarray(faces)
+    if len(faces) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    if num_verts is None:
+        num_verts = int(faces.max()) + 1
+    roots = union_find(np.concatenate((faces[:, 0], faces[:, 0])),
+                       np.concatenate((faces[:, 1], faces[:, 2])), num_verts)
+    unique_roots, labels = np.unique(roots[faces[:, 0]], return_inverse=True)
+    return labels.ravel(), len(unique_roots)
+
+
+def measure(vertices, faces, labels=None):
+    """ Measure each connected component.
+
+    Volume is the signed volume enclosed by the component; it is only
+    meaningful for closed, consistently oriented shells.
+
+    Returns:
+        dict of numpy arrays, one entry per component:
+            faces (int): number of faces
+            area (float): surface area
+            volume (float): enclosed volume
+            min (3 floats): minimum corner of the axis aligned bounding box
+            max (3 floats): maximum corner of the axis aligned bounding box
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces)
+    if labels is None:
+        labels, count = label(faces, len(vertices))
+    else:
+        count = int(labels.max()) + 1 if len(labels) else 0
+    tris = vertices[faces]
+    cross = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    areas = 0.5 * np.linalg.norm(cross, axis=1)
+    volumes = np.einsum('ij,ij->i', tris[:, 0], np.cross(tris[:, 1], tris[:, 2])) / 6.0
+
+    # Bounding boxes: sort the face corners by component and reduce each run
+    corner_labels = np.repeat(labels, 3)
+    order = np.argsort(corner_labels, kind='stable')
+    corners = tris.reshape(-1, 3)[order]
+    starts = np.searchsorted(corner_labels[order], np.arange(count))
+    return {'faces': np.bincount(labels, minlength=count),
+            'area': np.bincount(labels, weights=areas, minlength=count),
+            'volume': np.bincount(labels, weights=volumes, minlength=count),
+            'min': np.minimum.reduceat(corners, starts) if count else np.zeros((0, 3)),
+            'max': np.maximum.reduceat(corners, starts) if count else np.zeros((0, 3))}
+
+
+def small_parts(labels, ratio=0.2, min_faces=None):
+    """ Find the faces of small components.
+
+    Args:
+        labels (numpy int array): component number of each face (see label)
+        ratio (float): a component is small if it has fewer than this ratio
+            times the faces of the largest component (same as MeshLab's
+            small_parts)
+        min_faces (int): if set, a component is small if it has fewer faces
+            than this instead
+
+    Returns:
+        numpy bool array: True for each face of a small component
+    """
+    if len(labels) == 0:
+        return np.zeros(0, dtype=bool)
+    counts = np.bincount(labels)
+    if min_faces is None:
+        min_faces = ratio * counts.max()
+    return counts[labels] < min_faces
+
+
+def keep(vertices, faces, face_mask):
+    """ Keep only the selected faces and the vertices they use.
+
+    Returns:
+        vertices (numpy array): the used vertices
+        faces (numpy int array): faces renumbered to the new vertices
+    """
+    faces = np.asarray(faces)[face_mask]
+    used = np.zeros(len(vertices), dtype=bool)
+    used[faces.ravel()] = True
+    new_index = np.cumsum(used) - 1
+    return np.asarray(vertices)[used], new_index[faces].astype(np.int32)
+
+
+def analyze(file_in):
+    """ Count and measure the connected components of a mesh file.
+
+    Returns:
+        dict: see measure, plus "count", the number of components
+    """
+    mesh = convert.read(file_in)
+    vertices, faces = mesh['vertices'], mesh['faces']
+    labels, count = label(faces, len(vertices))
+    components = measure(vertices, faces, labels)
+    components['count'] = count
+    return components
+
+
+def remove_small_parts(file_in, file_out=None, ratio=0.2, min_faces=None):
+    """ Delete small components (e.g. floating scan noise) from a mesh file.
+
+    See small_parts for ratio and min_faces.
+
+    Args:
+        file_in (str): mesh file to clean
+        file_out (str): output filename; if None file_in is overwritten
+
+    Returns:
+        int: number of components deleted
+    """
+    if file_out is None:
+        file_out = file_in
+    mesh = convert.read(file_in)
+    vertices, faces = mesh['vertices'], mesh['faces']
+    labels, _ = label(faces, len(vertices))
+    small = small_parts(labels, ratio, min_faces)
+    vertices, faces = keep(vertices, faces, ~small)
+    convert.write(file_out, {'vertices': vertices, 'faces': faces})
+    return len(np.unique(labels[small]))
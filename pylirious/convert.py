@@ -0,0 +1,258 @@
+""" Convert mesh files between STL, PLY and obj without Blender
+
+Uses the same "up" axis conventions as bpylirious.import_mesh and
+export_mesh: the "up" direction comes from the filename metadata, or
+from the default of the file format if there is no metadata, and the
+mesh is rotated when the input and output "up" directions differ.
+
+Usage:
+    python -m pylirious convert [-h] [--to FEXT] [--up {Y,Z}] [-o FILE_OUT]
+                                [-j PROCESSES] files [files ...]
+
+"""
+
+import os
+import sys
+import argparse
+import concurrent.futures
+
+import numpy as np
+
+from . import filename
+from . import obj
+from . import ply
+from . import stl
+
+# Default "up" direction of each format when the filename has no metadata;
+# same as bpylirious.import_mesh and export_mesh.
+UP_IN = {'stl': 'Z', 'obj': 'Y', 'ply': 'Z'}
+UP_OUT = {'stl': 'Z', 'obj': 'Y', 'ply': 'Y'}
+
+
+def read(file_in):
+    """ Read a STL, PLY or obj file.
+
+    Returns:
+        dict: at least "vertices" and "faces"; see stl.read, ply.read and
+            obj.read for the other entries of each format
+    """
+    fext = os.path.splitext(file_in)[1][1:].lower()
+    if fext == 'stl':
+        return stl.read(file_in)
+    elif fext == 'ply':
+        return ply.read(file_in)
+    elif fext == 'obj':
+        return obj.read(file_in)
+    raise ValueError('filetype "%s" is not supported' % fext)
+
+
+def write(file_out, mesh):
+    """ Write a mesh dict (see read) to a STL, PLY or obj file.
+
+    Attributes the format can't store are dropped.
+    """
+    fext = os.path.splitext(file_out)[1][1:].lower()
+    vertices = mesh['vertices']
+    faces = mesh['faces']
+    if fext == 'stl':
+        stl.write(file_out, vertices, faces)
+    elif fext == 'ply':
+        # PLY stores one normal and uv per vertex
+        normals = mesh.get('normals')
+        if normals is not None and len(normals) != len(vertices):
+            normals = None
+        uvs = mesh.get('uvs')
+        if uvs is not None and len(uvs) != len(vertices):
+            uvs = None
+        colors = mesh.get('colors')
+        if colors is not None and colors.dtype.kind == 'f':
+            colors = np.clip(colors * 255.0 + 0.5, 0, 255).astype(np.uint8)
+        ply.write(file_out, vertices, faces, normals=normals, colors=colors, uvs=uvs)
+    elif fext == 'obj':
+        normals = mesh.get('normals')
+        face_normals = mesh.get('face_normals')
+        if normals is not None and face_normals is None:
+            face_normals = faces  # per vertex normals
+        uvs = mesh.get('uvs')
+        face_uvs = mesh.get('face_uvs')
+        if uvs is not None and face_uvs is None:
+            face_uvs = faces
+        colors = mesh.get('colors')
+        if colors is not None and colors.dtype.kind != 'f':
+            colors = colors[:, :3] / 255.0
+        obj.write(file_out, vertices, faces, uvs=uvs, face_uvs=face_uvs,
+                  normals=normals, face_normals=face_normals, colors=colors,
+                  materials=mesh.get('materials'),
+                  face_materials=mesh.get('face_materials'))
+    else:
+        raise ValueError('filetype "%s" is not supported' % fext)
+    return None
+
+
+def up_matrix(up_from, up_to):
+    """ Rotation matrix (3x3) between "up" directions.
+
+    Y to Z up is a 90 degree rotation about X, the same as pylirious.swap_yz
+    and the axis_forward/axis_up mapping Blender's importers use.
+    """
+    up_from = up_from.upper()
+    up_to = up_to.upper()
+    if up_from == up_to:
+        return np.identity(3)
+    if up_from == 'Y' and up_to == 'Z':
+        return np.array([[1.0, 0.0, 0.0], [0.0, 0.0, -1.0], [0.0, 1.0, 0.0]])
+    if up_from == 'Z' and up_to == 'Y':
+        return np.array([[1.0, 0.0, 0.0], [0.0, 0.0, 1.0], [0.0, -1.0, 0.0]])
+    raise ValueError('"up" direction must be Y or Z')
+
+
+def up_direction(fbasename, default=UP_IN):
+    """ The "up" direction of a file from its metadata or format default """
+    _, _, up_meta, fext = filename.parse(fbasename)
+    if up_meta is not None and up_meta.upper() in ('Y', 'Z'):
+        return up_meta.upper()
+    return default.get(fext, 'Z')
+
+
+def _check_output(file_in, file_out):
+    """ Refuse to overwrite the input file """
+    if os.path.abspath(file_out) == os.path.abspath(file_in):
+        raise ValueError('output file "%s" is the same as the input; give another '
+                         'file_out, format or "up" direction' % file_out)
+    return None
+
+
+def convert(file_in, file_out=None, fext=None, up=None):
+    """ Convert a mesh file to another format and/or "up" direction.
+
+    Args:
+        file_in (str): the mesh file to convert
+        file_out (str): output filename. If None, it is built from the input
+            file prefix, its scale metadata, the output "up" direction and
+            fext, e.g. "scan(-10Z).stl" -> "scan(-10Y).ply". It must not
+            be file_in (ValueError).
+        fext (str): output format if file_out is None: 'stl', 'ply' or 'obj'
+        up (str): output "up" direction, 'Y' or 'Z'. Default is the "up"
+            direction in the file_out metadata, or the input's if file_out
+            is None
+
+    Returns:
+        str: the output filename
+    """
+    up_in = up_direction(os.path.basename(file_in))
+    if file_out is None:
+        fprefix, scale_meta, _, fext_in = filename.parse(os.path.basename(file_in))
+        if fext is None:
+            fext = fext_in
+        if up is None:
+            up = up_in
+        if scale_meta is None:
+            scale_meta = '1'
+        file_out = os.path.join(os.path.dirname(file_in), '%s(%s%s).%s' % (
+            fprefix, scale_meta, up.upper(), fext))
+    elif up is None:
+        up = up_direction(os.path.basename(file_out), default=UP_OUT)
+    _check_output(file_in, file_out)
+
+    mesh = read(file_in)
+    matrix = up_matrix(up_in, up)
+    if not np.array_equal(matrix, np.identity(3)):
+        mesh['vertices'] = (mesh['vertices'] @ matrix.T).astype(np.float32)
+        if mesh.get('normals') is not None:
+            mesh['normals'] = (mesh['normals'] @ matrix.T).astype(np.float32)
+    write(file_out, mesh)
+    return file_out
+
+
+def normalize(file_in, file_out=None, target_scale=1, target_up='Z'):
+    """ Bring a mesh to another scale and "up" direction in one pass.
+
+    Replaces scale_meta2scale + bpylirious.scale + swap_yz: the scale and
+    "up" metadata of file_in are combined with the targets into one matrix,
+    applied once to the vertices and normals.
+
+    Args:
+        file_in (str): mesh file with (scaleUp) metadata, e.g. "scan(-10Y).obj"
+        file_out (str): output filename. Default is file_in with the target
+            metadata, e.g. "scan(1Z).obj". It must not be file_in
+            (ValueError).
+        target_scale: scale metadata value of the output (see
+            scale_meta2scale); 1 is real-world size
+        target_up (str): "up" direction of the output, 'Y' or 'Z'
+
+    Returns:
+        str: the output filename
+    """
+    from .pylirious import scale_meta2scale
+    fprefix, scale_meta, up_meta, fext = filename.parse(os.path.basename(file_in))
+    if scale_meta is None or up_meta is None:
+        raise ValueError('"%s" has no (scaleUp) metadata' % file_in)
+    # scale_meta2scale is model size / real size, e.g. 0.1 for "-10" (1:10)
+    factor = scale_meta2scale(str(target_scale)) / scale_meta2scale(scale_meta)
+    if file_out is None:
+        file_out = os.path.join(os.path.dirname(file_in), '%s(%s%s).%s' % (
+            fprefix, target_scale, target_up.upper(), fext))
+    _check_output(file_in, file_out)
+
+    mesh = read(file_in)
+    rotation = up_matrix(up_meta, target_up)
+    # Row vectors: v' = v * (factor * R)^T; normals only rotate
+    mesh['vertices'] = np.dot(mesh['vertices'], (factor * rotation.T).astype(np.float32))
+    if mesh.get('normals') is not None:
+        mesh['normals'] = np.dot(mesh['normals'], rotation.T.astype(np.float32))
+    write(file_out, mesh)
+    return file_out
+
+
+def _convert_args(args):
+    """convert() with a tuple of arguments, for executor.map"""
+    return convert(*args)
+
+
+def convert_files(files_in, fext=None, up=None, processes=None):
+    """ Convert many mesh files in parallel worker processes.
+
+    Output filenames are built from the metadata; see convert.
+
+    Returns:
+        list: the output filenames
+    """
+    jobs = [(file_in, None, fext, up) for file_in in files_in]
+    if processes == 1 or len(jobs) == 1:
+        return [_convert_args(job) for job in jobs]
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(_convert_args, jobs))
+
+
+def main(argv=None):
+    """Command line interface: convert one or more mesh files"""
+    parser = argparse.ArgumentParser(
+        prog='pylirious convert',
+        description='Convert mesh files between STL, PLY and obj without Blender')
+    parser.add_argument('files', nargs='+', help='mesh files to convert')
+    parser.add_argument('--to', dest='fext', choices=['stl', 'ply', 'obj'],
+                        help='output format (default: same as input)')
+    parser.add_argument('--up', dest='up', choices=['Y', 'Z'],
+                        help='output "up" direction (default: same as input)')
+    parser.add_argument('-o', '--output', dest='file_out',
+                        help='output filename (only with a single input file)')
+    parser.add_argument('-j', '--processes', dest='processes', type=int,
+                        help='number of files to convert in parallel')
+    args = parser.parse_args(argv)
+    if args.file_out is not None and len(args.files) > 1:
+        print('Error: --output can only be used with one input file')
+        sys.exit(1)
+    try:
+        if args.file_out is not None:
+            files_out = [convert(args.files[0], args.file_out, args.fext, args.up)]
+        else:
+            files_out = convert_files(args.files, args.fext, args.up, args.processes)
+    except ValueError as error:
+        print('Error: %s' % error)
+        sys.exit(1)
+    for file_in, file_out in zip(args.files, files_out):
+        print('%s -> %s' % (file_in, file_out))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,393 @@
+""" Native quadric error metric (QEM) decimation
+
+Reduces the face count of a triangle mesh by collapsing edges, cheapest
+first, the way MeshLab's quadric edge collapse works (Garland and
+Heckbert). Each vertex carries a quadric, the sum of the squared distance
+to the planes of its faces; collapsing an edge moves the merged vertex to
+the position that minimizes the summed quadric, and that minimum is the
+cost of the collapse.
+
+The collapses run in rounds, all in NumPy, over flat arrays: the edges
+as sorted int64 keys and a CSR vertex to face map, rebuilt each round.
+A round takes the cheapest edges (about one per two faces still to
+remove), picks among them, in passes, the edges that are the cheapest
+around both their ends and touch no face another picked edge touches,
+checks them together and collapses them at once. Costs are only
+recomputed for the edges around merged vertices. The result is close to
+a one edge at a time priority queue, at a fraction of the time and
+memory: on one core, halving a 1.3M face mesh takes about 10 s and 550
+MB, a 5.2M face mesh about 50 s, about 50-70k faces removed per second.
+
+"""
+
+import numpy as np
+
+from .mesh import Mesh
+
+# Edges per block when computing collapse costs, which bounds the
+# temporary (edges, 4, 4) arrays
+COST_BLOCK = 1 << 16
+
+# Edges considered per round, as a fraction of the faces still to remove;
+# more is faster, but lets costlier collapses in early
+ROUND_FRACTION = 0.5
+
+
+def _face_quadrics(vertices, faces):
+    """ Area weighted plane quadric (4x4) of each face """
+    tris = vertices[faces]
+    normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    double_area = np.linalg.norm(normals, axis=1)
+    safe = np.where(double_area > 0, double_area, 1.0)
+    planes = np.zeros((len(faces), 4))
+    planes[:, :3] = normals / safe[:, None]
+    planes[:, 3] = -np.einsum('ij,ij->i', planes[:, :3], tris[:, 0])
+    weights = 0.5 * double_area
+    return weights[:, None, None] * planes[:, :, None] * planes[:, None, :]
+
+
+def _boundary_quadrics(vertices, faces, boundary_weight):
+    """ Quadrics of planes through the boundary edges, perpendicular to their
+    face, which keep the boundary from moving
+
+    Returns:
+        edges (numpy int array (k, 2)), quadrics (numpy array (k, 4, 4))
+    """
+    half_edges = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    num_verts = np.int64(len(vertices))
+    keys = half_edges[:, 0] * num_verts + half_edges[:, 1]
+    reverse_keys = half_edges[:, 1] * num_verts + half_edges[:, 0]
+    boundary = ~np.isin(keys, reverse_keys)
+    edges = half_edges[boundary]
+    if not len(edges):
+        return edges, np.zeros((0, 4, 4))
+    tris = vertices[faces[np.flatnonzero(boundary) // 3]]
+    face_normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    edge_vecs = vertices[edges[:, 1]] - vertices[edges[:, 0]]
+    normals = np.cross(edge_vecs, face_normals)
+    length = np.linalg.norm(normals, axis=1)
+    length[length == 0] = 1.0
+    planes = np.zeros((len(edges), 4))
+    planes[:, :3] = normals / length[:, None]
+    planes[:, 3] = -np.einsum('ij,ij->i', planes[:, :3], vertices[edges[:, 0]])
+    weights = boundary_weight * np.einsum('ij,ij->i', edge_vecs, edge_vecs)
+    return edges, weights[:, None, None] * planes[:, :, None] * planes[:, None, :]
+
+
+def _vertex_sums(num_verts, elements, quadrics):
+    """ Sum of the quadrics of the elements (faces or edges) around each
+    vertex (np.add.at is much slower) """
+    values = quadrics.reshape(-1, 16)
+    sums = np.zeros((num_verts, 16))
+    for verts in elements.T:
+        for i in range(16):
+            sums[:, i] += np.bincount(verts, values[:, i], minlength=num_verts)
+    return sums.reshape(num_verts, 4, 4)
+
+
+def _collapse_costs(quadrics, positions, verts_a, verts_b):
+    """ Best position and cost of collapsing each edge (a, b)
+
+    The position minimizing the summed quadric, or the best of the two ends
+    and the midpoint when that system is singular.
+    """
+    quadric = quadrics[verts_a] + quadrics[verts_b]
+    system = quadric[:, :3, :3]
+    rhs = -quadric[:, :3, 3]
+    det = np.linalg.det(system)
+    scale = np.abs(system).max(axis=(1, 2)) ** 3
+    solvable = np.abs(det) > 1e-10 * np.maximum(scale, 1e-30)
+    best = np.zeros((len(verts_a), 3))
+    if solvable.any():
+        best[solvable] = np.linalg.solve(system[solvable], rhs[solvable][:, :, None])[:, :, 0]
+    costs = np.full(len(verts_a), np.inf)
+    candidates = [best, positions[verts_a], positions[verts_b],
+                  0.5 * (positions[verts_a] + positions[verts_b])]
+    result = np.zeros((len(verts_a), 3))
+    for i, candidate in enumerate(candidates):
+        homogeneous = np.concatenate((candidate, np.ones((len(candidate), 1))), axis=1)
+        cost = np.einsum('ij,ijk,ik->i', homogeneous, quadric, homogeneous)
+        if i == 0:
+            cost[~solvable] = np.inf
+        better = cost < costs
+        costs[better] = cost[better]
+        result[better] = candidate[better]
+    return result, np.maximum(costs, 0.0)
+
+
+def _block_costs(quadrics, positions, verts_a, verts_b):
+    """ _collapse_costs, COST_BLOCK edges at a time """
+    targets = np.empty((len(verts_a), 3))
+    costs = np.empty(len(verts_a))
+    for start in range(0, len(verts_a), COST_BLOCK):
+        block = slice(start, start + COST_BLOCK)
+        targets[block], costs[block] = _collapse_costs(quadrics, positions, verts_a[block],
+                                                       verts_b[block])
+    return targets, costs
+
+
+def _unique(keys):
+    """ Sorted unique keys (np.unique hashes, which is much slower here) """
+    keys = np.sort(keys)
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+
+
+def _edge_keys(faces, num_verts):
+    """ Sorted keys a * num_verts + b (a < b) of the edges of faces """
+    half_edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    return _unique(half_edges[:, 0] * np.int64(num_verts) + half_edges[:, 1])
+
+
+def _vertex_faces(faces, num_verts):
+    """ CSR vertex to face map: the faces of vertex v are
+    face_ids[offsets[v]:offsets[v + 1]] """
+    corners = faces.ravel()
+    offsets = np.zeros(num_verts + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(corners, minlength=num_verts))
+    face_ids = np.argsort(corners) // 3
+    return offsets, face_ids
+
+
+def _ring(offsets, face_ids, verts):
+    """ (index into verts, face) pairs of the faces around each vertex """
+    counts = offsets[verts + 1] - offsets[verts]
+    owners = np.repeat(np.arange(len(verts)), counts)
+    index = np.repeat(offsets[verts] - (np.cumsum(counts) - counts), counts) + \
+        np.arange(counts.sum())
+    return owners, face_ids[index]
+
+
+def _check_collapses(faces, positions, offsets, face_ids, verts_a, verts_b, targets):
+    """ Test the collapses of edges (a, b) to targets, which must not share faces
+
+    A collapse is allowed if it keeps the mesh manifold (link condition:
+    the only common neighbors of a and b are the apexes of their shared
+    faces) and doesn't flip or degenerate any of the faces that move.
+
+    Returns:
+        valid (bool numpy array (k,))
+        removed (numpy int array (k,)): faces each collapse removes
+    """
+    num_edges = len(verts_a)
+    owners_a, ring_a = _ring(offsets, face_ids, verts_a)
+    owners_b, ring_b = _ring(offsets, face_ids, verts_b)
+    corners_a = faces[ring_a]
+    corners_b = faces[ring_b]
+    shared_a = (corners_a == verts_b[owners_a][:, None]).any(axis=1)
+    shared_b = (corners_b == verts_a[owners_b][:, None]).any(axis=1)
+    removed = np.bincount(owners_a[shared_a], minlength=num_edges)
+
+    # Faces that move: one corner goes to the target
+    owners = np.concatenate((owners_a[~shared_a], owners_b[~shared_b]))
+    corners = np.concatenate((corners_a[~shared_a], corners_b[~shared_b]))
+    moved = np.concatenate((verts_a[owners_a[~shared_a]], verts_b[owners_b[~shared_b]]))
+    old = positions[corners]
+    new = old.copy()
+    new[corners == moved[:, None]] = targets[owners]
+    old_normals = np.cross(old[:, 1] - old[:, 0], old[:, 2] - old[:, 0])
+    new_normals = np.cross(new[:, 1] - new[:, 0], new[:, 2] - new[:, 0])
+    flips = np.einsum('ij,ij->i', old_normals, new_normals) <= 0
+    folded = np.bincount(owners[flips], minlength=num_edges) > 0
+
+    # Link condition
+    num_verts = np.int64(len(positions))
+    neighbors = []
+    for owners_x, corners_x, verts_x in ((owners_a, corners_a, verts_a),
+                                         (owners_b, corners_b, verts_b)):
+        keys = owners_x[:, None] * num_verts + corners_x
+        keys = keys[corners_x != verts_x[owners_x][:, None]]
+        neighbors.append(_unique(keys))
+    common = np.intersect1d(neighbors[0], neighbors[1], assume_unique=True)
+    num_common = np.bincount(common // num_verts, minlength=num_edges)
+    return ~folded & (removed > 0) & (num_common == removed), removed
+
+
+def _select(verts_a, verts_b, costs, eligible, faces, offsets, face_ids):
+    """ Edges that can all collapse at once: no two touch the same face
+
+    Picks, in passes until none is left, the eligible edges that are the
+    cheapest around both their ends, keeping the cheapest one on each face,
+    and drops the eligible edges that touch their faces.
+
+    Returns:
+        numpy int array: the edges
+    """
+    num_verts = len(offsets) - 1
+    claimed = np.zeros(num_verts, dtype=bool)
+    candidates = np.flatnonzero(eligible)
+    candidates = candidates[np.argsort(costs[candidates], kind='stable')]
+    result = []
+    while len(candidates):
+        rank = np.arange(len(candidates))
+        none = len(candidates)
+        ends_a = verts_a[candidates]
+        ends_b = verts_b[candidates]
+        best = np.full(num_verts, none)
+        np.minimum.at(best, ends_a, rank)
+        np.minimum.at(best, ends_b, rank)
+        chosen = np.flatnonzero((best[ends_a] == rank) & (best[ends_b] == rank))
+        # Each vertex is in at most one chosen edge; the cheapest edge on
+        # each face wins it
+        ends = np.concatenate((ends_a[chosen], ends_b[chosen]))
+        owners, ring = _ring(offsets, face_ids, ends)
+        vertex_rank = np.full(num_verts, none)
+        vertex_rank[ends] = np.concatenate((chosen, chosen))
+        face_rank = vertex_rank[faces[ring]].min(axis=1)
+        best = np.full(len(ends), none)
+        np.minimum.at(best, owners, face_rank)
+        half = len(chosen)
+        chosen = chosen[(best[:half] == chosen) & (best[half:] == chosen)]
+        result.append(candidates[chosen])
+        _, ring = _ring(offsets, face_ids, np.concatenate((ends_a[chosen], ends_b[chosen])))
+        claimed[faces[ring]] = True
+        candidates = candidates[~claimed[ends_a] & ~claimed[ends_b]]
+    return np.concatenate(result) if result else np.zeros(0, dtype=np.int64)
+
+
+def decimate(mesh, target_faces=None, target_ratio=0.5, max_error=None,
+             preserve_boundary=True, boundary_weight=1000.0, preserve_seams=False):
+    """ Reduce the faces of a mesh by quadric edge collapse (in place)
+
+    Stops when the mesh has target_faces faces, or when every remaining
+    collapse would cost more than max_error. Collapses that would fold a
+    face over or make the mesh non-manifold are skipped. Per vertex
+    normals, colors and uvs are interpolated.
+
+    Args:
+        mesh (mesh.Mesh): the mesh; vertices should be welded (see
+            mesh.Mesh.weld)
+        target_faces (int): number of faces to reduce to
+        target_ratio (float): target_faces as a fraction of the current
+            faces, if target_faces is None
+        max_error (float): largest quadric error (squared distance times
+            area) allowed for a collapse
+        preserve_boundary (bool): add boundary_weight times stronger
+            quadrics along open edges so they keep their shape
+        preserve_seams (bool): don't move vertices that share their
+            position with another vertex, e.g. where uvs are split
+
+    Returns:
+        int: number of faces removed
+    """
+    positions = mesh.vertices.astype(np.float64)
+    faces = mesh.faces.astype(np.int64)
+    num_verts = len(positions)
+    num_faces = len(faces)
+    if target_faces is None:
+        target_faces = int(num_faces * target_ratio)
+    if max_error is None:
+        max_error = np.inf
+
+    quadrics = _vertex_sums(num_verts, faces, _face_quadrics(positions, faces))
+    if preserve_boundary:
+        edges, edge_quadrics = _boundary_quadrics(positions, faces, boundary_weight)
+        quadrics += _vertex_sums(num_verts, edges, edge_quadrics)
+    locked = np.zeros(num_verts, dtype=bool)
+    if preserve_seams:
+        keys = np.ascontiguousarray(positions).view(np.dtype((np.void, 24))).ravel()
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        locked = counts[inverse.ravel()] > 1
+    attributes = [getattr(mesh, name).astype(np.float64) if getattr(mesh, name) is not None
+                  else None for name in ('normals', 'colors', 'uvs')]
+
+    # Costs carry over between rounds for the edges whose ends didn't
+    # change; edges that failed _check_collapses wait until their
+    # neighborhood changes. Start with one dummy edge, key -1.
+    keys = np.full(1, -1, dtype=np.int64)
+    targets = np.zeros((1, 3))
+    costs = np.zeros(1)
+    blocked = np.zeros(1, dtype=bool)
+    changed = np.zeros(num_verts, dtype=bool)
+    touched = np.zeros(num_verts, dtype=bool)
+    while len(faces) > target_faces:
+        old_keys, old_targets, old_costs, old_blocked = keys, targets, costs, blocked
+        keys = _edge_keys(faces, num_verts)
+        verts_a = keys // num_verts
+        verts_b = keys % num_verts
+        index = np.minimum(np.searchsorted(old_keys, keys), len(old_keys) - 1)
+        known = old_keys[index] == keys
+        reuse = known & ~changed[verts_a] & ~changed[verts_b]
+        targets = np.empty((len(keys), 3))
+        costs = np.empty(len(keys))
+        targets[reuse] = old_targets[index[reuse]]
+        costs[reuse] = old_costs[index[reuse]]
+        new = np.flatnonzero(~reuse)
+        targets[new], costs[new] = _block_costs(quadrics, positions, verts_a[new], verts_b[new])
+        blocked = known & old_blocked[index] & ~touched[verts_a] & ~touched[verts_b]
+
+        eligible = ~blocked & ~locked[verts_a] & ~locked[verts_b] & (costs <= max_error)
+        if not eligible.any():
+            break
+        # Only the edges a one at a time collapse would reach: about the
+        # cheapest edge per two faces still to remove
+        excess = len(faces) - target_faces
+        wanted = max(int(excess * ROUND_FRACTION), 1)
+        if wanted < eligible.sum():
+            eligible &= costs <= np.partition(costs[eligible], wanted - 1)[wanted - 1]
+        offsets, face_ids = _vertex_faces(faces, num_verts)
+        selected = _select(verts_a, verts_b, costs, eligible, faces, offsets, face_ids)
+        valid, removed = _check_collapses(faces, positions, offsets, face_ids,
+                                          verts_a[selected], verts_b[selected],
+                                          targets[selected])
+        blocked[selected[~valid]] = True
+        selected = selected[valid]
+        removed = removed[valid]
+        # Don't go (much) below target_faces
+        selected = selected[np.cumsum(removed) - removed < excess]
+
+        # Collapse each b into its a
+        merged = verts_a[selected]
+        gone = verts_b[selected]
+        target = targets[selected]
+        edge = positions[gone] - positions[merged]
+        length2 = np.einsum('ij,ij->i', edge, edge)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.einsum('ij,ij->i', target - positions[merged], edge) / length2
+        t = np.where(length2 > 0, np.clip(t, 0.0, 1.0), 0.0)[:, None]
+        for values in attributes:
+            if values is not None:
+                values[merged] += (values[gone] - values[merged]) * t
+        positions[merged] = target
+        quadrics[merged] += quadrics[gone]
+        remap = np.arange(num_verts)
+        remap[gone] = merged
+        faces = remap[faces]
+        faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) &
+                      (faces[:, 2] != faces[:, 0])]
+        changed[:] = False
+        changed[merged] = True
+        touched[:] = False
+        touched[faces[changed[faces].any(axis=1)]] = True
+
+    mesh.vertices = positions.astype(np.float32)
+    mesh.faces = faces.astype(np.int32)
+    for name, values in zip(('normals', 'colors', 'uvs'), attributes):
+        if values is None:
+            continue
+        if name == 'normals':
+            length = np.linalg.norm(values, axis=1)
+            length[length == 0] = 1.0
+            values /= length[:, None]
+        elif name == 'colors':
+            values = np.clip(values + 0.5, 0, 255)
+        setattr(mesh, name, values.astype(getattr(mesh, name).dtype))
+    mesh.remove_unused()
+    return num_faces - len(mesh.faces)
+
+
+def decimate_file(file_in, file_out=None, **kwargs):
+    """ Decimate a mesh file; see decimate for the parameters
+
+    Args:
+        file_in (str): mesh file to decimate
+        file_out (str): output filename; if None file_in is overwritten
+
+    Returns:
+        int: number of faces removed
+    """
+    if file_out is None:
+        file_out = file_in
+    mesh = Mesh.read(file_in)
+    removed = decimate(mesh, **kwargs)
+    mesh.write(file_out)
+    return removed
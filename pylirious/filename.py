@@ -11,8 +11,6 @@ import os
 import unicodedata
 import string
 
-import meshlabxml as mlx
-
 
 def parse(fbasename, log=None):
     """ Parse filename, spltting it up into the filename
@@ -63,6 +61,8 @@ def check_metadata(fbasename, log=None):
         log_file.write('fext = %s\n\n' % fext)
         log_file.close()
 
+    import meshlabxml as mlx
+
     # Check scale_meta
     scale_meta_default = '1'  # this needs to be a string
     while True:
@@ -0,0 +1,169 @@
+""" In-memory triangle mesh shared by the native (non Blender) functions
+
+Mesh stores float32 vertex and int32 face arrays, with optional per vertex
+normals, colors and uvs. Read and write it with Mesh.read and Mesh.write
+(STL, PLY and obj; see convert).
+
+"""
+
+import numpy as np
+
+
+def weld(vertices, tolerance=None):
+    """ Find the unique vertices.
+
+    Args:
+        vertices (numpy array (n, 3)): vertex coordinates
+        tolerance (float): if set, coordinates are quantized to a grid of
+            this size before comparing, so nearly identical vertices are
+            merged too. Vertices either side of a grid line are not merged
+            even if closer than tolerance. If None only identical vertices
+            are merged.
+
+    Returns:
+        first (numpy int array (k,)): index of the first occurrence of each
+            unique vertex
+        inverse (numpy int32 array (n,)): index into first of each vertex
+    """
+    vertices = np.asarray(vertices, dtype=np.float32)
+    if tolerance is None:
+        # Adding 0.0 turns -0.0 into 0.0 so they have the same bytes
+        keys = np.ascontiguousarray(vertices + np.float32(0.0))
+    else:
+        keys = np.floor(vertices / tolerance + 0.5).astype(np.int64)
+    # Compare the raw bytes of each row; much faster than unique rows
+    keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * 3))).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    return first, inverse.ravel().astype(np.int32)
+
+
+class Mesh(object):
+    """ Triangle mesh backed by NumPy arrays.
+
+    Attributes:
+        vertices (float32 numpy array (n, 3))
+        faces (int32 numpy array (m, 3)): vertex indices of each triangle
+        normals (float32 numpy array (n, 3)): vertex normals or None
+        colors (uint8 numpy array (n, 3 or 4)): vertex colors or None
+        uvs (float32 numpy array (n, 2)): vertex texture coordinates or None
+    """
+    __slots__ = ('vertices', 'faces', 'normals', 'colors', 'uvs')
+
+    def __init__(self, vertices, faces, normals=None, colors=None, uvs=None):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+        self.faces = np.ascontiguousarray(faces, dtype=np.int32).reshape(-1, 3)
+        self.normals = None
+        self.colors = None
+        self.uvs = None
+        if normals is not None:
+            self.normals = np.ascontiguousarray(normals, dtype=np.float32)
+        if colors is not None:
+            colors = np.asarray(colors)
+            if colors.dtype.kind == 'f':
+                colors = np.clip(colors * 255.0 + 0.5, 0, 255)
+            self.colors = np.ascontiguousarray(colors, dtype=np.uint8)
+        if uvs is not None:
+            self.uvs = np.ascontiguousarray(uvs, dtype=np.float32)
+
+    def __repr__(self):
+        return 'Mesh(%d vertices, %d faces)' % (len(self.vertices), len(self.faces))
+
+    @classmethod
+    def read(cls, file_in, weld_tolerance=None):
+        """ Read a STL, PLY or obj file.
+
+        Per vertex attributes are kept; obj uvs and normals are only kept if
+        they are indexed the same as the vertices. STL vertices are welded
+        (see weld).
+        """
+        from . import convert
+        data = convert.read(file_in)
+        num_verts = len(data['vertices'])
+        attributes = {}
+        for name in ('normals', 'colors', 'uvs'):
+            values = data.get(name)
+            face_values = data.get('face_' + name)
+            if values is None or len(values) != num_verts:
+                continue
+            if face_values is not None and not np.array_equal(face_values, data['faces']):
+                continue
+            attributes[name] = values
+        mesh = cls(data['vertices'], data['faces'], **attributes)
+        if weld_tolerance is not None:
+            mesh.weld(weld_tolerance)
+        return mesh
+
+    def write(self, file_out):
+        """ Write a STL, PLY or obj file (see convert.write) """
+        from . import convert
+        convert.write(file_out, self.as_dict())
+        return None
+
+    def as_dict(self):
+        """ The arrays in the dict format of the readers (see convert.read) """
+        data = {'vertices': self.vertices, 'faces': self.faces}
+        for name in ('normals', 'colors', 'uvs'):
+            if getattr(self, name) is not None:
+                data[name] = getattr(self, name)
+        return data
+
+    def copy(self):
+        """ A deep copy of the mesh """
+        return Mesh(self.vertices.copy(), self.faces.copy(),
+                    None if self.normals is None else self.normals.copy(),
+                    None if self.colors is None else self.colors.copy(),
+                    None if self.uvs is None else self.uvs.copy())
+
+    @property
+    def nbytes(self):
+        """ Memory used by the arrays """
+        return sum(getattr(self, name).nbytes for name in self.__slots__
+                   if getattr(self, name) is not None)
+
+    def face_normals(self):
+        """ Unit normal of each triangle (float64) """
+        tris = self.vertices[self.faces].astype(np.float64)
+        normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+        length = np.linalg.norm(normals, axis=1)
+        length[length == 0] = 1.0
+        return normals / length[:, None]
+
+    def weld(self, tolerance=None):
+        """ Merge duplicate vertices in place (see weld).
+
+        Per vertex attributes of the first vertex of each group are kept.
+        Faces that collapse to a line or point are removed.
+
+        Returns:
+            int: number of vertices removed
+        """
+        first, inverse = weld(self.vertices, tolerance)
+        removed = len(self.vertices) - len(first)
+        self.vertices = self.vertices[first]
+        for name in ('normals', 'colors', 'uvs'):
+            if getattr(self, name) is not None:
+                setattr(self, name, getattr(self, name)[first])
+        faces = inverse[self.faces]
+        if tolerance is not None:
+            faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) &
+                          (faces[:, 2] != faces[:, 0])]
+        self.faces = np.ascontiguousarray(faces, dtype=np.int32)
+        return removed
+
+    def remove_unused(self):
+        """ Delete vertices not used by any face.
+
+        Returns:
+            int: number of vertices removed
+        """
+        used = np.zeros(len(self.vertices), dtype=bool)
+        used[self.faces.ravel()] = True
+        if used.all():
+            return 0
+        new_index = (np.cumsum(used) - 1).astype(np.int32)
+        self.vertices = self.vertices[used]
+        for name in ('normals', 'colors', 'uvs'):
+            if getattr(self, name) is not None:
+                setattr(self, name, getattr(self, name)[used])
+        self.faces = new_index[self.faces]
+        return int(len(used) - used.sum())
@@ -33,8 +33,16 @@ import mm
 
 
 def begin():
-    """Start of new MeshMixer script; initialize connection"""
+    """Start of new MeshMixer script; initialize connection
+
+    Connects on the mm-api ports, or on the ports of the instance a
+    mmsession.Session runs the script against.
+    """
+    from . import mmsession
     remote = mmRemote()
+    if mmsession.SEND_PORT_VARIABLE in os.environ:
+        remote.send_port = int(os.environ[mmsession.SEND_PORT_VARIABLE])
+        remote.receive_port = int(os.environ[mmsession.RECEIVE_PORT_VARIABLE])
     remote.connect()
     return remote
 
@@ -66,6 +74,14 @@ def export_mesh(remote, mesh_object, file_out=None):
     return None
 
 
+def clear_scene(remote):
+    """Remove all objects from the scene"""
+    cmd = mmapi.StoredCommands()
+    cmd.AppendSceneCommand_Clear()
+    remote.runCommand(cmd)
+    return None
+
+
 def hollow(remote, mesh_object, offset=2,
            solid_resolution=128, mesh_resolution=128):
     """ Hollow mesh
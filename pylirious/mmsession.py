@@ -0,0 +1,462 @@
+#! python2.7
+""" Persistent MeshMixer sessions
+
+Keeps one or more MeshMixer instances running and hands out connected
+mmRemote handles to jobs, so that a batch of jobs doesn't need to start
+and shut down MeshMixer for every script.
+
+Example:
+    session = mmsession.Session()
+    session.start()
+    with session.job() as remote:
+        obj = mmlirious.import_mesh(remote, file_in='a.obj')
+        ...
+    session.close()
+
+Session.run_script runs a MeshMixer script written by write_mmpy against
+an idle instance (see write_mmpy.run and pylirious.hollow_volumes).
+
+Also includes a stand-in server (StandIn) that emulates MeshMixer's side
+of the mm-api socket protocol, and PacketRemote, a raw socket client for
+it, so sessions can be exercised without MeshMixer or mm-api:
+    python -m pylirious.mmsession --stand-in
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import contextlib
+
+try:
+    import queue
+except ImportError:  # Python 2.7
+    import Queue as queue
+
+# mm-api default ports (see mmRemote)
+SEND_PORT = 0xAFCF
+RECEIVE_PORT = 0xAFDF
+
+# Environment variables that tell a script run by Session.run_script
+# which ports to connect on (see mmlirious.begin)
+SEND_PORT_VARIABLE = 'MM_SEND_PORT'
+RECEIVE_PORT_VARIABLE = 'MM_RECEIVE_PORT'
+
+
+class Instance(object):
+    """ A MeshMixer process and its connected remote
+
+    MeshMixer always listens on the same port, so normally there can only
+    be one instance per machine; additional instances need a program that
+    listens on other ports (e.g. the stand-in server).
+    """
+
+    def __init__(self, program=None, send_port=SEND_PORT,
+                 receive_port=RECEIVE_PORT, startup_delay=5, log=None,
+                 connector=None, ping=None, clear=None):
+        if program is None:
+            program = ['meshmixer']
+        self.program = program
+        self.send_port = send_port
+        self.receive_port = receive_port
+        self.startup_delay = startup_delay
+        self.log = log
+        # How to connect a remote, check it answers and clear its scene;
+        # mmRemote by default
+        self.connector = connect if connector is None else connector
+        self.ping = list_objects if ping is None else ping
+        self.clear = clear_scene if clear is None else clear
+        self.proc = None
+        self.remote = None
+        self.restarts = 0
+
+    def start(self):
+        """Launch the program and connect a remote to it"""
+        if self.log is not None:
+            log_file = open(self.log, 'a')
+            log_file.write('meshmixer cmd = %s\n' % ' '.join(self.program))
+        else:
+            log_file = None
+            print('meshmixer cmd = %s' % ' '.join(self.program))
+        self.proc = subprocess.Popen(self.program, stdout=log_file,
+                                     stderr=log_file, universal_newlines=True)
+        if log_file is not None:
+            log_file.close()
+        # No reliable "ready" signal from MeshMixer; use a fixed delay
+        # like write_mmpy.run
+        time.sleep(self.startup_delay)
+        self.remote = self.connector(self.send_port, self.receive_port)
+        return self.remote
+
+    def stop(self):
+        """Disconnect the remote and terminate the program"""
+        if self.remote is not None:
+            self.remote.shutdown()
+            self.remote = None
+        if self.proc is not None:
+            if self.proc.poll() is None:
+                self.proc.terminate()
+                self.proc.wait()
+            self.proc = None
+        return None
+
+    def restart(self):
+        """Stop and start the instance again"""
+        self.stop()
+        self.restarts += 1
+        return self.start()
+
+    def reconnect(self):
+        """Connect a new remote, e.g. after lending the ports to a script"""
+        if self.remote is not None:
+            self.remote.shutdown()
+        self.remote = self.connector(self.send_port, self.receive_port)
+        return self.remote
+
+    def alive(self):
+        """Check that the program is running and answering commands"""
+        if self.proc is None or self.proc.poll() is not None:
+            return False
+        try:
+            self.ping(self.remote)
+        except (socket.error, socket.timeout):
+            return False
+        return True
+
+
+class Session(object):
+    """ A pool of running MeshMixer instances
+
+    Args:
+        instances (int): number of instances to keep running
+        program (list): command to launch MeshMixer
+        ports (list): (send_port, receive_port) for each instance; defaults
+            to the mm-api ports for the first instance and consecutive
+            port pairs for the others
+        startup_delay (float): seconds to wait for an instance to start
+        log (str): filename of the log file (optional)
+        connector (function): connector(send_port, receive_port) returns a
+            connected remote; default is connect (mmRemote)
+        ping (function): ping(remote) raises socket.error or socket.timeout
+            if the instance doesn't answer; default is list_objects
+        clear (function): clear(remote) clears the scene between jobs;
+            default is clear_scene
+    """
+
+    def __init__(self, instances=1, program=None, ports=None,
+                 startup_delay=5, log=None, connector=None, ping=None,
+                 clear=None):
+        if ports is None:
+            ports = [(SEND_PORT + 2 * i, RECEIVE_PORT + 2 * i)
+                     for i in range(instances)]
+        self.instances = [Instance(program, send_port, receive_port,
+                                   startup_delay, log, connector, ping, clear)
+                          for send_port, receive_port in ports[:instances]]
+        self._idle = queue.Queue()
+        self._busy = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Launch all instances"""
+        for instance in self.instances:
+            instance.start()
+            self._idle.put(instance)
+        return None
+
+    def acquire(self, timeout=None):
+        """Wait for an idle instance and return its connected remote.
+
+        Dead instances are restarted before they are handed out.
+        """
+        instance = self._idle.get(timeout=timeout)
+        if not instance.alive():
+            instance.restart()
+        with self._lock:
+            self._busy[id(instance.remote)] = instance
+        return instance.remote
+
+    def release(self, remote, clear=True):
+        """Return a remote to the pool, clearing its scene for the next job.
+
+        If the instance died during the job it is restarted. The instance
+        goes back to the pool whatever happens.
+        """
+        with self._lock:
+            instance = self._busy.pop(id(remote))
+        try:
+            if clear:
+                instance.clear(remote)
+        except (socket.error, socket.timeout):
+            instance.restart()
+        finally:
+            self._idle.put(instance)
+        return None
+
+    def run_script(self, cmd, log_file=None, timeout=None, clear=True):
+        """ Run a script (shell command cmd) against an idle instance
+
+        The instance's remote hands its ports over to the script while it
+        runs; the script finds them in the MM_SEND_PORT and
+        MM_RECEIVE_PORT environment variables (mmlirious.begin reads
+        them). The scene is cleared afterwards, as with release.
+
+        Args:
+            log_file (file): where the script's output goes
+
+        Returns:
+            int: the return code of cmd
+        """
+        remote = self.acquire(timeout)
+        with self._lock:
+            instance = self._busy.pop(id(remote))
+        env = dict(os.environ)
+        env[SEND_PORT_VARIABLE] = str(instance.send_port)
+        env[RECEIVE_PORT_VARIABLE] = str(instance.receive_port)
+        try:
+            instance.remote.shutdown()
+            instance.remote = None
+            return subprocess.call(cmd, shell=True, stdout=log_file, stderr=log_file,
+                                   env=env, universal_newlines=True)
+        finally:
+            try:
+                remote = instance.reconnect()
+            except (socket.error, socket.timeout):
+                remote = instance.restart()
+            with self._lock:
+                self._busy[id(remote)] = instance
+            self.release(remote, clear)
+
+    @contextlib.contextmanager
+    def job(self, timeout=None):
+        """Context manager that acquires a remote and releases it at the end"""
+        remote = self.acquire(timeout)
+        try:
+            yield remote
+        finally:
+            self.release(remote)
+
+    def close(self):
+        """Shut down all instances"""
+        for instance in self.instances:
+            instance.stop()
+        return None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+
+def connect(send_port=SEND_PORT, receive_port=RECEIVE_PORT):
+    """Create a mmRemote connected on the given ports"""
+    from . import mmlirious
+    remote = mmlirious.mmRemote()
+    remote.send_port = send_port
+    remote.receive_port = receive_port
+    remote.connect()
+    return remote
+
+
+def list_objects(remote):
+    """List the objects in the MeshMixer scene; also serves as a ping"""
+    from . import mmlirious
+    return mmlirious.mm.scene.list_objects(remote)
+
+
+def clear_scene(remote):
+    """Remove all objects from the MeshMixer scene"""
+    from . import mmlirious
+    return mmlirious.clear_scene(remote)
+
+
+class PacketRemote(object):
+    """ Minimal mm-api socket client: sends raw packets to send_port and
+    waits for the answer on receive_port, like mmRemote but without
+    serializing commands. Used with the stand-in server.
+
+    Args:
+        timeout (float): seconds to wait for an answer before raising
+            socket.timeout
+    """
+
+    def __init__(self, send_port=SEND_PORT, receive_port=RECEIVE_PORT,
+                 address='127.0.0.1', timeout=5.0):
+        self.send_port = send_port
+        self.receive_port = receive_port
+        self.address = address
+        self.timeout = timeout
+        self.send_socket = None
+        self.receive_socket = None
+
+    def connect(self):
+        """Open the sockets"""
+        self.send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receive_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receive_socket.bind((self.address, self.receive_port))
+        self.receive_socket.settimeout(self.timeout)
+        return None
+
+    def send(self, data):
+        """Send a packet and return the answer"""
+        self.send_socket.sendto(data, (self.address, self.send_port))
+        answer, _ = self.receive_socket.recvfrom(65536)
+        return answer
+
+    def shutdown(self):
+        """Close the sockets"""
+        for sock in (self.send_socket, self.receive_socket):
+            if sock is not None:
+                sock.close()
+        self.send_socket = None
+        self.receive_socket = None
+        return None
+
+
+def connect_packet(send_port=SEND_PORT, receive_port=RECEIVE_PORT):
+    """Create a PacketRemote connected on the given ports (see connect)"""
+    remote = PacketRemote(send_port, receive_port)
+    remote.connect()
+    return remote
+
+
+def ping_packet(remote):
+    """Check a PacketRemote is answered (see list_objects)"""
+    if remote.send(b'ping') != b'ping':
+        raise socket.error('unexpected answer from %s' % remote.send_port)
+    return None
+
+
+def clear_packet(remote):
+    """Clear the stand-in's scene through a PacketRemote (see clear_scene)"""
+    if remote.send(b'clear') != b'ok':
+        raise socket.error('unexpected answer from %s' % remote.send_port)
+    return None
+
+
+class StandIn(object):
+    """ Emulate MeshMixer's side of the mm-api socket protocol.
+
+    Listens for command packets on send_port and answers each one on
+    receive_port with handler(packet), by default answer.
+
+    Args:
+        handler (function): handler(packet) returns the answer (bytes), or
+            None to not answer, e.g. to test timeouts
+    """
+
+    def __init__(self, send_port=SEND_PORT, receive_port=RECEIVE_PORT,
+                 address='127.0.0.1', handler=None):
+        self.send_port = send_port
+        self.receive_port = receive_port
+        self.address = address
+        self.handler = self.answer if handler is None else handler
+        self.received = 0
+        # Files "imported" into the emulated scene
+        self.objects = []
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def answer(self, packet):
+        """ Default handler: emulate a scene of imported files
+
+        Understands these commands from a PacketRemote:
+            ping: answers ping
+            clear: empties the scene, answers ok
+            import <file>: adds file to the scene, answers its object ID
+            list: answers the object IDs, separated by spaces
+        Other packets, such as mm-api's serialized commands, are answered
+        with themselves: the commands with empty results. Nothing is
+        executed.
+        """
+        command, _, argument = packet.partition(b' ')
+        if command == b'ping':
+            return b'ping'
+        if command == b'clear':
+            del self.objects[:]
+            return b'ok'
+        if command == b'import':
+            self.objects.append(argument.decode('utf-8'))
+            return str(len(self.objects)).encode('ascii')
+        if command == b'list':
+            return ' '.join(str(i + 1) for i in range(len(self.objects))).encode('ascii')
+        return packet
+
+    def _bind(self):
+        """Listening socket on send_port"""
+        listen_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        listen_socket.bind((self.address, self.send_port))
+        listen_socket.settimeout(0.1)
+        return listen_socket
+
+    def _serve(self, listen_socket):
+        """Answer packets on listen_socket until stop is called"""
+        reply_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            while not self._stopping.is_set():
+                try:
+                    data, _ = listen_socket.recvfrom(65536)
+                except socket.timeout:
+                    continue
+                self.received += 1
+                answer = self.handler(data)
+                if answer is not None:
+                    reply_socket.sendto(answer, (self.address, self.receive_port))
+        finally:
+            listen_socket.close()
+            reply_socket.close()
+        return None
+
+    def serve_forever(self):
+        """Answer packets until stop is called"""
+        self._stopping.clear()
+        return self._serve(self._bind())
+
+    def start(self):
+        """Serve in a background thread; listening when this returns"""
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._serve, args=(self._bind(),))
+        self._thread.daemon = True
+        self._thread.start()
+        return None
+
+    def stop(self):
+        """Stop serving and wait for the thread to end"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return None
+
+
+def stand_in(send_port=SEND_PORT, receive_port=RECEIVE_PORT, address='127.0.0.1'):
+    """Run a StandIn server until interrupted"""
+    try:
+        StandIn(send_port, receive_port, address).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MeshMixer session tools')
+    parser.add_argument('--stand-in', dest='stand_in', action='store_true',
+                        help='run a stand-in server emulating the mm-api socket protocol')
+    parser.add_argument('--send-port', dest='send_port', type=int, default=SEND_PORT)
+    parser.add_argument('--receive-port', dest='receive_port', type=int,
+                        default=RECEIVE_PORT)
+    args = parser.parse_args()
+    if args.stand_in:
+        stand_in(args.send_port, args.receive_port)
+    return None
+
+if __name__ == '__main__':
+    main()
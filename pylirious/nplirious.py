@@ -0,0 +1,977 @@
+""" Native (NumPy) counterparts of bpylirious functions
+
+Functions work on a mesh.Mesh in place and take the same parameters as
+the bpylirious function of the same name, so they can run without
+launching Blender. Read and write meshes with mesh.Mesh.read and
+mesh.Mesh.write.
+
+"""
+
+import os
+
+import numpy as np
+
+from . import filename
+
+AXES = {'x': 0, 'y': 1, 'z': 2}
+
+
+def _axis_index(axis):
+    """Index (0-2) of axis 'x', 'y' or 'z'"""
+    try:
+        return AXES[axis.lower()]
+    except KeyError:
+        raise ValueError('axis must be x, y or z, not "%s"' % axis)
+
+
+def _lerp_attributes(mesh, verts_a, verts_b, t):
+    """Per vertex attributes of new vertices between verts_a and verts_b"""
+    attributes = {}
+    for name in ('normals', 'colors', 'uvs'):
+        values = getattr(mesh, name)
+        if values is None:
+            continue
+        start = values[verts_a].astype(np.float64)
+        new = start + (values[verts_b] - start) * t[:, None]
+        if name == 'normals':
+            length = np.linalg.norm(new, axis=1)
+            length[length == 0] = 1.0
+            new /= length[:, None]
+        elif name == 'colors':
+            new = np.clip(new + 0.5, 0, 255)
+        attributes[name] = new
+    return attributes
+
+
+def _append_vertices(mesh, vertices, attributes):
+    """ Add vertices (and their per vertex attributes) to a mesh
+
+    Returns:
+        numpy int32 array: indices of the new vertices
+    """
+    start = len(mesh.vertices)
+    mesh.vertices = np.concatenate((mesh.vertices, np.asarray(vertices, dtype=np.float32)))
+    for name, new in attributes.items():
+        values = getattr(mesh, name)
+        setattr(mesh, name, np.concatenate((values, new.astype(values.dtype))))
+    return np.arange(start, len(mesh.vertices), dtype=np.int32)
+
+
+def _edge_loops(edges):
+    """ Chain directed edges (k, 2) into closed loops of vertex indices.
+
+    Open chains are dropped.
+    """
+    following = {}
+    for vert_a, vert_b in edges.tolist():
+        following.setdefault(vert_a, []).append(vert_b)
+    loops = []
+    while following:
+        start = next(iter(following))
+        loop = [start]
+        current = start
+        closed = False
+        while True:
+            ends = following.get(current)
+            if not ends:
+                break
+            next_vert = ends.pop()
+            if not ends:
+                del following[current]
+            if next_vert == start:
+                closed = True
+                break
+            loop.append(next_vert)
+            current = next_vert
+        if closed and len(loop) >= 3:
+            loops.append(loop)
+    return loops
+
+
+def _signed_area(points):
+    """Signed area of a 2D polygon; positive if counterclockwise"""
+    x = points[:, 0]
+    y = points[:, 1]
+    return 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def _point_in_polygon(point, points):
+    """Even-odd test of a 2D point against a polygon"""
+    x_a, y_a = points[:, 0], points[:, 1]
+    x_b, y_b = np.roll(x_a, -1), np.roll(y_a, -1)
+    straddle = (y_a > point[1]) != (y_b > point[1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x_a + (point[1] - y_a) * (x_b - x_a) / (y_b - y_a)
+    return bool(np.count_nonzero(straddle & (x_cross > point[0])) % 2)
+
+
+def _bridge_holes(points, outer, holes):
+    """ Join holes to a counterclockwise outer loop with bridge edges
+
+    Same hole elimination as earcut: a horizontal ray from the rightmost
+    hole vertex finds a visible outer vertex, and the hole is spliced into
+    the outer loop there. Holes must be clockwise.
+
+    Returns:
+        list: indices into points of the single merged polygon
+    """
+    polygon = list(outer)
+    for hole in sorted(holes, key=lambda hole: -points[hole, 0].max()):
+        hole = list(hole)
+        hole_start = int(np.argmax(points[hole, 0]))
+        m_x, m_y = points[hole[hole_start]]
+        poly = np.array(polygon)
+        pts_a = points[poly]
+        pts_b = points[np.roll(poly, -1)]
+        straddle = (pts_a[:, 1] > m_y) != (pts_b[:, 1] > m_y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = pts_a[:, 0] + (m_y - pts_a[:, 1]) * (
+                pts_b[:, 0] - pts_a[:, 0]) / (pts_b[:, 1] - pts_a[:, 1])
+        valid = straddle & (x_cross >= m_x)
+        if valid.any():
+            edge = int(np.flatnonzero(valid)[np.argmin(x_cross[valid])])
+            bridge = edge if pts_a[edge, 0] > pts_b[edge, 0] else (edge + 1) % len(poly)
+            # An outer vertex inside the triangle (M, ray hit, bridge vertex)
+            # would block the bridge; use the one closest in angle to the ray
+            hit = np.array([x_cross[edge], m_y])
+            p_x, p_y = points[poly[bridge]]
+            tri = np.array([[m_x, m_y], hit, [p_x, p_y]])
+            if _signed_area(tri) < 0:
+                tri = tri[::-1]
+            inside = np.ones(len(poly), dtype=bool)
+            for corner in range(3):
+                start = tri[corner]
+                end = tri[(corner + 1) % 3]
+                inside &= ((end[0] - start[0]) * (pts_a[:, 1] - start[1]) -
+                           (end[1] - start[1]) * (pts_a[:, 0] - start[0])) >= 0
+            inside[bridge] = False
+            inside &= pts_a[:, 0] > m_x
+            if inside.any():
+                candidates = np.flatnonzero(inside)
+                angles = np.abs(np.arctan2(pts_a[candidates, 1] - m_y,
+                                           pts_a[candidates, 0] - m_x))
+                bridge = int(candidates[np.argmin(angles)])
+        else:
+            # Nothing to the right (hole not inside outer?); bridge to nearest
+            bridge = int(np.argmin(np.sum((pts_a - (m_x, m_y)) ** 2, axis=1)))
+        polygon = (polygon[:bridge + 1] + hole[hole_start:] + hole[:hole_start + 1] +
+                   polygon[bridge:])
+    return polygon
+
+
+def _triangulate_polygon(points):
+    """ Ear clipping triangulation of a simple counterclockwise 2D polygon
+
+    Bridged holes (see _bridge_holes) are fine: vertices that coincide with
+    an ear's corners don't block it.
+
+    Returns:
+        numpy int array (k - 2, 3): indices into points of each triangle
+    """
+    count = len(points)
+    x = points[:, 0]
+    y = points[:, 1]
+    prev_vert = [(i - 1) % count for i in range(count)]
+    next_vert = [(i + 1) % count for i in range(count)]
+    active = np.ones(count, dtype=bool)
+    triangles = []
+    remaining = count
+    current = 0
+    stalled = 0
+    while remaining > 3:
+        vert_a = prev_vert[current]
+        vert_c = next_vert[current]
+        corners = (vert_a, current, vert_c)
+        is_ear = ((x[current] - x[vert_a]) * (y[vert_c] - y[current]) -
+                  (y[current] - y[vert_a]) * (x[vert_c] - x[current])) > 0
+        if is_ear:
+            others = active.copy()
+            others[list(corners)] = False
+            for corner in corners:
+                others &= (x != x[corner]) | (y != y[corner])
+            p_x = x[others]
+            p_y = y[others]
+            inside = np.ones(len(p_x), dtype=bool)
+            for corner in range(3):
+                start = corners[corner]
+                end = corners[(corner + 1) % 3]
+                inside &= ((x[end] - x[start]) * (p_y - y[start]) -
+                           (y[end] - y[start]) * (p_x - x[start])) >= 0
+            is_ear = not inside.any()
+        if is_ear:
+            triangles.append(corners)
+            active[current] = False
+            next_vert[vert_a] = vert_c
+            prev_vert[vert_c] = vert_a
+            remaining -= 1
+            current = vert_a
+            stalled = 0
+        else:
+            current = vert_c
+            stalled += 1
+            if stalled > remaining:
+                # Degenerate polygon (no ear left); fan the rest
+                break
+    start = current
+    current = next_vert[start]
+    while next_vert[current] != start:
+        triangles.append((start, current, next_vert[current]))
+        current = next_vert[current]
+    return np.array(triangles, dtype=np.int64).reshape(-1, 3)
+
+
+def _fill_loops(mesh, loops, index, poke=False):
+    """ Triangulate planar loops lying on a plane perpendicular to axis index
+
+    Loops are in the order of the new faces. Loops wound the other way to
+    the largest loop are holes in the loop that contains them.
+
+    Returns:
+        numpy int32 array (k, 3): the new faces
+    """
+    if not loops:
+        return np.zeros((0, 3), dtype=np.int32)
+    axes_2d = [(index + 1) % 3, (index + 2) % 3]
+    coords = [mesh.vertices[loop][:, axes_2d].astype(np.float64) for loop in loops]
+    areas = np.array([_signed_area(points) for points in coords])
+    outer_sign = np.sign(areas[np.argmax(np.abs(areas))])
+    if outer_sign < 0:
+        # Mirror so the outer loops are counterclockwise
+        coords = [points * (1.0, -1.0) for points in coords]
+        areas = -areas
+    outers = [i for i in range(len(loops)) if areas[i] > 0]
+    holes = dict((i, []) for i in outers)
+    for i in range(len(loops)):
+        if areas[i] > 0:
+            continue
+        containing = [j for j in outers if _point_in_polygon(coords[i][0], coords[j])]
+        if containing:
+            holes[min(containing, key=lambda j: areas[j])].append(i)
+
+    faces = []
+    for i in outers:
+        loop = np.array(loops[i])
+        if poke and not holes[i]:
+            center = mesh.vertices[loop].mean(axis=0)
+            attributes = {}
+            for name in ('normals', 'colors', 'uvs'):
+                values = getattr(mesh, name)
+                if values is not None:
+                    attributes[name] = values[loop].mean(axis=0)[None, :]
+            center_index = _append_vertices(mesh, center[None, :], attributes)[0]
+            fan = np.stack((np.full(len(loop), center_index), loop, np.roll(loop, -1)), axis=1)
+            faces.append(fan)
+            continue
+        # Work with positions in the concatenated loop + hole coordinates
+        verts = np.concatenate([loop] + [np.array(loops[j]) for j in holes[i]])
+        points = np.concatenate([coords[i]] + [coords[j] for j in holes[i]])
+        offsets = np.cumsum([len(loop)] + [len(loops[j]) for j in holes[i]])
+        outer = list(range(len(loop)))
+        hole_lists = [list(range(offsets[k], offsets[k + 1])) for k in range(len(holes[i]))]
+        polygon = np.array(_bridge_holes(points, outer, hole_lists))
+        triangles = _triangulate_polygon(points[polygon])
+        faces.append(verts[polygon[triangles]])
+    if not faces:
+        return np.zeros((0, 3), dtype=np.int32)
+    return np.concatenate(faces).astype(np.int32)
+
+
+def plane_cut(mesh, axis='z', offset=0.0, direction=1, use_fill=True,
+              clear_inner=True, clear_outer=False, threshold=0.0001,
+              poke=False):
+    """ Plane cut, like bpylirious.plane_cut (Blender's bisect operator)
+
+    The plane is perpendicular to axis at offset, and direction sets which
+    way its normal points. Vertices within threshold of the plane are moved
+    onto it. Triangles crossing the plane are split; the new vertices are
+    shared by neighbouring triangles so the mesh stays closed.
+
+    Args:
+        mesh (mesh.Mesh): the mesh to cut, modified in place
+        clear_inner (bool): delete the geometry behind the plane normal
+        clear_outer (bool): delete the geometry in front of the plane normal
+        use_fill (bool): cap the holes left in the cut with triangles. Inner
+            outlines (e.g. the wall of a hollowed model) become holes in
+            the cap.
+        poke (bool): fill each cap with a fan around a new center vertex
+            instead; only for caps without holes
+
+    Returns: None
+    """
+    index = _axis_index(axis)
+    sign = 1.0 if direction >= 0 else -1.0
+    dist = (mesh.vertices[:, index].astype(np.float64) - offset) * sign
+    on_plane = np.abs(dist) <= threshold
+    dist[on_plane] = 0.0
+    mesh.vertices[on_plane, index] = offset
+    side = np.sign(dist).astype(np.int8)
+
+    faces = mesh.faces
+    face_sides = side[faces]
+    crossing = (face_sides.max(axis=1) > 0) & (face_sides.min(axis=1) < 0)
+    if crossing.any():
+        cross_faces = faces[crossing]
+        cross_sides = face_sides[crossing]
+
+        # One new vertex per crossed edge, shared by the faces on either side
+        edges = np.stack((cross_faces, np.roll(cross_faces, -1, axis=1)), axis=2).reshape(-1, 2)
+        edges = edges[side[edges[:, 0]] * side[edges[:, 1]] < 0]
+        edges = np.unique(np.sort(edges, axis=1), axis=0)
+        num_verts = np.int64(len(mesh.vertices))
+        edge_keys = edges[:, 0].astype(np.int64) * num_verts + edges[:, 1]
+        t = dist[edges[:, 0]] / (dist[edges[:, 0]] - dist[edges[:, 1]])
+        verts_a = mesh.vertices[edges[:, 0]].astype(np.float64)
+        points = verts_a + (mesh.vertices[edges[:, 1]] - verts_a) * t[:, None]
+        points[:, index] = offset
+        new_verts = _append_vertices(
+            mesh, points, _lerp_attributes(mesh, edges[:, 0], edges[:, 1], t))
+        side = np.concatenate((side, np.zeros(len(new_verts), dtype=np.int8)))
+
+        def cut_vertex(vert_a, vert_b):
+            """New vertex on the edge between vert_a and vert_b"""
+            keys = (np.minimum(vert_a, vert_b).astype(np.int64) * num_verts +
+                    np.maximum(vert_a, vert_b))
+            return new_verts[np.searchsorted(edge_keys, keys)]
+
+        # Rotate each face so it starts with its vertex on the plane or, if it
+        # has none, with the vertex alone on its side; winding is unchanged
+        has_zero = (cross_sides == 0).any(axis=1)
+        lone_sign = -np.sign(cross_sides.sum(axis=1, dtype=np.int64))
+        first = np.where(has_zero, np.argmax(cross_sides == 0, axis=1),
+                         np.argmax(cross_sides == lone_sign[:, None], axis=1))
+        rotated = np.take_along_axis(cross_faces, (first[:, None] + np.arange(3)) % 3, axis=1)
+        vert_0, vert_1, vert_2 = rotated.T
+
+        # Vertex 0 on the plane: one cut on the opposite edge, two triangles
+        zero = has_zero
+        cut = cut_vertex(vert_1[zero], vert_2[zero])
+        split = [np.stack((vert_0[zero], vert_1[zero], cut), axis=1),
+                 np.stack((vert_0[zero], cut, vert_2[zero]), axis=1)]
+        # Vertex 0 alone: two cuts, one triangle on its side, two on the other
+        lone = ~has_zero
+        cut_1 = cut_vertex(vert_0[lone], vert_1[lone])
+        cut_2 = cut_vertex(vert_2[lone], vert_0[lone])
+        split += [np.stack((vert_0[lone], cut_1, cut_2), axis=1),
+                  np.stack((cut_1, vert_1[lone], vert_2[lone]), axis=1),
+                  np.stack((cut_1, vert_2[lone], cut_2), axis=1)]
+        faces = np.concatenate([faces[~crossing]] + split).astype(np.int32)
+        face_sides = side[faces]
+
+    keep = np.ones(len(faces), dtype=bool)
+    if clear_inner:
+        keep &= face_sides.min(axis=1) >= 0
+    if clear_outer:
+        keep &= face_sides.max(axis=1) <= 0
+    faces = faces[keep]
+
+    if use_fill and (clear_inner or clear_outer):
+        # Boundary edges on the plane, reversed so the caps face outwards
+        num_verts = np.int64(len(mesh.vertices))
+        half_edges = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2).astype(np.int64)
+        keys = half_edges[:, 0] * num_verts + half_edges[:, 1]
+        reverse_keys = half_edges[:, 1] * num_verts + half_edges[:, 0]
+        boundary = ~np.isin(keys, reverse_keys)
+        boundary &= (side[half_edges[:, 0]] == 0) & (side[half_edges[:, 1]] == 0)
+        loops = _edge_loops(half_edges[boundary][:, ::-1])
+        faces = np.concatenate((faces, _fill_loops(mesh, loops, index, poke)))
+
+    mesh.faces = np.ascontiguousarray(faces, dtype=np.int32)
+    mesh.remove_unused()
+    return None
+
+
+def _face_adjacency(faces):
+    """ Pairs of faces sharing an edge (with opposite winding)
+
+    Returns:
+        face_a, face_b (numpy int arrays): each pair appears once per
+            direction
+    """
+    num_verts = np.int64(faces.max()) + 1 if len(faces) else np.int64(0)
+    half_edges = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2).astype(np.int64)
+    keys = half_edges[:, 0] * num_verts + half_edges[:, 1]
+    reverse_keys = half_edges[:, 1] * num_verts + half_edges[:, 0]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    position = np.minimum(np.searchsorted(sorted_keys, reverse_keys), len(keys) - 1)
+    found = sorted_keys[position] == reverse_keys
+    face_a = np.flatnonzero(found) // 3
+    face_b = order[position[found]] // 3
+    return face_a, face_b
+
+
+def select_linked_flat(mesh, face_mask, angle=1):
+    """ Grow a face selection across edges flatter than angle (degrees)
+
+    Same as Blender's faces_select_linked_flat with sharpness=angle.
+
+    Returns:
+        numpy bool array: the grown selection
+    """
+    from . import components
+    face_a, face_b = _face_adjacency(mesh.faces)
+    normals = mesh.face_normals()
+    cos_angle = np.einsum('ij,ij->i', normals[face_a], normals[face_b])
+    flat = cos_angle >= np.cos(np.radians(angle))
+    roots = components.union_find(face_a[flat], face_b[flat], len(mesh.faces))
+    selected_roots = np.zeros(len(mesh.faces), dtype=bool)
+    selected_roots[roots[face_mask]] = True
+    return selected_roots[roots]
+
+
+def extrude_region(mesh, face_mask, value):
+    """ Extrude the selected faces, like Blender's extrude_region_move
+
+    The selected faces are moved by value (x, y, z) and joined to the rest
+    of the mesh by side walls along the edge of the selection.
+
+    Returns: None
+    """
+    faces = mesh.faces
+    region = faces[face_mask]
+    if not len(region):
+        return None
+    # Side walls: region edges without a region face on the other side
+    num_verts = np.int64(len(mesh.vertices))
+    half_edges = region[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2).astype(np.int64)
+    keys = half_edges[:, 0] * num_verts + half_edges[:, 1]
+    reverse_keys = half_edges[:, 1] * num_verts + half_edges[:, 0]
+    rim = half_edges[~np.isin(reverse_keys, keys)]
+
+    # Copy the region vertices and move the region onto the copies
+    region_verts = np.unique(region)
+    new_index = np.full(len(mesh.vertices), -1, dtype=np.int64)
+    attributes = {}
+    for name in ('normals', 'colors', 'uvs'):
+        values = getattr(mesh, name)
+        if values is not None:
+            attributes[name] = values[region_verts]
+    new_index[region_verts] = _append_vertices(
+        mesh, mesh.vertices[region_verts] + np.asarray(value, dtype=np.float32), attributes)
+    moved = new_index[region]
+
+    vert_a, vert_b = rim[:, 0], rim[:, 1]
+    new_a, new_b = new_index[vert_a], new_index[vert_b]
+    walls = np.concatenate((np.stack((vert_a, vert_b, new_b), axis=1),
+                            np.stack((vert_a, new_b, new_a), axis=1)))
+    mesh.faces = np.concatenate((faces[~face_mask], moved, walls)).astype(np.int32)
+    mesh.remove_unused()
+    return None
+
+
+def select_plane(mesh, axis='z', offset=0.0, threshold=0.00001):
+    """ Select the faces with all their vertices on a plane
+
+    Returns:
+        numpy bool array: True for each selected face
+    """
+    index = _axis_index(axis)
+    on_plane = np.abs(mesh.vertices[:, index] - offset) <= threshold
+    return on_plane[mesh.faces].all(axis=1)
+
+
+def extrude_bottom(mesh, threshold=0.00001, distance=6, angle=1, clear_selection=True):
+    """ Extrude the faces on the XY plane (Z = 0) down by distance
+
+    Same as bpylirious.extrude_bottom: the faces on the plane are grown to
+    the linked faces within angle (degrees) of flat before extruding, and
+    clear_selection has no effect since there is no selection to clear.
+
+    Returns: None
+    """
+    selected = select_plane(mesh, axis='z', offset=0.0, threshold=threshold)
+    if not selected.any():
+        return None
+    selected = select_linked_flat(mesh, selected, angle)
+    extrude_region(mesh, selected, (0.0, 0.0, -distance))
+    return None
+
+
+def spherical_select(mesh, center=(0.0, 0.0, 0.0), radius=1, method='FACE'):
+    """ Select within a spherical volume with center and radius
+
+    Same selection as bpylirious.spherical_select: faces by their center,
+    or vertices. Faces are found with a bvh.BVH.
+
+    Returns:
+        numpy bool array: True for each selected face (or vertex)
+    """
+    center = np.asarray(center, dtype=np.float64)
+    if method == 'FACE':
+        from . import bvh
+        selected = np.zeros(len(mesh.faces), dtype=bool)
+        selected[bvh.BVH(mesh.vertices, mesh.faces).faces_in_sphere(center, radius)] = True
+        return selected
+    return np.sum((mesh.vertices - center) ** 2, axis=1) <= radius ** 2
+
+
+BLENDING_MODES = ('MIX', 'ADD', 'SUBTRACT', 'MULTIPLY', 'SCREEN', 'OVERLAY',
+                  'DIFFERENCE', 'DIVIDE', 'DARKEN', 'LIGHTEN', 'HUE', 'SATURATION',
+                  'VALUE', 'COLOR', 'SOFT_LIGHT', 'LINEAR_LIGHT')
+
+
+def load_image(image_file):
+    """ Read an image file into a float RGBA array (rows top to bottom)
+
+    Needs Pillow (pip install Pillow).
+
+    Returns:
+        float32 numpy array (height, width, 4): values between 0 and 1
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError('reading images needs Pillow: pip install Pillow')
+    image = Image.open(image_file)
+    try:
+        return np.asarray(image.convert('RGBA'), dtype=np.float32) / 255.0
+    finally:
+        image.close()
+
+
+def _image_array(image):
+    """Float RGBA array (0-1) of an image filename or array"""
+    if isinstance(image, str):
+        return load_image(image)
+    image = np.asarray(image)
+    if image.ndim == 2:
+        image = image[:, :, None].repeat(3, axis=2)
+    if image.dtype.kind in 'ui':
+        image = image.astype(np.float32) / 255.0
+    if image.shape[2] == 3:
+        image = np.concatenate((image, np.ones(image.shape[:2] + (1,), image.dtype)), axis=2)
+    return image.astype(np.float32)
+
+
+def _sample_image(image, uvs, mapping_mode='CLIP', mirror_x=False, mirror_y=False):
+    """ Bilinear lookup of image (height, width, 4) at each uv
+
+    CLIP gives transparent black outside 0-1, REPEAT tiles the image and
+    EXTEND repeats the edge pixels.
+    """
+    height, width = image.shape[:2]
+    u = uvs[:, 0].astype(np.float64)
+    v = uvs[:, 1].astype(np.float64)
+    if mirror_x:
+        u = 1.0 - u
+    if mirror_y:
+        v = 1.0 - v
+    outside = (u < 0) | (u > 1) | (v < 0) | (v > 1)
+    if mapping_mode == 'REPEAT':
+        u = u - np.floor(u)
+        v = v - np.floor(v)
+    elif mapping_mode not in ('CLIP', 'EXTEND'):
+        raise ValueError('mappingMode must be CLIP, REPEAT or EXTEND, not "%s"' % mapping_mode)
+    # Pixel centers are at half pixels; image rows run top to bottom
+    x = u * width - 0.5
+    y = (1.0 - v) * height - 0.5
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    fx = (x - x0)[:, None]
+    fy = (y - y0)[:, None]
+    x0 = x0.astype(np.int64)
+    y0 = y0.astype(np.int64)
+    if mapping_mode == 'REPEAT':
+        xs = (x0 % width, (x0 + 1) % width)
+        ys = (y0 % height, (y0 + 1) % height)
+    else:
+        xs = (np.clip(x0, 0, width - 1), np.clip(x0 + 1, 0, width - 1))
+        ys = (np.clip(y0, 0, height - 1), np.clip(y0 + 1, 0, height - 1))
+    top = image[ys[0], xs[0]] * (1 - fx) + image[ys[0], xs[1]] * fx
+    bottom = image[ys[1], xs[0]] * (1 - fx) + image[ys[1], xs[1]] * fx
+    colors = top * (1 - fy) + bottom * fy
+    if mapping_mode == 'CLIP':
+        colors[outside] = 0.0
+    return colors
+
+
+def _rgb_to_hsv(rgb):
+    """Vectorized colorsys.rgb_to_hsv"""
+    maxc = rgb.max(axis=1)
+    minc = rgb.min(axis=1)
+    delta = maxc - minc
+    safe_delta = np.where(delta > 0, delta, 1.0)
+    sat = np.where(maxc > 0, delta / np.where(maxc > 0, maxc, 1.0), 0.0)
+    red, green, blue = [(maxc - rgb[:, i]) / safe_delta for i in range(3)]
+    hue = np.where(rgb[:, 0] == maxc, blue - green,
+                   np.where(rgb[:, 1] == maxc, 2.0 + red - blue, 4.0 + green - red))
+    hue = np.where(delta > 0, (hue / 6.0) % 1.0, 0.0)
+    return np.stack((hue, sat, maxc), axis=1)
+
+
+def _hsv_to_rgb(hsv):
+    """Vectorized colorsys.hsv_to_rgb"""
+    hue, sat, val = hsv[:, 0], hsv[:, 1], hsv[:, 2]
+    sector = np.floor(hue * 6.0)
+    frac = hue * 6.0 - sector
+    sector = sector.astype(np.int64) % 6
+    p = val * (1.0 - sat)
+    q = val * (1.0 - sat * frac)
+    t = val * (1.0 - sat * (1.0 - frac))
+    choices = [(val, t, p), (q, val, p), (p, val, t), (p, q, val), (t, p, val), (val, p, q)]
+    rgb = np.empty_like(hsv)
+    for channel in range(3):
+        rgb[:, channel] = np.choose(sector, [choice[channel] for choice in choices])
+    return rgb
+
+
+def _blend(base, color, mode):
+    """ Blend color over base (rgb arrays, 0-1) like Blender's color mix
+    modes at factor 1 """
+    if mode == 'MIX':
+        result = color
+    elif mode == 'ADD':
+        result = base + color
+    elif mode == 'SUBTRACT':
+        result = base - color
+    elif mode == 'MULTIPLY':
+        result = base * color
+    elif mode == 'SCREEN':
+        result = 1.0 - (1.0 - base) * (1.0 - color)
+    elif mode == 'OVERLAY':
+        result = np.where(base < 0.5, 2.0 * base * color,
+                          1.0 - 2.0 * (1.0 - base) * (1.0 - color))
+    elif mode == 'DIFFERENCE':
+        result = np.abs(base - color)
+    elif mode == 'DIVIDE':
+        result = np.where(color != 0, base / np.where(color != 0, color, 1.0), base)
+    elif mode == 'DARKEN':
+        result = np.minimum(base, color)
+    elif mode == 'LIGHTEN':
+        result = np.maximum(base, color)
+    elif mode == 'SOFT_LIGHT':
+        screen = 1.0 - (1.0 - base) * (1.0 - color)
+        result = (1.0 - base) * base * color + base * screen
+    elif mode == 'LINEAR_LIGHT':
+        result = base + 2.0 * color - 1.0
+    elif mode in ('HUE', 'SATURATION', 'VALUE', 'COLOR'):
+        base_hsv = _rgb_to_hsv(base)
+        color_hsv = _rgb_to_hsv(color)
+        if mode in ('HUE', 'COLOR'):
+            colored = color_hsv[:, 1] > 0
+            base_hsv[colored, 0] = color_hsv[colored, 0]
+        if mode == 'COLOR':
+            base_hsv[:, 1] = color_hsv[:, 1]
+        elif mode == 'SATURATION':
+            colored = base_hsv[:, 1] > 0
+            base_hsv[colored, 1] = color_hsv[colored, 1]
+        elif mode == 'VALUE':
+            base_hsv[:, 2] = color_hsv[:, 2]
+        result = _hsv_to_rgb(base_hsv)
+    else:
+        raise ValueError('blendingMode must be one of %s, not "%s"' % (
+            ', '.join(BLENDING_MODES), mode))
+    return np.clip(result, 0.0, 1.0)
+
+
+def tex2vc(mesh, image, alpha_color=(0, 0, 0), replace_active_layer=True,
+           mappingMode='CLIP', blendingMode='MULTIPLY', mirror_x=False, mirror_y=False,
+           del_tex=True, uvs=None, face_uvs=None):
+    """ Transfer texture colors to vertex colors
+
+    Native version of bpylirious.tex2vc, without the uv_bake_texture_to_vcols
+    add-on. The image is sampled (bilinear) at the uv of every face corner;
+    transparent texels show alpha_color. The result is blended over the
+    current vertex colors (white if replace_active_layer or there are none)
+    and averaged per vertex; it replaces mesh.colors.
+
+    Args:
+        image (str or numpy array (height, width, 3 or 4)): image file (needs
+            Pillow) or pixels, rows top to bottom, 0-1 floats or 0-255 ints
+        uvs, face_uvs: texture coordinates and their indices per face corner
+            (as read from an obj file). Default is mesh.uvs per vertex.
+        Other args as bpylirious.tex2vc; del_tex drops mesh.uvs.
+
+    Returns: None
+    """
+    if uvs is None:
+        uvs = mesh.uvs
+        face_uvs = mesh.faces
+    if uvs is None:
+        raise ValueError('mesh has no texture coordinates')
+    if face_uvs is None:
+        face_uvs = mesh.faces
+    image = _image_array(image)
+    texels = _sample_image(image, np.asarray(uvs)[np.maximum(face_uvs, 0).ravel()],
+                           mappingMode, mirror_x, mirror_y)
+    alpha = texels[:, 3:4]
+    corner_colors = texels[:, :3] * alpha + np.asarray(alpha_color, dtype=np.float64) * (1 - alpha)
+
+    corners = mesh.faces.ravel()
+    num_verts = len(mesh.vertices)
+    counts = np.bincount(corners, minlength=num_verts)
+    if replace_active_layer or mesh.colors is None:
+        base = np.ones((len(corners), 3))
+    else:
+        base = mesh.colors[corners, :3] / 255.0
+    blended = _blend(base, corner_colors, blendingMode)
+    colors = np.zeros((num_verts, 3))
+    for channel in range(3):
+        colors[:, channel] = np.bincount(corners, blended[:, channel], minlength=num_verts)
+    colors /= np.maximum(counts, 1)[:, None]
+    if mesh.colors is not None and not replace_active_layer:
+        colors[counts == 0] = mesh.colors[counts == 0, :3] / 255.0
+    mesh.colors = np.clip(colors * 255.0 + 0.5, 0, 255).astype(np.uint8)
+    if del_tex:
+        mesh.uvs = None
+    return None
+
+
+def _texture_file(file_in, mtllibs):
+    """First diffuse texture (map_Kd) of the obj material libraries"""
+    for mtllib in mtllibs:
+        path = os.path.join(os.path.dirname(file_in), mtllib)
+        if not os.path.isfile(path):
+            continue
+        with open(path) as mtl_file:
+            for line in mtl_file:
+                words = line.split()
+                if words and words[0] == 'map_Kd':
+                    return os.path.join(os.path.dirname(path), words[-1])
+    return None
+
+
+def tex2vc_file(file_in, file_out=None, image_file=None, **kwargs):
+    """ Bake the texture of a mesh file into a vertex colored PLY file
+
+    Vertex colors of file_in are overwritten by the texture colors, unless
+    replace_active_layer=False is given to blend the texture over them.
+
+    Args:
+        file_in (str): textured mesh, usually obj
+        file_out (str): output PLY file. Default is file_in with a ply
+            extension (see convert.convert)
+        image_file (str or numpy array): texture image, or its pixels (see
+            tex2vc). Default is the first map_Kd of the obj material
+            library.
+        kwargs: see tex2vc
+
+    Returns:
+        str: the output filename
+    """
+    from . import convert
+    from .mesh import Mesh
+    data = convert.read(file_in)
+    if image_file is None:
+        image_file = _texture_file(file_in, data.get('mtllibs', []))
+        if image_file is None:
+            raise ValueError('no texture image found for "%s"' % file_in)
+    mesh = Mesh(data['vertices'], data['faces'], colors=data.get('colors'))
+    face_uvs = data.get('face_uvs')
+    tex2vc(mesh, image_file, uvs=data.get('uvs'),
+           face_uvs=data['faces'] if face_uvs is None else face_uvs, **kwargs)
+    mesh.uvs = None
+
+    up_in = convert.up_direction(os.path.basename(file_in))
+    if file_out is None:
+        fprefix, scale_meta, _, _ = filename.parse(os.path.basename(file_in))
+        file_out = os.path.join(os.path.dirname(file_in), '%s(%s%s).ply' % (
+            fprefix, '1' if scale_meta is None else scale_meta, up_in))
+    convert._check_output(file_in, file_out)
+    matrix = convert.up_matrix(
+        up_in, convert.up_direction(os.path.basename(file_out), default=convert.UP_OUT))
+    mesh.vertices = (mesh.vertices @ matrix.T).astype(np.float32)
+    mesh.write(file_out)
+    return file_out
+
+
+# Rotation from world to view coordinates (x right, y up, z towards the
+# viewer) of Blender's numpad views
+VIEW_MATRICES = {
+    'TOP': ((1, 0, 0), (0, 1, 0), (0, 0, 1)),
+    'BOTTOM': ((1, 0, 0), (0, -1, 0), (0, 0, -1)),
+    'FRONT': ((1, 0, 0), (0, 0, 1), (0, -1, 0)),
+    'BACK': ((-1, 0, 0), (0, 0, 1), (0, 1, 0)),
+    'RIGHT': ((0, 1, 0), (0, 0, 1), (1, 0, 0)),
+    'LEFT': ((0, -1, 0), (0, 0, 1), (-1, 0, 0))}
+
+
+def view_matrix(view='TOP'):
+    """ World to view rotation of a numpad view
+
+    Args:
+        view (str or matrix): 'LEFT', 'RIGHT', 'BOTTOM', 'TOP', 'FRONT' or
+            'BACK', or a 3x3 (or 4x4, the translation is ignored) view
+            matrix, e.g. a camera's matrix_world inverted. 'CAMERA' needs
+            the camera's matrix.
+
+    Returns:
+        numpy array (3, 3)
+    """
+    if isinstance(view, str):
+        try:
+            return np.array(VIEW_MATRICES[view.upper()], dtype=np.float64)
+        except KeyError:
+            raise ValueError('view must be one of %s or a matrix, not "%s"' % (
+                ', '.join(VIEW_MATRICES), view))
+    return np.asarray(view, dtype=np.float64)[:3, :3]
+
+
+def _fit_uvs(uvs, correct_aspect, clip_to_bounds, scale_to_bounds, aspect):
+    """Blender's correct_aspect, clip_to_bounds and scale_to_bounds steps"""
+    if correct_aspect and aspect != 1:
+        if aspect > 1:
+            uvs[:, 0] = (uvs[:, 0] - 0.5) / aspect + 0.5
+        else:
+            uvs[:, 1] = (uvs[:, 1] - 0.5) * aspect + 0.5
+    if scale_to_bounds and len(uvs):
+        low = uvs.min(axis=0)
+        size = uvs.max(axis=0) - low
+        size[size == 0] = 1.0
+        uvs = (uvs - low) / size
+    elif clip_to_bounds:
+        uvs = np.clip(uvs, 0.0, 1.0)
+    return uvs
+
+
+def project_uvs(vertices, loop_verts, loop_faces=None, method='VIEW', view='TOP',
+                direction='VIEW_ON_EQUATOR', align='POLAR_ZX', radius=1.0,
+                correct_aspect=True, clip_to_bounds=False, scale_to_bounds=True,
+                aspect=1.0):
+    """ Orthographic, cylindrical or spherical uv projection of face corners
+
+    Matrix based version of Blender's project_from_view (orthographic),
+    cylinder_project and sphere_project, so it needs no 3D view. Works on
+    any polygon mesh: loop_verts and loop_faces are the vertex and face of
+    each face corner (Blender's loops).
+
+    Args:
+        vertices (numpy array (n, 3)): vertex coordinates (object space)
+        loop_verts (numpy int array (k,)): vertex index of each face corner
+        loop_faces (numpy int array (k,)): face index of each face corner;
+            used to keep cylinder and sphere faces from spanning the seam.
+            Default is triangles: loop // 3.
+        method (str): 'VIEW', 'CYLINDER' or 'SPHERE'
+        view: see view_matrix
+        direction (str): cylinder or sphere axis: 'VIEW_ON_EQUATOR' (view up
+            axis), 'VIEW_ON_POLES' (view axis) or 'ALIGN_TO_OBJECT' (object Z)
+        align (str): 'POLAR_ZX' (polar 0 is X) or 'POLAR_ZY' (polar 0 is Y)
+        radius (float): cylinder or sphere radius
+        correct_aspect (bool): squeeze the uvs for an aspect (image width /
+            height) other than 1
+        clip_to_bounds (bool): clip the uvs to 0-1
+        scale_to_bounds (bool): scale the uvs to fill 0-1
+
+    Returns:
+        numpy float32 array (k, 2): uv of each face corner
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    loop_verts = np.asarray(loop_verts)
+    if method == 'VIEW':
+        coords = vertices[loop_verts] @ view_matrix(view).T
+        uvs = coords[:, :2].copy()
+        return _fit_uvs(uvs, correct_aspect, clip_to_bounds, scale_to_bounds,
+                        aspect).astype(np.float32)
+    if method not in ('CYLINDER', 'SPHERE'):
+        raise ValueError('method must be VIEW, CYLINDER or SPHERE, not "%s"' % method)
+
+    # Axes (polar 0, polar 90, pole) of the cylinder or sphere
+    if direction == 'ALIGN_TO_OBJECT':
+        axes = np.identity(3)
+    elif direction == 'VIEW_ON_POLES':
+        axes = view_matrix(view)
+    elif direction == 'VIEW_ON_EQUATOR':
+        rotation = view_matrix(view)
+        axes = np.array([rotation[0], rotation[2], rotation[1]])
+    else:
+        raise ValueError('direction must be VIEW_ON_EQUATOR, VIEW_ON_POLES or '
+                         'ALIGN_TO_OBJECT, not "%s"' % direction)
+    if align == 'POLAR_ZY':
+        axes = np.array([axes[1], -axes[0], axes[2]])
+    center = 0.5 * (vertices.min(axis=0) + vertices.max(axis=0)) if len(vertices) else 0
+    coords = ((vertices - center) @ axes.T / radius)[loop_verts]
+    x, y, z = coords[:, 0], coords[:, 1], coords[:, 2]
+    uvs = np.zeros((len(coords), 2))
+    uvs[:, 0] = 0.5 * (1.0 - np.arctan2(x, y) / np.pi)
+    if method == 'CYLINDER':
+        uvs[:, 1] = 0.5 * (z + 1.0)
+        degenerate = (x == 0) & (y == 0)
+    else:
+        length = np.sqrt(x * x + y * y + z * z)
+        degenerate = length == 0
+        uvs[:, 1] = 1.0 - np.arccos(np.clip(z / np.where(degenerate, 1.0, length), -1, 1)) / np.pi
+    uvs[degenerate] = 0.0
+
+    # Faces across the seam (u jumps by more than half) wrap to u > 1
+    if loop_faces is None:
+        loop_faces = np.arange(len(loop_verts)) // 3
+    loop_faces = np.asarray(loop_faces)
+    if len(loop_faces):
+        face_max = np.full(loop_faces.max() + 1, -np.inf)
+        face_min = np.full(loop_faces.max() + 1, np.inf)
+        np.maximum.at(face_max, loop_faces, uvs[:, 0])
+        np.minimum.at(face_min, loop_faces, uvs[:, 0])
+        wrap = (face_max - face_min)[loop_faces] > 0.5
+        uvs[wrap & (uvs[:, 0] < 0.5), 0] += 1.0
+    return _fit_uvs(uvs, correct_aspect, clip_to_bounds, scale_to_bounds,
+                    aspect).astype(np.float32)
+
+
+def _set_corner_uvs(mesh, corner_uvs):
+    """Store uvs per face corner as per vertex uvs, splitting the vertices
+    whose corners have different uvs (seams)"""
+    corners = mesh.faces.ravel()
+    keys = np.empty((len(corners), 3), dtype=np.float64)
+    keys[:, 0] = corners
+    # Adding 0.0 turns -0.0 into 0.0, so equal uvs are not split
+    keys[:, 1:] = corner_uvs + 0.0
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    new_verts = corners[first]
+    mesh.vertices = mesh.vertices[new_verts]
+    for name in ('normals', 'colors'):
+        if getattr(mesh, name) is not None:
+            setattr(mesh, name, getattr(mesh, name)[new_verts])
+    mesh.uvs = np.ascontiguousarray(corner_uvs[first], dtype=np.float32)
+    mesh.faces = inverse.ravel().astype(np.int32).reshape(-1, 3)
+
+
+def uv_project_from_view(mesh, view='TOP', perspective='ORTHO', camera_bounds=False,
+                         correct_aspect=True, scale_to_bounds=True, aspect=1.0):
+    """ Project the uvs from a view (see project_uvs); sets mesh.uvs
+
+    Same parameters as bpylirious.uv_project_from_view, but only
+    orthographic projection; camera_bounds is not supported. view may also
+    be a view matrix.
+
+    Returns: None
+    """
+    if perspective != 'ORTHO' or camera_bounds:
+        raise ValueError('only orthographic projection without camera_bounds is supported')
+    mesh.uvs = project_uvs(mesh.vertices, np.arange(len(mesh.vertices)), method='VIEW',
+                           view=view, correct_aspect=correct_aspect,
+                           scale_to_bounds=scale_to_bounds, aspect=aspect)
+    return None
+
+
+def uv_cylinder_project(mesh, view='FRONT', direction='VIEW_ON_EQUATOR', align='POLAR_ZX',
+                        radius=1.0, correct_aspect=True, clip_to_bounds=False,
+                        scale_to_bounds=True, aspect=1.0):
+    """ Project the uvs over the curved wall of a cylinder; sets mesh.uvs
+
+    Same parameters as bpylirious.uv_cylinder_project (see project_uvs).
+    Vertices on the seam are split.
+
+    Returns: None
+    """
+    _set_corner_uvs(mesh, project_uvs(
+        mesh.vertices, mesh.faces.ravel(), method='CYLINDER', view=view,
+        direction=direction, align=align, radius=radius, correct_aspect=correct_aspect,
+        clip_to_bounds=clip_to_bounds, scale_to_bounds=scale_to_bounds, aspect=aspect))
+    return None
+
+
+def uv_sphere_project(mesh, view='FRONT', direction='VIEW_ON_EQUATOR', align='POLAR_ZX',
+                      correct_aspect=True, clip_to_bounds=False, scale_to_bounds=False,
+                      aspect=1.0):
+    """ Project the uvs over a sphere; sets mesh.uvs
+
+    Same parameters as Blender's sphere_project (see project_uvs). Vertices
+    on the seam are split.
+
+    Returns: None
+    """
+    _set_corner_uvs(mesh, project_uvs(
+        mesh.vertices, mesh.faces.ravel(), method='SPHERE', view=view,
+        direction=direction, align=align, correct_aspect=correct_aspect,
+        clip_to_bounds=clip_to_bounds, scale_to_bounds=scale_to_bounds, aspect=aspect))
+    return None
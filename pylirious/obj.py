@@ -0,0 +1,508 @@
+""" Functions to read, write and fix Wavefront obj files
+
+Runs in-process with NumPy; no external programs are needed.
+
+"""
+
+import os
+import math
+
+import numpy as np
+
+from . import components
+from . import ply
+
+# Buffer size for reading and writing large files
+BUFFER_SIZE = 1 << 20
+
+# Size of the byte ranges parsed at a time by read
+CHUNK_SIZE = 1 << 26
+
+# Number of elements formatted at a time by write
+WRITE_BLOCK = 1 << 16
+
+
+def _floats(tokens, precision):
+    """Parse and format a list of number tokens.
+
+    Returns None if any token is not a finite number, e.g. '-1.#IND' or 'nan'.
+    """
+    try:
+        values = [float(token) for token in tokens]
+    except ValueError:
+        return None
+    for value in values:
+        if math.isinf(value) or math.isnan(value):
+            return None
+    return ' '.join(['%.*g' % (precision, value) for value in values])
+
+
+def _small_part_faces(faces, num_verts, ratio):
+    """Find the faces belonging to small disconnected components.
+
+    Args:
+        faces (list): vertex indices of each face; faces may be polygons
+        num_verts (int): number of vertices
+        ratio (float): threshold between 0 and 1, see components.small_parts
+
+    Returns:
+        numpy bool array: True for each face that should be deleted
+    """
+    if not faces:
+        return np.zeros(0, dtype=bool)
+    sizes = np.array([len(face) for face in faces])
+    corners = np.fromiter((vert for face in faces for vert in face),
+                          dtype=np.int64, count=sizes.sum())
+    firsts = corners[np.cumsum(sizes) - sizes]
+    # Connect every corner to the first corner of its face
+    roots = components.union_find(np.repeat(firsts, sizes), corners, num_verts)
+    _, labels = np.unique(roots[firsts], return_inverse=True)
+    return components.small_parts(labels.ravel(), ratio)
+
+
+def sanitize(file_in, file_out=None, del_small_parts=False,
+             small_part_ratio=0.1, precision=9):
+    """ Fix invalid numbers in an obj file.
+
+    Vertices, normals and texture coordinates that contain invalid numbers
+    (e.g. "-1.#IND" or "nan" as written by MeshMixer) are dropped, along with
+    any faces that use the dropped vertices; faces that use dropped normals
+    or texture coordinates keep their vertices but lose those attributes.
+    All numbers are rewritten with precision significant digits, so small
+    models keep their detail. Index references are renumbered and written as
+    absolute indices.
+
+    The file is processed as a stream unless del_small_parts is True, in
+    which case the elements are held in memory until the components are
+    known.
+
+    Args:
+        file_in (str): obj file to fix
+        file_out (str): output filename; if None file_in is overwritten
+        del_small_parts (bool): delete small disconnected components
+        small_part_ratio (float): a component is small if it has fewer than
+            this ratio times the faces of the largest component
+        precision (int): number of significant digits to write; 9 keeps
+            single precision values exact
+
+    Returns:
+        dict: number of dropped "vertices", "normals", "uvs", "faces" and
+            deleted "small_faces"
+    """
+    if file_out is None:
+        file_out = file_in
+    file_tmp = file_out + '.tmp'
+    stats = {'vertices': 0, 'normals': 0, 'uvs': 0, 'faces': 0, 'small_faces': 0}
+    # Old to new index maps; -1 for dropped elements
+    maps = {'v': [], 'vt': [], 'vn': []}
+    counts = {'v': 0, 'vt': 0, 'vn': 0}
+    drop_keys = {'v': 'vertices', 'vt': 'uvs', 'vn': 'normals'}
+    # With del_small_parts, elements are kept in memory until the end as
+    # (kind, data) records so their order can be preserved
+    records = []
+    faces = []
+
+    def resolve(kind, token):
+        """Convert an obj index token to the new zero based index"""
+        index = int(token)
+        if index < 0:
+            index += len(maps[kind])
+        else:
+            index -= 1
+        if 0 <= index < len(maps[kind]):
+            return maps[kind][index]
+        return -1
+
+    def face_line(prefix, corners):
+        """Format a face or line element from (v, vt, vn) corner tuples"""
+        use_vt = all([vt is not None for _, vt, _ in corners])
+        use_vn = all([vn is not None for _, _, vn in corners])
+        tokens = []
+        for vert, vt, vn in corners:
+            token = str(vert + 1)
+            if use_vn:
+                token += '/%s/%s' % (vt + 1 if use_vt else '', vn + 1)
+            elif use_vt:
+                token += '/%s' % (vt + 1)
+            tokens.append(token)
+        return '%s %s\n' % (prefix, ' '.join(tokens))
+
+    fin = open(file_in, 'r', buffering=BUFFER_SIZE)
+    fout = open(file_tmp, 'w', buffering=BUFFER_SIZE)
+    for line in fin:
+        tokens = line.split()
+        kind = tokens[0] if tokens else None
+        if kind in maps:
+            values = _floats(tokens[1:], precision)
+            if values is None:
+                maps[kind].append(-1)
+                stats[drop_keys[kind]] += 1
+                continue
+            maps[kind].append(counts[kind])
+            counts[kind] += 1
+            if del_small_parts:
+                records.append((kind, values))
+            else:
+                fout.write('%s %s\n' % (kind, values))
+        elif kind in ('f', 'l'):
+            corners = []
+            for token in tokens[1:]:
+                parts = token.split('/')
+                vert = resolve('v', parts[0])
+                vt = resolve('vt', parts[1]) if len(parts) > 1 and parts[1] else -1
+                vn = resolve('vn', parts[2]) if len(parts) > 2 and parts[2] else -1
+                if vert < 0:
+                    corners = None
+                    break
+                corners.append((vert, vt if vt >= 0 else None,
+                                vn if vn >= 0 else None))
+            if corners is None:
+                stats['faces'] += 1
+            elif del_small_parts:
+                records.append((kind, corners))
+                if kind == 'f':
+                    faces.append(corners)
+            else:
+                fout.write(face_line(kind, corners))
+        elif del_small_parts:
+            records.append((None, line))
+        else:
+            fout.write(line)
+    fin.close()
+
+    if del_small_parts:
+        small = _small_part_faces([[vert for vert, _, _ in face] for face in faces],
+                                  counts['v'], small_part_ratio)
+        stats['small_faces'] = int(small.sum())
+        # Drop deleted faces and the vertices that are no longer used
+        used = np.zeros(counts['v'], dtype=bool)
+        for face, is_small in zip(faces, small):
+            if not is_small:
+                used[[vert for vert, _, _ in face]] = True
+        new_index = np.cumsum(used) - 1
+        num_vert = 0
+        num_face = 0
+        for kind, data in records:
+            if kind is None:
+                fout.write(data)
+            elif kind == 'v':
+                if used[num_vert]:
+                    fout.write('v %s\n' % data)
+                num_vert += 1
+            elif kind in ('vt', 'vn'):
+                fout.write('%s %s\n' % (kind, data))
+            else:
+                if kind == 'f':
+                    num_face += 1
+                    if small[num_face - 1]:
+                        continue
+                elif not used[[vert for vert, _, _ in data]].all():
+                    continue
+                fout.write(face_line(kind, [(int(new_index[vert]), vt, vn)
+                                            for vert, vt, vn in data]))
+    fout.close()
+    os.replace(file_tmp, file_out)
+    return stats
+
+
+def _chunk_ranges(file_in, chunk_size):
+    """Split a file into byte ranges that start and end on line boundaries"""
+    size = os.path.getsize(file_in)
+    bounds = [0]
+    obj_file = open(file_in, 'rb')
+    position = chunk_size
+    while position < size:
+        obj_file.seek(position)
+        obj_file.readline()
+        position = obj_file.tell()
+        if position < size:
+            bounds.append(position)
+        position += chunk_size
+    obj_file.close()
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_numbers(lines, width, max_width=None):
+    """Parse element lines (without their keyword) into a float array.
+
+    Uses one fast C parse when every line has the same number of values;
+    otherwise parses line by line, keeping the first `width` values (up to
+    max_width if the lines have more) and using nan for invalid or missing
+    ones.
+    """
+    if not lines:
+        return np.zeros((0, width))
+    try:
+        values = np.fromstring(b' '.join(lines), sep=' ')
+        if len(values) % len(lines) == 0 and len(values) // len(lines) >= width:
+            return values.reshape(len(lines), -1)
+    except ValueError:
+        pass
+    if max_width is not None:
+        width = max([width] + [min(len(line.split()), max_width) for line in lines])
+    values = np.full((len(lines), width), np.nan)
+    for row, line in enumerate(lines):
+        for column, token in enumerate(line.split()[:width]):
+            try:
+                values[row, column] = float(token)
+            except ValueError:
+                pass
+    return values
+
+
+def _parse_faces(lines):
+    """Parse face lines (without the keyword) into corner index arrays.
+
+    Returns:
+        sizes (int array): number of corners of each face
+        corners (int array (c, 3)): raw obj v, vt, vn indices of each corner;
+            0 where an index is missing
+    """
+    if not lines:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 3), dtype=np.int64)
+    first = lines[0].split()
+    slashes = first[0].count(b'/') if first else 0
+    parts = slashes + 1
+    if len(first) == 3:
+        # Fast path: triangles that all use the format of the first face
+        text = b' '.join(lines)
+        values = np.zeros(0)
+        if text.count(b'/') == len(lines) * 3 * slashes:
+            try:
+                values = np.fromstring(
+                    text.replace(b'//', b'/0/').replace(b'/', b' '), sep=' ')
+            except ValueError:
+                pass
+        if len(values) == len(lines) * 3 * parts:
+            corners = np.zeros((len(lines) * 3, 3), dtype=np.int64)
+            corners[:, :parts] = values.reshape(-1, parts)
+            return np.full(len(lines), 3, dtype=np.int64), corners
+    sizes = np.zeros(len(lines), dtype=np.int64)
+    corners = []
+    for row, line in enumerate(lines):
+        tokens = line.split()
+        sizes[row] = len(tokens)
+        for token in tokens:
+            indices = token.split(b'/')
+            corners.append([int(index) if index else 0 for index in indices[:3]] +
+                           [0] * (3 - len(indices[:3])))
+    return sizes, np.array(corners, dtype=np.int64).reshape(-1, 3)
+
+
+def _parse_chunk(file_in, start, end):
+    """Parse the records in one byte range of an obj file"""
+    obj_file = open(file_in, 'rb')
+    obj_file.seek(start)
+    lines = obj_file.read(end - start).split(b'\n')
+    obj_file.close()
+    lines = np.array(lines, dtype=object)
+    prefixes = np.array([line[:2] for line in lines], dtype='S2')
+    kinds = {'v': prefixes == b'v ', 'vt': prefixes == b'vt', 'vn': prefixes == b'vn',
+             'f': prefixes == b'f ', 'usemtl': prefixes == b'us', 'mtllib': prefixes == b'mt'}
+    chunk = {}
+    # Vertices may have colors after the coordinates
+    for kind, width, max_width in (('v', 3, 6), ('vt', 2, None), ('vn', 3, None)):
+        chunk[kind] = _parse_numbers([line[len(kind) + 1:] for line in lines[kinds[kind]]],
+                                     width, max_width)
+    chunk['sizes'], chunk['corners'] = _parse_faces(
+        [line[2:] for line in lines[kinds['f']]])
+    # Element counts before each face, for relative (negative) indices
+    face_lines = np.flatnonzero(kinds['f'])
+    for kind in ('v', 'vt', 'vn'):
+        chunk['before_' + kind] = np.cumsum(kinds[kind])[face_lines]
+    # Material changes: (number of faces before the usemtl line, name)
+    face_count = np.cumsum(kinds['f'])
+    chunk['usemtl'] = [(int(face_count[index]), lines[index].split(None, 1)[1].strip().decode())
+                       for index in np.flatnonzero(kinds['usemtl'])
+                       if lines[index].startswith(b'usemtl ')]
+    chunk['mtllib'] = [lines[index].split(None, 1)[1].strip().decode()
+                       for index in np.flatnonzero(kinds['mtllib'])
+                       if lines[index].startswith(b'mtllib ')]
+    return chunk
+
+
+def read(file_in, chunk_size=CHUNK_SIZE):
+    """ Read an obj file.
+
+    The file is split into byte ranges on line boundaries and each range is
+    parsed with NumPy. Polygons are fan triangulated; the triangles of a
+    polygon are consecutive, so the face order is kept.
+
+    Args:
+        file_in (str): obj file to read
+        chunk_size (int): size of the byte ranges in bytes
+
+    Returns:
+        dict:
+            vertices (float32 numpy array (n, 3))
+            colors (float32 numpy array (n, 3)) or None: vertex colors
+                given after the coordinates, as written by MeshLab
+            uvs (float32 numpy array (k, 2)) or None
+            normals (float32 numpy array (j, 3)) or None
+            faces (int32 numpy array (m, 3)): vertex indices of each face
+            face_uvs (int32 numpy array (m, 3)) or None: uv indices of each
+                face corner, -1 if missing
+            face_normals (int32 numpy array (m, 3)) or None: normal indices
+                of each face corner, -1 if missing
+            materials (list): material names from usemtl
+            face_materials (int32 numpy array (m,)): index into materials
+                of each face, -1 if none
+            mtllibs (list): material library files
+    """
+    # Worker processes were tried, but sending the parsed chunks back cost
+    # more than the parallel parse saved (1.25 s vs 1.03 s on a 90 MB file)
+    chunks = [_parse_chunk(file_in, start, end)
+              for start, end in _chunk_ranges(file_in, chunk_size)]
+
+    # Resolve indices; relative indices need the counts of earlier chunks
+    totals = {'v': 0, 'vt': 0, 'vn': 0}
+    resolved = {'v': [], 'vt': [], 'vn': []}
+    sizes = []
+    materials = []
+    face_materials = []
+    mtllibs = []
+    current = -1
+    face_total = 0
+    for chunk in chunks:
+        for column, kind in enumerate(('v', 'vt', 'vn')):
+            raw = chunk['corners'][:, column]
+            index = raw - 1
+            relative = raw < 0
+            if relative.any():
+                before = np.repeat(chunk['before_' + kind], chunk['sizes'])
+                index[relative] = totals[kind] + before[relative] + raw[relative]
+            index[raw == 0] = -1
+            resolved[kind].append(index)
+            totals[kind] += len(chunk[kind])
+        sizes.append(chunk['sizes'])
+        # Material of each face in this chunk
+        chunk_materials = np.full(len(chunk['sizes']), current, dtype=np.int32)
+        for face_index, name in chunk['usemtl']:
+            if name not in materials:
+                materials.append(name)
+            current = materials.index(name)
+            chunk_materials[face_index:] = current
+        face_materials.append(chunk_materials)
+        face_total += len(chunk['sizes'])
+        mtllibs += [name for name in chunk['mtllib'] if name not in mtllibs]
+
+    sizes = np.concatenate(sizes)
+    # Chunks can differ in width: no vertices at all, colors or not, or a
+    # line by line parse. Keep colors if any chunk has them; vertices without
+    # are white.
+    width = 6 if any([chunk['v'].shape[1] >= 6 for chunk in chunks]) else 3
+    vertices = np.ones((sum([len(chunk['v']) for chunk in chunks]), width))
+    row = 0
+    for chunk in chunks:
+        values = chunk['v']
+        # A 4th value without colors is the optional w
+        columns = width if values.shape[1] >= width else 3
+        vertices[row:row + len(values), :columns] = values[:, :columns]
+        row += len(values)
+    if width == 6:
+        colors = vertices[:, 3:6]
+        colors[np.isnan(colors)] = 1.0
+    mesh = {'vertices': vertices[:, :3].astype(np.float32),
+            'colors': vertices[:, 3:6].astype(np.float32) if vertices.shape[1] >= 6 else None,
+            'uvs': None, 'normals': None, 'face_uvs': None, 'face_normals': None,
+            'materials': materials, 'mtllibs': mtllibs}
+    if totals['vt']:
+        mesh['uvs'] = np.concatenate([chunk['vt'][:, :2] for chunk in chunks]).astype(np.float32)
+    if totals['vn']:
+        mesh['normals'] = np.concatenate([chunk['vn'][:, :3] for chunk in chunks]).astype(np.float32)
+
+    # Fan triangulate polygons; every corner array is padded per face first
+    face_materials = np.concatenate(face_materials)
+    max_size = int(sizes.max()) if len(sizes) else 3
+    starts = np.cumsum(sizes) - sizes
+    for kind, key in (('v', 'faces'), ('vt', 'face_uvs'), ('vn', 'face_normals')):
+        if key != 'faces' and not totals[kind]:
+            continue
+        corners = np.concatenate(resolved[kind])
+        padded = np.full((len(sizes), max(max_size, 3)), -1, dtype=np.int64)
+        for column in range(max_size):
+            rows = sizes > column
+            padded[rows, column] = corners[starts[rows] + column]
+        mesh[key] = ply.triangulate(padded, sizes)
+    mesh['face_materials'] = ply.triangulate(
+        np.repeat(face_materials[:, None], max(max_size, 3), axis=1), sizes)[:, 0]
+    return mesh
+
+
+def _write_block(obj_file, fmt, values):
+    """Format and write a 2D array in blocks of rows"""
+    for start in range(0, len(values), WRITE_BLOCK):
+        block = values[start:start + WRITE_BLOCK]
+        obj_file.write((fmt * len(block)) % tuple(block.ravel().tolist()))
+    return None
+
+
+def write(file_out, vertices, faces, uvs=None, face_uvs=None, normals=None,
+          face_normals=None, colors=None, materials=None, face_materials=None,
+          mtllib=None, precision=6):
+    """ Write an obj file, streaming the arrays out in blocks.
+
+    Args:
+        file_out (str): output filename
+        vertices (numpy array (n, 3)): vertex coordinates
+        faces (numpy int array (m, 3)): vertex indices of each triangle
+        uvs, face_uvs: texture coordinates and their indices per face
+            corner (optional)
+        normals, face_normals: normals and their indices per face corner
+            (optional)
+        colors (numpy array (n, 3)): vertex colors 0-1, written after the
+            coordinates (optional)
+        materials (list): material names (optional)
+        face_materials (numpy int array (m,)): index into materials of each
+            face (optional)
+        mtllib (str): material library file (optional)
+        precision (int): number of significant digits to write; 9 keeps
+            single precision values exact
+    """
+    faces = np.asarray(faces)
+    obj_file = open(file_out, 'w', buffering=BUFFER_SIZE)
+    obj_file.write('# obj written by pylirious\n')
+    if mtllib is not None:
+        obj_file.write('mtllib %s\n' % mtllib)
+    number = '%%.%sf' % precision
+    if colors is not None:
+        _write_block(obj_file, 'v' + (' ' + number) * 6 + '\n',
+                     np.column_stack((vertices, colors)))
+    else:
+        _write_block(obj_file, 'v' + (' ' + number) * 3 + '\n', np.asarray(vertices))
+    if uvs is not None:
+        _write_block(obj_file, 'vt' + (' ' + number) * 2 + '\n', np.asarray(uvs))
+    if normals is not None:
+        _write_block(obj_file, 'vn' + (' ' + number) * 3 + '\n', np.asarray(normals))
+
+    # Face corners as v, v/vt, v//vn or v/vt/vn
+    columns = [faces + 1]
+    if uvs is not None and face_uvs is not None:
+        columns.append(np.asarray(face_uvs) + 1)
+    if normals is not None and face_normals is not None:
+        columns.append(np.asarray(face_normals) + 1)
+    if len(columns) == 1:
+        corner = '%d'
+    elif normals is not None and face_normals is not None and len(columns) == 2:
+        corner = '%d//%d'
+    elif len(columns) == 2:
+        corner = '%d/%d'
+    else:
+        corner = '%d/%d/%d'
+    fmt = 'f %s %s %s\n' % (corner, corner, corner)
+    values = np.stack(columns, axis=2).reshape(len(faces), -1)
+
+    # Write runs of faces with the same material
+    if materials is not None and face_materials is not None:
+        face_materials = np.asarray(face_materials)
+        run_starts = np.flatnonzero(np.diff(face_materials, prepend=-2))
+        run_ends = np.append(run_starts[1:], len(faces))
+        for start, end in zip(run_starts, run_ends):
+            if face_materials[start] >= 0:
+                obj_file.write('usemtl %s\n' % materials[face_materials[start]])
+            _write_block(obj_file, fmt, values[start:end])
+    else:
+        _write_block(obj_file, fmt, values)
+    obj_file.close()
+    return None
@@ -0,0 +1,448 @@
+""" Functions to read and write PLY files
+
+Binary (little and big endian) files are memory mapped straight into NumPy
+structured arrays; ASCII files are parsed in chunks. Runs in-process with
+NumPy; no external programs are needed.
+
+"""
+
+import struct
+import itertools
+
+import numpy as np
+
+# Number of lines parsed at a time in ASCII files
+CHUNK_LINES = 1 << 16
+
+# Number of binary records with variable length lists gathered at a time
+CHUNK_RECORDS = 1 << 20
+
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'}
+
+# Vertex property names of each attribute, in order of preference
+NORMAL_NAMES = ('nx', 'ny', 'nz')
+COLOR_NAMES = ('red', 'green', 'blue', 'alpha')
+UV_NAMES = (('s', 't'), ('u', 'v'), ('texture_u', 'texture_v'))
+
+
+def read_header(ply_file):
+    """ Read the header of an open PLY file.
+
+    Returns:
+        fmt (str): 'ascii', 'binary_little_endian' or 'binary_big_endian'
+        elements (list): (name, count, properties) for each element, where
+            properties is a list of (name, type, list count type or None)
+        comments (list): the comment lines
+    """
+    if ply_file.readline().strip() != b'ply':
+        raise ValueError('not a PLY file')
+    fmt = None
+    elements = []
+    comments = []
+    while True:
+        line = ply_file.readline()
+        if not line:
+            raise ValueError('PLY header has no end_header')
+        tokens = line.decode('ascii', 'replace').split()
+        if not tokens:
+            continue
+        if tokens[0] == 'format':
+            fmt = tokens[1]
+        elif tokens[0] == 'comment':
+            comments.append(' '.join(tokens[1:]))
+        elif tokens[0] == 'element':
+            elements.append((tokens[1], int(tokens[2]), []))
+        elif tokens[0] == 'property':
+            if tokens[1] == 'list':
+                elements[-1][2].append((tokens[4], PLY_TYPES[tokens[3]],
+                                        PLY_TYPES[tokens[2]]))
+            else:
+                elements[-1][2].append((tokens[2], PLY_TYPES[tokens[1]], None))
+        elif tokens[0] == 'end_header':
+            break
+    return fmt, elements, comments
+
+
+def _scalar_dtype(properties, byteorder, list_size=None):
+    """Structured dtype for an element, with list properties of list_size
+    items (an int, or a dict of the size of each list property)"""
+    fields = []
+    for name, ply_type, count_type in properties:
+        if count_type is None:
+            fields.append((name, byteorder + ply_type))
+        else:
+            size = list_size[name] if isinstance(list_size, dict) else list_size
+            fields.append((name + '_count', byteorder + count_type))
+            fields.append((name, byteorder + ply_type, (size,)))
+    return np.dtype(fields)
+
+
+def _list_sizes(data, offset, count, properties, byteorder):
+    """ Item count of every list of an element, reading only the counts.
+
+    Each record starts where the previous one ends, so this walks the
+    records in order; everything else is then gathered vectorized.
+
+    Returns:
+        sizes (numpy int array (count, number of list properties))
+        starts (numpy int array (count + 1,)): byte offset of each record
+            and of the end of the element
+    """
+    view = memoryview(data)
+    steps = []
+    for _, ply_type, count_type in properties:
+        if count_type is None:
+            steps.append((np.dtype(ply_type).itemsize, None, 0))
+        else:
+            steps.append((np.dtype(count_type).itemsize,
+                          struct.Struct(byteorder + np.dtype(count_type).char),
+                          np.dtype(ply_type).itemsize))
+    list_steps = [step for step in steps if step[1] is not None]
+    sizes = np.zeros((count, len(list_steps)), dtype=np.int64)
+    starts = np.zeros(count + 1, dtype=np.int64)
+    if len(steps) == 1 and steps[0][0] == 1:
+        # Common case, a single list with uchar counts (e.g. vertex_indices)
+        item_size = steps[0][2]
+        column = sizes[:, 0]
+        for i in range(count):
+            starts[i] = offset
+            size = view[offset]
+            column[i] = size
+            offset += 1 + size * item_size
+    else:
+        for i in range(count):
+            starts[i] = offset
+            column = 0
+            for width, count_struct, item_size in steps:
+                if count_struct is None:
+                    offset += width
+                else:
+                    size = count_struct.unpack_from(view, offset)[0]
+                    sizes[i, column] = size
+                    column += 1
+                    offset += width + size * item_size
+    starts[count] = offset
+    return sizes, starts
+
+
+def _gather(data, positions, dtype, size=None):
+    """Values of dtype at byte positions (rows of size items if size)"""
+    itemsize = dtype.itemsize
+    if size is None:
+        index = positions[:, None] + np.arange(itemsize)
+        return data[index].view(dtype).ravel()
+    index = (positions[:, None, None] + np.arange(size)[:, None] * itemsize +
+             np.arange(itemsize))
+    np.minimum(index, len(data) - 1, out=index)
+    return data[index.reshape(len(positions), -1)].view(dtype).reshape(len(positions), size)
+
+
+def _read_binary_lists(data, offset, count, properties, byteorder):
+    """Read an element with variable length lists.
+
+    The record offsets come from the list counts (see _list_sizes); the
+    values are then gathered in chunks of CHUNK_RECORDS records.
+
+    Returns the structured array (lists padded with -1) and the new offset.
+    """
+    sizes, starts = _list_sizes(data, offset, count, properties, byteorder)
+    list_size = int(sizes.max()) if sizes.size else 0
+    array = np.zeros(count, dtype=_scalar_dtype(properties, byteorder, list_size))
+    for first in range(0, count, CHUNK_RECORDS):
+        last = min(first + CHUNK_RECORDS, count)
+        positions = starts[first:last].copy()
+        column = 0
+        for name, ply_type, count_type in properties:
+            if count_type is None:
+                dtype = np.dtype(byteorder + ply_type)
+                array[name][first:last] = _gather(data, positions, dtype)
+                positions += dtype.itemsize
+                continue
+            chunk_sizes = sizes[first:last, column]
+            column += 1
+            array[name + '_count'][first:last] = chunk_sizes
+            positions += np.dtype(count_type).itemsize
+            dtype = np.dtype(byteorder + ply_type)
+            values = _gather(data, positions, dtype, list_size)
+            values[np.arange(list_size) >= chunk_sizes[:, None]] = -1
+            array[name][first:last] = values
+            positions += chunk_sizes * dtype.itemsize
+    return array, int(starts[count])
+
+
+def _pack_lists(records, properties, byteorder):
+    """Pack parsed records into a structured array, padding lists with -1"""
+    list_size = max([len(value) for record in records
+                     for value, (_, _, count_type) in zip(record, properties)
+                     if count_type is not None] + [0])
+    array = np.zeros(len(records), dtype=_scalar_dtype(properties, byteorder, list_size))
+    for i, record in enumerate(records):
+        for value, (name, _, count_type) in zip(record, properties):
+            if count_type is None:
+                array[name][i] = value
+            else:
+                array[name + '_count'][i] = len(value)
+                array[name][i] = -1
+                array[name][i, :len(value)] = value
+    return array
+
+
+def _read_binary(ply_file, file_in, elements, byteorder):
+    """Memory map each element of a binary PLY file"""
+    offset = ply_file.tell()
+    data = np.memmap(file_in, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, count, properties in elements:
+        if all([count_type is None for _, _, count_type in properties]):
+            dtype = _scalar_dtype(properties, byteorder)
+            arrays[name] = np.memmap(file_in, dtype=dtype, mode='r',
+                                     offset=offset, shape=(count,))
+            offset += count * dtype.itemsize
+            continue
+        # Fast path: every record has the list sizes of the first one, e.g.
+        # all triangles or all quads
+        first_sizes, _ = _list_sizes(data, offset, min(count, 1), properties, byteorder)
+        list_names = [prop_name for prop_name, _, count_type in properties
+                      if count_type is not None]
+        list_size = dict(zip(list_names, first_sizes[0].tolist() if count else
+                             [3] * len(list_names)))
+        dtype = _scalar_dtype(properties, byteorder, list_size)
+        array = None
+        if offset + count * dtype.itemsize <= len(data):
+            array = np.memmap(file_in, dtype=dtype, mode='r',
+                              offset=offset, shape=(count,))
+            for prop_name in list_names:
+                if not (array[prop_name + '_count'] == list_size[prop_name]).all():
+                    array = None
+                    break
+        if array is not None:
+            arrays[name] = array
+            offset += count * dtype.itemsize
+        else:
+            arrays[name], offset = _read_binary_lists(
+                data, offset, count, properties, byteorder)
+    return arrays
+
+
+def _read_ascii(ply_file, elements):
+    """Parse each element of an ASCII PLY file in chunks of lines"""
+    arrays = {}
+    for name, count, properties in elements:
+        scalar = all([count_type is None for _, _, count_type in properties])
+        # Tokens per line if every list has 3 items
+        record_size = sum([1 if count_type is None else 4
+                           for _, _, count_type in properties])
+        chunks = []
+        remaining = count
+        while remaining > 0:
+            lines = list(itertools.islice(ply_file, min(remaining, CHUNK_LINES)))
+            if not lines:
+                raise ValueError('PLY file ended before element "%s" was complete' % name)
+            remaining -= len(lines)
+            tokens = b' '.join(lines).split()
+            if len(tokens) == len(lines) * record_size:
+                # Fixed record size: scalars only, or lists of 3 items
+                list_size = None if scalar else 3
+                dtype = _scalar_dtype(properties, '=', list_size)
+                values = np.array(tokens, dtype=np.float64).reshape(len(lines), -1)
+                chunk = np.zeros(len(lines), dtype=dtype)
+                column = 0
+                for prop_name, _, count_type in properties:
+                    if count_type is None:
+                        chunk[prop_name] = values[:, column]
+                        column += 1
+                    else:
+                        chunk[prop_name + '_count'] = values[:, column]
+                        chunk[prop_name] = values[:, column + 1:column + 4]
+                        column += 4
+                for prop_name, _, count_type in properties:
+                    if count_type is not None and not (chunk[prop_name + '_count'] == 3).all():
+                        chunk = None
+                        break
+            else:
+                chunk = None
+            if chunk is None:
+                records = []
+                for line in lines:
+                    values = line.split()
+                    record = []
+                    for _, ply_type, count_type in properties:
+                        if count_type is None:
+                            record.append(float(values.pop(0)))
+                        else:
+                            size = int(values.pop(0))
+                            record.append(np.array(values[:size], dtype=np.float64))
+                            del values[:size]
+                    records.append(record)
+                chunk = _pack_lists(records, properties, '=')
+            chunks.append(chunk)
+        if chunks:
+            list_size = max([chunk.dtype[prop_name].shape[0] if chunk.dtype[prop_name].shape else 0
+                             for chunk in chunks for prop_name, _, _ in properties] + [0])
+            if len(set([chunk.dtype for chunk in chunks])) > 1:
+                # Chunks with different list sizes; repack into the widest
+                dtype = _scalar_dtype(properties, '=', list_size)
+                widened = []
+                for chunk in chunks:
+                    wide = np.zeros(len(chunk), dtype=dtype)
+                    for field in chunk.dtype.names:
+                        if chunk.dtype[field].shape:
+                            wide[field] = -1
+                            wide[field][:, :chunk.dtype[field].shape[0]] = chunk[field]
+                        else:
+                            wide[field] = chunk[field]
+                    widened.append(wide)
+                chunks = widened
+            arrays[name] = np.concatenate(chunks)
+        else:
+            arrays[name] = np.zeros(0, dtype=_scalar_dtype(properties, '=', 3))
+    return arrays
+
+
+def triangulate(indices, counts):
+    """ Fan triangulate polygons stored as padded index rows.
+
+    The triangles of each polygon are consecutive, in polygon order.
+
+    Args:
+        indices (numpy int array (m, k)): vertex indices, padded after
+            each polygon's count
+        counts (numpy int array (m,)): number of vertices of each polygon
+
+    Returns:
+        numpy int32 array (t, 3): triangles
+    """
+    indices = np.asarray(indices)
+    counts = np.asarray(counts)
+    if indices.shape[1] == 3 and (counts == 3).all():
+        return indices.astype(np.int32)
+    # Triangle j of a polygon is (0, j + 1, j + 2); a polygon's triangles
+    # stay together so the face order (and material runs) is kept
+    num_tris = np.maximum(counts.astype(np.int64) - 2, 0)
+    polygon = np.repeat(np.arange(len(counts)), num_tris)
+    corner = np.arange(len(polygon)) - np.repeat(np.cumsum(num_tris) - num_tris, num_tris) + 1
+    return np.column_stack((indices[polygon, 0], indices[polygon, corner],
+                            indices[polygon, corner + 1])).astype(np.int32)
+
+
+def _fields(vertex, names):
+    """Stack the named fields of a structured array into columns"""
+    return np.column_stack([vertex[name] for name in names])
+
+
+def read(file_in):
+    """ Read a PLY file.
+
+    Returns:
+        dict:
+            vertices (float32 numpy array (n, 3))
+            faces (int32 numpy array (m, 3)): polygons are fan triangulated
+            normals (float32 numpy array (n, 3)) or None
+            colors (uint8 numpy array (n, 3 or 4)) or None
+            uvs (float32 numpy array (n, 2)) or None
+            elements (dict): the raw structured array of every element; for
+                binary files these are memory mapped
+            comments (list): header comments
+    """
+    ply_file = open(file_in, 'rb')
+    fmt, elements, comments = read_header(ply_file)
+    if fmt == 'ascii':
+        arrays = _read_ascii(ply_file, elements)
+    elif fmt == 'binary_little_endian':
+        arrays = _read_binary(ply_file, file_in, elements, '<')
+    elif fmt == 'binary_big_endian':
+        arrays = _read_binary(ply_file, file_in, elements, '>')
+    else:
+        ply_file.close()
+        raise ValueError('unknown PLY format "%s"' % fmt)
+    ply_file.close()
+
+    vertex = arrays.get('vertex')
+    names = vertex.dtype.names if vertex is not None else ()
+    mesh = {'vertices': np.zeros((0, 3), dtype=np.float32), 'faces': np.zeros((0, 3), dtype=np.int32),
+            'normals': None, 'colors': None, 'uvs': None,
+            'elements': arrays, 'comments': comments}
+    if vertex is not None:
+        mesh['vertices'] = _fields(vertex, ('x', 'y', 'z')).astype(np.float32)
+        if all([name in names for name in NORMAL_NAMES]):
+            mesh['normals'] = _fields(vertex, NORMAL_NAMES).astype(np.float32)
+        color_names = [name for name in COLOR_NAMES if name in names]
+        if len(color_names) >= 3:
+            colors = _fields(vertex, color_names)
+            if colors.dtype.kind == 'f':
+                colors = np.clip(colors * 255.0 + 0.5, 0, 255)
+            mesh['colors'] = colors.astype(np.uint8)
+        for uv_names in UV_NAMES:
+            if all([name in names for name in uv_names]):
+                mesh['uvs'] = _fields(vertex, uv_names).astype(np.float32)
+                break
+    face = arrays.get('face')
+    if face is not None:
+        for list_name in ('vertex_indices', 'vertex_index'):
+            if list_name in face.dtype.names:
+                mesh['faces'] = triangulate(face[list_name], face[list_name + '_count'])
+                break
+    return mesh
+
+
+def write(file_out, vertices, faces, normals=None, colors=None, uvs=None,
+          comments=None):
+    """ Write a binary little endian PLY file.
+
+    The input arrays are not modified.
+
+    Args:
+        file_out (str): output filename
+        vertices (numpy array (n, 3)): vertex coordinates
+        faces (numpy int array (m, 3)): vertex indices of each triangle
+        normals (numpy array (n, 3)): vertex normals (optional)
+        colors (numpy array (n, 3 or 4)): vertex colors, 0-255 (optional)
+        uvs (numpy array (n, 2)): vertex texture coordinates (optional)
+        comments (list): header comments (optional)
+    """
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces)
+    fields = [('x', '<f4'), ('y', '<f4'), ('z', '<f4')]
+    if normals is not None:
+        fields += [('nx', '<f4'), ('ny', '<f4'), ('nz', '<f4')]
+    if colors is not None:
+        colors = np.asarray(colors)
+        fields += [(name, 'u1') for name in COLOR_NAMES[:colors.shape[1]]]
+    if uvs is not None:
+        fields += [('s', '<f4'), ('t', '<f4')]
+    vertex = np.empty(len(vertices), dtype=fields)
+    for column, name in enumerate(('x', 'y', 'z')):
+        vertex[name] = vertices[:, column]
+    if normals is not None:
+        for column, name in enumerate(NORMAL_NAMES):
+            vertex[name] = np.asarray(normals)[:, column]
+    if colors is not None:
+        for column, name in enumerate(COLOR_NAMES[:colors.shape[1]]):
+            vertex[name] = colors[:, column]
+    if uvs is not None:
+        vertex['s'] = np.asarray(uvs)[:, 0]
+        vertex['t'] = np.asarray(uvs)[:, 1]
+    face = np.empty(len(faces), dtype=[('count', 'u1'), ('vertex_indices', '<i4', (3,))])
+    face['count'] = 3
+    face['vertex_indices'] = faces
+
+    header = ['ply', 'format binary_little_endian 1.0']
+    for comment in (comments or []):
+        header.append('comment %s' % comment)
+    header.append('element vertex %s' % len(vertices))
+    ply_names = {'<f4': 'float', 'u1': 'uchar'}
+    for name, ply_type in fields:
+        header.append('property %s %s' % (ply_names[ply_type], name))
+    header.append('element face %s' % len(faces))
+    header.append('property list uchar int vertex_indices')
+    header.append('end_header\n')
+    ply_file = open(file_out, 'wb')
+    ply_file.write('\n'.join(header).encode('ascii'))
+    vertex.tofile(ply_file)
+    face.tofile(ply_file)
+    ply_file.close()
+    return None
@@ -7,15 +7,14 @@ Miscellaneous functions to work with 3D models in Python 3.
 
 import os
 import sys
-import platform
-import inspect
+import json
+import itertools
 import subprocess
 from datetime import datetime
 
-import meshlabxml as mlx
-
+# meshlabxml, obj (NumPy) and write_mmpy are imported by the functions that
+# use them, so importing pylirious stays fast
 from . import filename
-from . import write_mmpy
 
 #ml_version = '1.3.4BETA'
 #ml_version = '2016.12'
@@ -31,6 +30,9 @@ def render_scad(script=None, log=None, file_out=None, constants=None):
     If you want to assign the -D variable to another variable, the -D variable MUST be initialised in the main .scad program
 
     """
+    import platform
+    import meshlabxml as mlx
+
     if platform.system() == 'Windows':
         cmd = 'openscad.com '
     else:
@@ -75,6 +77,124 @@ def render_scad(script=None, log=None, file_out=None, constants=None):
     return return_code
 
 
+def scad_grid(constants):
+    """Expand a grid of OpenSCAD constants into a list of constant sets.
+
+    Args:
+        constants (dict): dictionary of variable:list of values pairs
+
+    Returns:
+        list: one constants dict for every combination of values, e.g.
+            {'w': [1, 2], 'h': [5]} -> [{'w': 1, 'h': 5}, {'w': 2, 'h': 5}]
+    """
+    keys = list(constants.keys())
+    return [dict(zip(keys, values))
+            for values in itertools.product(*[constants[key] for key in keys])]
+
+
+def render_scad_sweep(script=None, constants=None, file_out=None, log=None,
+                      processes=None, manifest=None, force=False):
+    """Render many variants of a scad script in parallel.
+
+    OpenSCAD is single threaded, so each variant is rendered in its own
+    OpenSCAD process, running up to `processes` at once.
+
+    A variant is skipped if its output file is newer than the script and
+    the previous manifest shows it was rendered with the same constants.
+
+    Args:
+        script (str): the scad script to render
+        constants (dict or list): either a grid (dict of variable:list of
+            values pairs, see scad_grid) or a list of constants dicts
+        file_out (str): output filename template, filled in with
+            str.format using the variant's constants plus "index", e.g.
+            'box_{width}x{height}.stl'. Default is
+            "<script name>_{index}.stl".
+        log (str): filename of the log file (optional)
+        processes (int): maximum number of simultaneous OpenSCAD processes
+            for this sweep. Default is aiolirious.LIMITS['openscad'].
+        manifest (str): filename of the JSON manifest linking each output
+            file to its constants. Default is "<script name>_sweep.json".
+        force (bool): render all variants even if they are up to date
+
+    Returns:
+        list: the manifest entries, one dict per variant with the keys
+            "file_out", "constants" and "return_code" (0 for variants
+            skipped because they are up to date)
+    """
+    # Imported here; aiolirious is Python 3 only
+    import asyncio
+    from . import aiolirious
+
+    if isinstance(constants, dict):
+        constants = scad_grid(constants)
+    if file_out is None:
+        file_out = '%s_{index}.stl' % os.path.splitext(script)[0]
+    if manifest is None:
+        manifest = '%s_sweep.json' % os.path.splitext(script)[0]
+
+    variants = []
+    for index, const in enumerate(constants):
+        variants.append({'file_out': file_out.format(index=index, **const),
+                         'constants': const,
+                         'return_code': None})
+    file_outs = [variant['file_out'] for variant in variants]
+    if len(set(file_outs)) != len(file_outs):
+        raise ValueError('file_out template "%s" gives the same filename to '
+                         'different variants' % file_out)
+
+    previous = {}
+    if os.path.isfile(manifest):
+        manifest_file = open(manifest, 'r')
+        for entry in json.load(manifest_file)['variants']:
+            previous[entry['file_out']] = entry
+        manifest_file.close()
+    script_mtime = os.path.getmtime(script)
+
+    def is_current(variant):
+        """Check if a variant's output is newer than the script and was
+        rendered with the same constants"""
+        entry = previous.get(variant['file_out'])
+        # Compare as stored in the manifest, e.g. tuples become lists
+        return (entry is not None and entry['return_code'] == 0 and
+                entry['constants'] == json.loads(json.dumps(variant['constants'])) and
+                os.path.isfile(variant['file_out']) and
+                os.path.getmtime(variant['file_out']) >= script_mtime)
+
+    jobs = []
+    for variant in variants:
+        if not force and is_current(variant):
+            variant['return_code'] = 0
+        else:
+            jobs.append(variant)
+
+    async def render_all():
+        return await asyncio.gather(*[
+            aiolirious.render_scad(script=script, log=log,
+                                   file_out=variant['file_out'],
+                                   constants=variant['constants'])
+            for variant in jobs])
+
+    if jobs:
+        limit = aiolirious.LIMITS['openscad']
+        if processes is not None:
+            aiolirious.set_limit('openscad', processes)
+        try:
+            return_codes = asyncio.run(render_all())
+        finally:
+            aiolirious.set_limit('openscad', limit)
+        for variant, return_code in zip(jobs, return_codes):
+            variant['return_code'] = return_code
+    if log is None:
+        print('Rendered %s of %s variants; %s up to date' % (
+            len(jobs), len(variants), len(variants) - len(jobs)))
+
+    manifest_file = open(manifest, 'w')
+    json.dump({'script': script, 'variants': variants}, manifest_file, indent=2)
+    manifest_file.close()
+    return variants
+
+
 def run_admesh():
     pass
 
@@ -85,6 +205,8 @@ def swap_yz(file_in, file_out=None, log=None, ml_version=ml_version):
     Requires metadata to know what the current "Up" direction is.
 
     """
+    import meshlabxml as mlx
+
     fprefix, scale_meta, up_meta, fext = filename.check_metadata(file_in)
     #script_file = None # Use automatically created temporary script file
     script_file = 'TEMP3D_swap_yz.mlx'
@@ -112,6 +234,34 @@ def swap_yz(file_in, file_out=None, log=None, ml_version=ml_version):
     return file_out
 
 
+def parse_module_function(module_function, module_path=None):
+    """Split a Blender module_function string into its parts.
+
+    Args:
+        module_function (str): the module, function and parameters, e.g.
+            'bpylirious.boolean(source, operation, target, output)'
+        module_path (str): full path to the module. If omitted it will use the
+            path of this module.
+
+    Returns:
+        module_full (str): full path and filename of the module
+        function (str): the function name
+        parameters (str): the function parameters, separated by spaces
+    """
+    module = module_function.split('.')[0]
+    if module_path is None:
+        # Assume module is in the same directory as this module
+        this_modulepath = os.path.dirname(os.path.realpath(__file__))
+        module_full = os.path.join(this_modulepath, module + '.py')
+    else:
+        module_full = os.path.join(module_path, module + '.py')
+    function = '.'.join(module_function.split('.')[1:]).split('(')[0]
+    #parameters = module_function.split('(')[1].rsplit(')')[
+    #    0].replace(', ', ' ')
+    parameters = ')'.join('('.join(module_function.split('(')[1:]).rsplit(')')[:-1]).replace(', ', ' ')
+    return module_full, function, parameters
+
+
 def blend(module_function=None, log=None, module_path=None, cmd=None):
     """Run a function inside a Blender Python module and pass it parameters.
 
@@ -127,25 +277,16 @@ def blend(module_function=None, log=None, module_path=None, cmd=None):
     Returns:
         return_code (int): the blender return code
     """
+    import meshlabxml as mlx
+
     if cmd is None:
         cmd = 'blender --background --factory-startup --python'
         if module_function is None:
             print('Error: you must provide a python function')
             sys.exit(1)
         else:
-            # Parse module_function
-            module = module_function.split('.')[0]
-            if module_path is None:
-                # Assume module is in the same directory as this module
-                this_modulepath = os.path.dirname(
-                    os.path.realpath(inspect.getsourcefile(lambda: 0)))
-                module_full = os.path.join(this_modulepath, module + '.py')
-            else:
-                module_full = os.path.join(module_path, module + '.py')
-            function = '.'.join(module_function.split('.')[1:]).split('(')[0]
-            #parameters = module_function.split('(')[1].rsplit(')')[
-            #    0].replace(', ', ' ')
-            parameters = ')'.join('('.join(module_function.split('(')[1:]).rsplit(')')[:-1]).replace(', ', ' ')
+            module_full, function, parameters = parse_module_function(
+                module_function, module_path)
             cmd += ' %s -- -f %s -p %s' % (module_full, function, parameters)
     if log is not None:
         log_file = open(log, 'a')
@@ -227,54 +368,94 @@ def hollow_volume(fullpath_in, fullpath_out, log=None, offset=-3,
 
     WARNING: hard coded output mask, must be updated when MeshLab version is
 
+    See voxel.hollow_volume for a native version that doesn't need MeshMixer.
+
     """
+    hollow_volumes([(fullpath_in, fullpath_out)], log=log, offset=offset,
+                   solid_resolution=solid_resolution,
+                   mesh_resolution=mesh_resolution,
+                   del_small_parts=del_small_parts,
+                   small_part_ratio=small_part_ratio, ml_version=ml_version)
+    return None
+
+
+def hollow_volumes(files, log=None, offset=-3,
+                   solid_resolution=256, mesh_resolution=256,
+                   del_small_parts=False, small_part_ratio=0.1,
+                   ml_version=ml_version, session=None):
+    """ Create hollow (offset) volumes of many files in one MeshMixer session
+
+    Writes a single MeshMixer script that hollows every file, so MeshMixer
+    is only started once for the whole batch. The scene is cleared after
+    each file. See hollow_volume for the parameters.
+
+    Args:
+        files (list): list of (fullpath_in, fullpath_out) tuples
+        session (mmsession.Session): run the script in this (started)
+            session, so MeshMixer isn't launched at all
+
+    """
+    import meshlabxml as mlx
+    from . import obj
+    from . import write_mmpy
+
     mix_script = 'TEMP3D_mix_hollow.py'
 
     write_mmpy.begin(mix_script)
-    obj_a = write_mmpy.import_mesh(
-        'obj_a',
-        mix_script,
-        file_in=fullpath_in)
-    obj_b = write_mmpy.make_solid(
-        'obj_b',
-        mix_script,
-        mesh_object=obj_a,
-        offset=offset,
-        solid_type=2,
-        solid_resolution=solid_resolution,
-        mesh_resolution=mesh_resolution)
-    write_mmpy.export_mesh(
-        None,
-        mix_script,
-        mesh_object=obj_b,
-        file_out=fullpath_out)
+    for fullpath_in, fullpath_out in files:
+        obj_a = write_mmpy.import_mesh(
+            'obj_a',
+            mix_script,
+            file_in=fullpath_in)
+        obj_b = write_mmpy.make_solid(
+            'obj_b',
+            mix_script,
+            mesh_object=obj_a,
+            offset=offset,
+            solid_type=2,
+            solid_resolution=solid_resolution,
+            mesh_resolution=mesh_resolution)
+        write_mmpy.export_mesh(
+            None,
+            mix_script,
+            mesh_object=obj_b,
+            file_out=fullpath_out)
+        write_mmpy.clear_scene(None, mix_script)
     write_mmpy.end(mix_script)
-    write_mmpy.run(mix_script, log)
+    write_mmpy.run(mix_script, log, session=session)
 
     # When hollowing Kylechessking_flat(-11Z).obj it was found that Blender
     # could not open the hollow volume; error was:
     # ValueError: could not convert string to float: b'-1.#IND'
     # The file had vertex normals in sci notation, i.e. -2.086671657e-006
     # however, did not verify if this was the issue.
-    # MeshLab can open them fine, so we will re-save with MeshLab. Even if we
-    # determine the root cause, MeshMixer doesn't have many export options,
-    # so this is still probably the easiest way to fix.
+    # MeshLab can open them fine, so we used to re-save with MeshLab. obj files
+    # are now fixed in-process by obj.sanitize, which drops the invalid values
+    # and rewrites all numbers in fixed point notation. Other formats are
+    # still re-saved with MeshLab.
 
     # MeshMixer may also create multiple volumes, so we provide the option to delete small components
 
-    file_out = os.path.basename(fullpath_out)
-    output_mask = mlx.default_output_mask(file_out=file_out, texture=False, vert_colors=False)
-
-    mlx_resave = mlx.FilterScript(file_in=file_out, file_out=file_out, ml_version=ml_version)
-    if del_small_parts:
-        mlx.delete.small_parts(mlx_resave, ratio=small_part_ratio)
-    mlx_resave.run_script(output_mask=output_mask, log=log)
+    for _, fullpath_out in files:
+        if os.path.splitext(fullpath_out)[1].lower() == '.obj':
+            obj.sanitize(fullpath_out, del_small_parts=del_small_parts,
+                         small_part_ratio=small_part_ratio)
+            continue
+        # meshlabserver only saves the current layer, so each file needs its own run
+        output_mask = mlx.default_output_mask(file_out=fullpath_out, texture=False,
+                                              vert_colors=False)
+        mlx_resave = mlx.FilterScript(file_in=fullpath_out, file_out=fullpath_out,
+                                      ml_version=ml_version)
+        if del_small_parts:
+            mlx.delete.small_parts(mlx_resave, ratio=small_part_ratio)
+        mlx_resave.run_script(output_mask=output_mask, log=log)
 
     return None
 
 
 def scale_meta2scale(scale_meta):
     """ Convert scale_meta (metadata scale value) to actual scale """
+    import meshlabxml as mlx
     scale_meta_float = mlx.util.to_float(scale_meta)
     if scale_meta_float < 0.0:
         scale = -1.0 / scale_meta_float
@@ -0,0 +1,92 @@
+""" Functions to read and write STL files
+
+Runs in-process with NumPy; no external programs are needed.
+
+"""
+
+import os
+
+import numpy as np
+
+from . import mesh
+
+# Binary STL triangle record
+TRIANGLE_DTYPE = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)),
+                           ('attr', '<u2')])
+
+
+def is_binary(file_in):
+    """ Check if an STL file is binary by comparing its size with the
+    triangle count in the header. ASCII files start with "solid", but
+    some binary files do too, so the header text can't be relied on."""
+    size = os.path.getsize(file_in)
+    if size < 84:
+        return False
+    stl_file = open(file_in, 'rb')
+    stl_file.seek(80)
+    count = int(np.frombuffer(stl_file.read(4), dtype='<u4')[0])
+    stl_file.close()
+    return size == 84 + count * TRIANGLE_DTYPE.itemsize
+
+
+def read(file_in, weld=True):
+    """ Read an STL file.
+
+    STL stores three separate vertices for every face. With weld=True
+    identical vertices are merged so that faces share their vertices.
+
+    Returns:
+        dict:
+            vertices (float32 numpy array (n, 3))
+            faces (int32 numpy array (m, 3)): vertex indices of each face
+    """
+    if is_binary(file_in):
+        triangles = np.fromfile(file_in, dtype=TRIANGLE_DTYPE, offset=84)
+        corners = triangles['vertices'].reshape(-1, 3)
+    else:
+        stl_file = open(file_in, 'r')
+        tokens = stl_file.read().split()
+        stl_file.close()
+        tokens = np.array(tokens)
+        starts = np.flatnonzero(tokens == 'vertex')
+        corners = tokens[starts[:, None] + np.arange(1, 4)].astype(np.float32)
+    corners = np.ascontiguousarray(corners, dtype=np.float32)
+    faces = np.arange(len(corners), dtype=np.int32).reshape(-1, 3)
+    if weld:
+        first, inverse = mesh.weld(corners)
+        corners = corners[first]
+        faces = inverse.reshape(-1, 3)
+    return {'vertices': corners, 'faces': faces}
+
+
+def face_normals(vertices, faces):
+    """ Calculate the unit normal of each triangle """
+    tris = vertices[faces]
+    normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    length = np.linalg.norm(normals, axis=1)
+    length[length == 0] = 1.0
+    return normals / length[:, None]
+
+
+def write(file_out, vertices, faces, header=None):
+    """ Write a binary STL file.
+
+    Args:
+        file_out (str): output filename
+        vertices (numpy array (n, 3)): vertex coordinates
+        faces (numpy array (m, 3)): vertex indices of each triangle
+        header (str): text for the 80 byte header
+    """
+    vertices = np.asarray(vertices, dtype=np.float32)
+    faces = np.asarray(faces)
+    if header is None:
+        header = 'Binary STL written by pylirious'
+    triangles = np.zeros(len(faces), dtype=TRIANGLE_DTYPE)
+    triangles['normal'] = face_normals(vertices, faces)
+    triangles['vertices'] = vertices[faces]
+    stl_file = open(file_out, 'wb')
+    stl_file.write(header.encode('ascii', 'replace')[:80].ljust(80, b' '))
+    stl_file.write(np.array([len(faces)], dtype='<u4').tobytes())
+    triangles.tofile(stl_file)
+    stl_file.close()
+    return None
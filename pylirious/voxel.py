@@ -0,0 +1,467 @@
+""" Native voxel make_solid and hollow (no MeshMixer)
+
+Works like MeshMixer's Make Solid: the mesh is voxelized at
+solid_resolution into a signed distance grid, the surface is moved by
+offset, and a new mesh is extracted at mesh_resolution. Runs in-process
+with NumPy, so it works on any platform.
+
+The signed distance is negative inside the mesh. It comes from a
+scanline inside/outside test, a Euclidean distance transform limited to
+the band around the offset surface, and exact distances (see bvh.BVH)
+for the voxels next to the surface. Surfaces are extracted with marching
+tetrahedra. make_solid never holds the whole grid: the distances are
+computed in slabs of chunk_size voxels along x (with band voxels of
+overlap for the distance transform) and each slab is meshed as soon as
+it is ready, sharing one row of voxels with the next.
+
+"""
+
+import os
+
+import numpy as np
+
+from . import bvh
+from . import components
+from .mesh import Mesh
+
+CHUNK_SIZE = 32
+
+# Cube corners (x, y, z) and the six tetrahedra around the 0-6 diagonal
+CUBE_CORNERS = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+                         [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]])
+CUBE_TETS = np.array([[0, 1, 2, 6], [0, 2, 3, 6], [0, 3, 7, 6],
+                      [0, 7, 4, 6], [0, 4, 5, 6], [0, 5, 1, 6]])
+
+
+def _grid(mesh, resolution, padding):
+    """ Grid origin, spacing and shape covering the mesh plus padding
+
+    resolution is the number of voxels along the longest side of the mesh.
+    """
+    low = mesh.vertices.min(axis=0).astype(np.float64)
+    high = mesh.vertices.max(axis=0).astype(np.float64)
+    spacing = (high - low).max() / resolution
+    padding = padding + 2 * spacing
+    origin = low - padding
+    shape = np.ceil((high + padding - origin) / spacing).astype(int) + 1
+    return origin, spacing, tuple(shape)
+
+
+def _crossings(tree, origin, spacing, shape):
+    """ Surface crossings of rays along x through the grid's (y, z) lines
+
+    Returns:
+        rays (numpy int array (k,)): ray (y * nz + z) of each crossing
+        first (numpy int array (k,)): first grid x beyond each crossing;
+            both are sorted by first
+    """
+    num_x, num_y, num_z = shape
+    grid_y, grid_z = np.meshgrid(np.arange(num_y), np.arange(num_z), indexing='ij')
+    origins = np.zeros((num_y * num_z, 3))
+    origins[:, 0] = origin[0] - spacing
+    # Nudge the rays off the grid lines, which often run through vertices
+    origins[:, 1] = origin[1] + (grid_y.ravel() + 1e-4 * np.pi) * spacing
+    origins[:, 2] = origin[2] + (grid_z.ravel() + 1e-4 * np.e) * spacing
+    rays, distances = tree.ray_hits(origins, (1.0, 0.0, 0.0))
+    first = np.clip(np.floor(distances / spacing).astype(np.int64), 0, num_x)
+    order = np.argsort(first, kind='stable')
+    return rays[order], first[order]
+
+
+def _occupancy(crossings, shape, start, stop):
+    """ Inside/outside of the grid points start <= x < stop by ray parity """
+    rays, first = crossings
+    num_x, num_y, num_z = shape
+    # Each crossing toggles inside for the grid points beyond it
+    before = np.searchsorted(first, start, side='right')
+    end = np.searchsorted(first, stop)
+    toggles = np.zeros((num_y * num_z, stop - start), dtype=np.int32)
+    toggles[:, 0] = np.bincount(rays[:before], minlength=num_y * num_z)
+    np.add.at(toggles, (rays[before:end], first[before:end] - start), 1)
+    inside = (np.cumsum(toggles, axis=1) % 2).astype(bool)
+    return inside.reshape(num_y, num_z, stop - start).transpose(2, 0, 1)
+
+
+def _distance_transform(target, band, start=0, stop=None):
+    """ Squared distance (in voxels) to the nearest target voxel
+
+    Separable exact Euclidean distance transform, limited to band voxels;
+    further voxels get (band + 1) ** 2. Only the rows start <= x < stop
+    are returned; target may extend band rows beyond them, so that the
+    distances near the ends of the rows are right.
+    """
+    limit = np.float32((band + 1) ** 2)
+    dist2 = np.where(target, np.float32(0.0), limit)
+    size = len(dist2)
+    if stop is None:
+        stop = size
+    # Along x, only for the rows returned
+    result = dist2[start:stop].copy()
+    for step in range(1, band + 1):
+        cost = np.float32(step * step)
+        high = min(stop + step, size)
+        if start + step < high:
+            rows = slice(0, high - start - step)
+            np.minimum(result[rows], dist2[start + step:high] + cost, out=result[rows])
+        low = max(start - step, 0)
+        if low < stop - step:
+            rows = slice(low + step - start, None)
+            np.minimum(result[rows], dist2[low:stop - step] + cost, out=result[rows])
+    dist2 = np.minimum(result, limit)
+    for axis in (1, 2):
+        result = dist2.copy()
+        size = dist2.shape[axis]
+        for step in range(1, min(band, size - 1) + 1):
+            cost = np.float32(step * step)
+            lower = [slice(None)] * 3
+            upper = [slice(None)] * 3
+            lower[axis] = slice(0, size - step)
+            upper[axis] = slice(step, size)
+            lower = tuple(lower)
+            upper = tuple(upper)
+            np.minimum(result[lower], dist2[upper] + cost, out=result[lower])
+            np.minimum(result[upper], dist2[lower] + cost, out=result[upper])
+        dist2 = np.minimum(result, limit)
+    return dist2
+
+
+def _distance_field(mesh, resolution, offset, tree=None):
+    """ What _distance_rows needs to compute the signed distance grid
+    (see signed_distance_grid) a few rows at a time """
+    if tree is None:
+        tree = bvh.BVH(mesh.vertices, mesh.faces)
+    origin, spacing, shape = _grid(mesh, resolution, max(offset, 0.0))
+    return {'tree': tree, 'origin': origin, 'spacing': spacing, 'shape': shape,
+            'offset': offset, 'band': int(np.ceil(abs(offset) / spacing)) + 3,
+            'crossings': _crossings(tree, origin, spacing, shape)}
+
+
+def _distance_rows(field, start, stop):
+    """ Signed distances of the grid points start <= x < stop
+
+    The distance transform only reaches band voxels, so the rows are
+    computed with band rows of overlap on either side.
+    """
+    origin = field['origin']
+    spacing = field['spacing']
+    shape = field['shape']
+    band = field['band']
+    low = max(start - band, 0)
+    high = min(stop + band, shape[0])
+    inside = _occupancy(field['crossings'], shape, low, high)
+    to_outside = np.sqrt(_distance_transform(~inside, band, start - low, stop - low))
+    to_inside = np.sqrt(_distance_transform(inside, band, start - low, stop - low))
+    inside = inside[start - low:stop - low]
+    # Distances between voxel centers overestimate by about half a voxel
+    rows = np.where(inside, 0.5 - to_outside, to_inside - 0.5) * np.float32(spacing)
+    rows = rows.astype(np.float32)
+    inside = inside.ravel()
+
+    # Exact distances next to the offset surface
+    near = np.flatnonzero(np.abs(rows - field['offset']).ravel() <= 1.5 * spacing)
+    for first in range(0, len(near), 1 << 16):
+        chunk = near[first:first + (1 << 16)]
+        index = np.stack(np.unravel_index(chunk, rows.shape), axis=1)
+        index[:, 0] += start
+        _, distance, _ = field['tree'].closest_point(origin + index * spacing)
+        rows.ravel()[chunk] = np.where(inside[chunk], -distance, distance)
+    return rows
+
+
+def _slabs(rows, num_x, chunk_size):
+    """ Yield (start, values) slabs of a grid for _march
+
+    values holds the grid rows start to start + chunk_size, inclusive: the
+    last row is shared with the next slab. rows(start, stop) computes the
+    grid rows start <= x < stop.
+    """
+    last = None
+    for start in range(0, num_x - 1, chunk_size):
+        stop = min(start + chunk_size, num_x - 1)
+        if last is None:
+            values = rows(start, stop + 1)
+        else:
+            values = np.concatenate((last, rows(start + 1, stop + 1)))
+        last = values[-1:]
+        yield start, values
+
+
+def signed_distance_grid(mesh, resolution=128, offset=0.0, tree=None, chunk_size=CHUNK_SIZE):
+    """ Signed distance to the mesh, sampled on a grid
+
+    Values are exact near the offset surface and within a band around it;
+    further away they are clamped to the band. The grid is computed in
+    slabs of chunk_size voxels along x.
+
+    Args:
+        mesh (mesh.Mesh): closed mesh
+        resolution (int): voxels along the longest side of the mesh
+        offset (float): distance of the surface that will be extracted
+        tree (bvh.BVH): BVH of mesh, built if None
+
+    Returns:
+        grid (float32 numpy array (nx, ny, nz)): signed distances,
+            negative inside
+        origin (numpy array (3,)): position of grid[0, 0, 0]
+        spacing (float): distance between grid points
+    """
+    field = _distance_field(mesh, resolution, offset, tree)
+    shape = field['shape']
+    grid = np.empty(shape, dtype=np.float32)
+    for start in range(0, shape[0], chunk_size):
+        stop = min(start + chunk_size, shape[0])
+        grid[start:stop] = _distance_rows(field, start, stop)
+    return grid, field['origin'], field['spacing']
+
+
+def _sample(grid, origin, spacing, points, start=0):
+    """ Trilinear interpolation of grid at points
+
+    grid may be the rows from start on of the full grid at origin.
+    """
+    coords = (points - origin) / spacing
+    coords[:, 0] -= start
+    base = np.clip(np.floor(coords).astype(np.int64), 0, np.array(grid.shape) - 2)
+    frac = coords - base
+    values = np.zeros(len(points))
+    for corner in CUBE_CORNERS:
+        weight = np.prod(np.where(corner, frac, 1.0 - frac), axis=1)
+        index = base + corner
+        values += weight * grid[index[:, 0], index[:, 1], index[:, 2]]
+    return values
+
+
+def _resampled(shape, spacing, resolution, offset=0.0):
+    """ Spacing and shape of a grid resampled to resolution (see resample) """
+    extent = (np.array(shape) - 1) * spacing
+    # Less the padding _grid added on both sides
+    longest = extent.max() - 2 * (max(offset, 0.0) + 2 * spacing)
+    new_spacing = longest / resolution
+    return new_spacing, tuple(np.floor(extent / new_spacing).astype(int) + 1)
+
+
+def _resample_rows(rows, origin, spacing, num_x, new_spacing, new_shape, start, stop):
+    """ Rows start <= x < stop of a resampled grid
+
+    rows(low, high) gives the rows low <= x < high of the source grid;
+    only the rows around start to stop are fetched.
+    """
+    grid_y, grid_z = np.meshgrid(np.arange(new_shape[1]), np.arange(new_shape[2]),
+                                 indexing='ij')
+    grid_x = np.arange(start, stop)
+    index = np.stack(np.broadcast_arrays(grid_x[:, None, None], grid_y[None], grid_z[None]),
+                     axis=-1).reshape(-1, 3)
+    points = origin + index * new_spacing
+    coords = (points[[0, -1], 0] - origin[0]) / spacing
+    low = int(np.clip(np.floor(coords[0]) - 1, 0, num_x - 2))
+    high = int(np.clip(np.floor(coords[1]) + 1, 0, num_x - 2)) + 2
+    values = _sample(rows(low, high), origin, spacing, points, low)
+    return values.reshape(len(grid_x), new_shape[1], new_shape[2]).astype(np.float32)
+
+
+def resample(grid, origin, spacing, resolution, chunk_size=CHUNK_SIZE, offset=0.0):
+    """ Resample a grid (see signed_distance_grid) to another resolution
+
+    resolution is the number of voxels along the longest side, not
+    counting the padding; offset is the one the grid was made with, which
+    sets the padding.
+    """
+    new_spacing, shape = _resampled(grid.shape, spacing, resolution, offset)
+    new_grid = np.empty(shape, dtype=np.float32)
+    for start in range(0, shape[0], chunk_size):
+        stop = min(start + chunk_size, shape[0])
+        new_grid[start:stop] = _resample_rows(lambda low, high: grid[low:high], origin, spacing,
+                                              grid.shape[0], new_spacing, shape, start, stop)
+    return new_grid, origin, new_spacing
+
+
+def marching_tetrahedra(grid, origin, spacing, level=0.0, chunk_size=CHUNK_SIZE):
+    """ Extract the surface grid == level as a closed triangle mesh
+
+    Each cube is split into six tetrahedra; vertices on shared edges are
+    shared, so the mesh is closed. Faces point towards increasing values
+    (outwards for a signed distance grid). The grid is processed in slabs
+    of chunk_size cubes along x.
+
+    Returns:
+        mesh.Mesh
+    """
+    slabs = _slabs(lambda start, stop: grid[start:stop], grid.shape[0], chunk_size)
+    return _march(slabs, grid.shape, origin, spacing, level)
+
+
+def _march(slabs, shape, origin, spacing, level):
+    """ marching_tetrahedra over the (start, values) slabs of a grid of
+    shape (see _slabs) """
+    shape = np.array(shape)
+    num_points = np.int64(np.prod(shape))
+    strides = np.array([shape[1] * shape[2], shape[2], 1], dtype=np.int64)
+    tet_offsets = CUBE_CORNERS[CUBE_TETS]  # (6, 4, 3)
+    all_keys = []
+    all_points = []
+    for start, values in slabs:
+        stop = start + len(values) - 1
+        values = values - np.float32(level)
+        # Cubes with the surface passing through them
+        corner_values = np.stack([values[c[0]:c[0] + stop - start, c[1]:c[1] + shape[1] - 1,
+                                         c[2]:c[2] + shape[2] - 1] for c in CUBE_CORNERS])
+        crossing = (corner_values.min(axis=0) < 0) & (corner_values.max(axis=0) >= 0)
+        cubes = np.argwhere(crossing)
+        if not len(cubes):
+            continue
+        # Tetrahedra corner grid positions (t, 4, 3) and values (t, 4)
+        corners = (cubes[:, None, None, :] + tet_offsets[None]).reshape(-1, 4, 3)
+        tet_values = values[corners[..., 0], corners[..., 1], corners[..., 2]]
+        corners[..., 0] += start
+        inside = tet_values < 0
+        count = inside.sum(axis=1)
+        keep = (count > 0) & (count < 4)
+        corners, tet_values, inside, count = corners[keep], tet_values[keep], inside[keep], count[keep]
+        # Sort each tet's corners inside first (stable keeps their order)
+        order = np.argsort(~inside, axis=1, kind='stable')
+        corners = np.take_along_axis(corners, order[..., None], axis=1)
+        tet_values = np.take_along_axis(tet_values, order, axis=1)
+        inside = np.take_along_axis(inside, order, axis=1)
+
+        def edge(rows, vert_a, vert_b):
+            """Edge keys and crossing points between two tet corners"""
+            pos_a = corners[rows, vert_a]
+            pos_b = corners[rows, vert_b]
+            val_a = tet_values[rows, vert_a]
+            val_b = tet_values[rows, vert_b]
+            id_a = pos_a.dot(strides)
+            id_b = pos_b.dot(strides)
+            keys = np.minimum(id_a, id_b) * num_points + np.maximum(id_a, id_b)
+            t = (val_a / (val_a - val_b))[:, None]
+            points = origin + (pos_a + (pos_b - pos_a) * t) * spacing
+            return keys, points
+
+        tris_keys = []
+        tris_points = []
+        # One corner inside: triangle on its three edges
+        rows = np.flatnonzero(count == 1)
+        parts = [edge(rows, 0, 1), edge(rows, 0, 2), edge(rows, 0, 3)]
+        tris_keys.append(np.stack([p[0] for p in parts], axis=1))
+        tris_points.append(np.stack([p[1] for p in parts], axis=1))
+        # Three corners inside: triangle on the edges of the one outside
+        rows = np.flatnonzero(count == 3)
+        parts = [edge(rows, 3, 0), edge(rows, 3, 1), edge(rows, 3, 2)]
+        tris_keys.append(np.stack([p[0] for p in parts], axis=1))
+        tris_points.append(np.stack([p[1] for p in parts], axis=1))
+        # Two inside (0, 1): quad 0-2, 0-3, 1-3, 1-2 as two triangles
+        rows = np.flatnonzero(count == 2)
+        quad = [edge(rows, 0, 2), edge(rows, 0, 3), edge(rows, 1, 3), edge(rows, 1, 2)]
+        for tri in ((0, 1, 2), (0, 2, 3)):
+            tris_keys.append(np.stack([quad[i][0] for i in tri], axis=1))
+            tris_points.append(np.stack([quad[i][1] for i in tri], axis=1))
+        keys = np.concatenate(tris_keys)
+        points = np.concatenate(tris_points)
+
+        # Orient each triangle away from the inside corners
+        tet_rows = np.concatenate([np.flatnonzero(count == 1), np.flatnonzero(count == 3),
+                                   np.flatnonzero(count == 2), np.flatnonzero(count == 2)])
+        weights = inside[tet_rows].astype(np.float64)
+        inside_center = np.einsum('ij,ijk->ik', weights, corners[tet_rows]) / \
+            weights.sum(axis=1)[:, None]
+        outside_center = np.einsum('ij,ijk->ik', 1.0 - weights, corners[tet_rows]) / \
+            (1.0 - weights).sum(axis=1)[:, None]
+        normals = np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0])
+        flip = np.einsum('ij,ij->i', normals, outside_center - inside_center) < 0
+        keys[flip] = keys[flip][:, ::-1]
+        points[flip] = points[flip][:, ::-1]
+        all_keys.append(keys)
+        all_points.append(points.astype(np.float32))
+
+    if not all_keys:
+        return Mesh(np.zeros((0, 3)), np.zeros((0, 3)))
+    keys = np.concatenate(all_keys).ravel()
+    points = np.concatenate(all_points).reshape(-1, 3)
+    _, first, faces = np.unique(keys, return_index=True, return_inverse=True)
+    faces = faces.reshape(-1, 3)
+    # Drop triangles collapsed by a corner exactly on the level
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) &
+                  (faces[:, 2] != faces[:, 0])]
+    return Mesh(points[first], faces)
+
+
+def make_solid(mesh, offset=0.0, solid_resolution=128, mesh_resolution=128,
+               chunk_size=CHUNK_SIZE):
+    """ Solid (closed, manifold) version of a mesh, offset by offset
+
+    Same parameters as mmlirious.make_solid: positive offsets grow the
+    mesh, negative offsets shrink it.
+
+    Args:
+        mesh (mesh.Mesh): the mesh, which should be closed
+        offset (float): distance to move the surface outwards
+        solid_resolution (int): voxels along the longest side for the
+            signed distance grid
+        mesh_resolution (int): voxels along the longest side for the
+            surface extraction
+
+    Returns:
+        mesh.Mesh: the new mesh
+    """
+    field = _distance_field(mesh, solid_resolution, offset)
+    origin = field['origin']
+    shape = field['shape']
+
+    def rows(start, stop):
+        return _distance_rows(field, start, stop)
+
+    if mesh_resolution == solid_resolution:
+        slabs = _slabs(rows, shape[0], chunk_size)
+        return _march(slabs, shape, origin, field['spacing'], offset)
+    spacing, new_shape = _resampled(shape, field['spacing'], mesh_resolution, offset)
+
+    def resampled_rows(start, stop):
+        return _resample_rows(rows, origin, field['spacing'], shape[0], spacing, new_shape,
+                              start, stop)
+
+    slabs = _slabs(resampled_rows, new_shape[0], chunk_size)
+    return _march(slabs, new_shape, origin, spacing, offset)
+
+
+def hollow(mesh, offset=2, solid_resolution=128, mesh_resolution=128,
+           chunk_size=CHUNK_SIZE):
+    """ Hollow a mesh, leaving walls of thickness offset
+
+    Same parameters as mmlirious.hollow. The inner surface is the mesh
+    shrunk by offset, facing inwards.
+
+    Returns:
+        mesh.Mesh: the original surface plus the inner surface
+    """
+    inner = make_solid(mesh, -offset, solid_resolution, mesh_resolution, chunk_size)
+    faces = np.concatenate((mesh.faces, inner.faces[:, ::-1] + len(mesh.vertices)))
+    return Mesh(np.concatenate((mesh.vertices, inner.vertices)), faces)
+
+
+def hollow_volume(fullpath_in, fullpath_out, log=None, offset=-3,
+                  solid_resolution=256, mesh_resolution=256,
+                  del_small_parts=False, small_part_ratio=0.1,
+                  chunk_size=CHUNK_SIZE):
+    """ Create hollow (offset) volume without MeshMixer
+
+    Same as pylirious.hollow_volume: writes the volume enclosed by the
+    surface offset by offset (negative is inwards), e.g. to subtract from
+    the original to hollow it.
+
+    """
+    if log is not None:
+        log_file = open(log, 'a')
+        log_file.write('voxel.hollow_volume: %s -> %s, offset = %s, solid_resolution = %s, '
+                       'mesh_resolution = %s\n' % (fullpath_in, fullpath_out, offset,
+                                                   solid_resolution, mesh_resolution))
+        log_file.close()
+    mesh = Mesh.read(fullpath_in)
+    volume = make_solid(mesh, offset, solid_resolution, mesh_resolution, chunk_size)
+    if del_small_parts:
+        labels, _ = components.label(volume.faces, len(volume.vertices))
+        small = components.small_parts(labels, small_part_ratio)
+        volume.vertices, volume.faces = components.keep(volume.vertices, volume.faces, ~small)
+    volume.write(fullpath_out)
+    if not os.path.isfile(fullpath_out):
+        print('Error: output file was not created')
+        return 1
+    return 0
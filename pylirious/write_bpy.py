@@ -4,8 +4,48 @@ import os
 import sys
 import subprocess
 
-from meshlabxml.util import delete_all
-from meshlabxml import handle_error
+
+# Scripts that coalesce transforms (see begin), and the transform currently
+# being coalesced for each: [mesh_object, [matrix expressions, first to last],
+# file offset where its bpylirious.transform call starts]
+_coalesce = set()
+_pending_transforms = {}
+
+
+def flush_transforms(script):
+    """ End the transform being coalesced in script
+
+    The transform is already in the script file; later rotate, translate
+    and scale calls start a new one.
+    """
+    _pending_transforms.pop(script, None)
+    return None
+
+
+def _queue_transform(script, mesh_object, matrix):
+    """ Add a transform to the transform being coalesced in script
+
+    The combined bpylirious.transform call is rewritten in place, so the
+    script file never misses a transform.
+    """
+    pending = _pending_transforms.pop(script, None)
+    if pending is None or pending[0] != str(mesh_object):
+        pending = [str(mesh_object), [], os.path.getsize(script)]
+    pending[1].append(matrix)
+    script_file = open(script, 'r+')
+    script_file.truncate(pending[2])
+    script_file.close()
+    # Later transforms multiply on the left (Blender 2.7x uses * for matrices)
+    write_bpyfunc(script=script, function='transform', mesh_object=pending[0],
+                  matrix=' * '.join(reversed(pending[1])))
+    _pending_transforms[script] = pending
+    return None
+
+
+def _coalesced(script, return_vars, kwargs):
+    """ True if a rotate, translate or scale call can be coalesced """
+    return (script in _coalesce and return_vars is None and
+            str(kwargs.get('apply', True)) == 'True')
 
 
 def write_bpyfunc(return_vars=None, script=None, function=None, **kwargs):
@@ -18,6 +58,7 @@ def write_bpyfunc(return_vars=None, script=None, function=None, **kwargs):
     print('return_vars = %s' % return_vars)
     print('function = %s' % function)
     print('kwargs = %s' % kwargs)"""
+    flush_transforms(script)
 
     script_file = open(script, 'a')
     if return_vars is not None:
@@ -62,8 +103,20 @@ def write_bpyfunc(return_vars=None, script=None, function=None, **kwargs):
     return return_vars
 
 
-def begin(script='TEMP3D_blender_default.py'):
-    """ Create new Blender Python script and write opening lines"""
+def begin(script='TEMP3D_blender_default.py', coalesce_transforms=False):
+    """ Create new Blender Python script and write opening lines
+
+    With coalesce_transforms=True, consecutive rotate, translate and scale
+    calls on the same object are written as a single bpylirious.transform,
+    so the mesh is only rewritten once. The combined call is rewritten in
+    the script file as each transform is added.
+
+    """
+    _pending_transforms.pop(script, None)
+    if coalesce_transforms:
+        _coalesce.add(script)
+    else:
+        _coalesce.discard(script)
     script_file = open(script, 'w')
     script_file.write('\n'.join([
         '""" Blender Python script created by pylirious.writebpy"""\n',
@@ -110,6 +163,11 @@ def duplicate_mesh(return_vars=None,
 
 def rotate(return_vars=None, script='TEMP3D_blender_default.py', **kwargs):
     """ Run the same function in bpylirious and return return_vars"""
+    if _coalesced(script, return_vars, kwargs):
+        _queue_transform(script, kwargs.get('mesh_object'),
+                         'bpylirious.rotation_matrix(axis="%s", angle=%s)' % (
+                             kwargs.get('axis', 'z'), kwargs.get('angle', 0.0)))
+        return return_vars
     function = 'rotate'
     write_bpyfunc(return_vars=return_vars, script=script,
                   function=function, **kwargs)
@@ -118,6 +176,11 @@ def rotate(return_vars=None, script='TEMP3D_blender_default.py', **kwargs):
 
 def translate(return_vars=None, script='TEMP3D_blender_default.py', **kwargs):
     """ Run the same function in bpylirious and return return_vars"""
+    if _coalesced(script, return_vars, kwargs):
+        _queue_transform(script, kwargs.get('mesh_object'),
+                         'bpylirious.translation_matrix(value=%s)' % (
+                             kwargs.get('value', (0.0, 0.0, 0.0)),))
+        return return_vars
     function = 'translate'
     write_bpyfunc(return_vars=return_vars, script=script,
                   function=function, **kwargs)
@@ -126,12 +189,29 @@ def translate(return_vars=None, script='TEMP3D_blender_default.py', **kwargs):
 
 def scale(return_vars=None, script='TEMP3D_blender_default.py', **kwargs):
     """ Run the same function in bpylirious and return return_vars"""
+    if _coalesced(script, return_vars, kwargs):
+        _queue_transform(script, kwargs.get('mesh_object'),
+                         'bpylirious.scale_matrix(value=%s)' % (
+                             kwargs.get('value', (0.0, 0.0, 0.0)),))
+        return return_vars
     function = 'scale'
     write_bpyfunc(return_vars=return_vars, script=script,
                   function=function, **kwargs)
     return return_vars
 
 
+def transform(return_vars=None, script='TEMP3D_blender_default.py', **kwargs):
+    """ Run the same function in bpylirious and return return_vars
+
+    matrix is written verbatim, e.g.
+    matrix='bpylirious.rotation_matrix(axis="x", angle=90)'
+    """
+    function = 'transform'
+    write_bpyfunc(return_vars=return_vars, script=script,
+                  function=function, **kwargs)
+    return return_vars
+
+
 def join(return_vars=None, script='TEMP3D_blender_default.py', **kwargs):
     """ Run the same function in bpylirious and return return_vars"""
     function = 'join'
@@ -255,6 +335,15 @@ def uv_project_from_view(return_vars=None,
     return return_vars
 
 
+def uv_project_native(return_vars=None,
+                   script='TEMP3D_blender_default.py', **kwargs):
+    """ Run the same function in bpylirious and return return_vars"""
+    function = 'uv_project_native'
+    write_bpyfunc(return_vars=return_vars, script=script,
+                  function=function, **kwargs)
+    return return_vars
+
+
 def translate_uv(return_vars=None,
                    script='TEMP3D_blender_default.py', **kwargs):
     """ Run the same function in bpylirious and return return_vars"""
@@ -289,10 +378,19 @@ def measure_aabb(return_vars=None, script='TEMP3D_blender_default.py', **kwargs)
     return return_vars
 
 
+def operator_stats(return_vars=None, script='TEMP3D_blender_default.py', **kwargs):
+    """ Run the same function in bpylirious and return return_vars"""
+    function = 'operator_stats'
+    write_bpyfunc(return_vars=return_vars, script=script,
+                  function=function, **kwargs)
+    return return_vars
+
+
 def command(return_vars=None, script='TEMP3D_blender_default.py', cmd=None):
     """ Write the command verbatim to the script file
 
     """
+    flush_transforms(script)
     script_file = open(script, 'a')
     script_file.write(cmd + '\n')
     script_file.close()
@@ -303,6 +401,9 @@ def run(script='TEMP3D_blender_default.py', log=None):
     """Run Blender in a subprocess and execute script.
 
     """
+    from meshlabxml import handle_error
+
+    flush_transforms(script)
     cmd = 'blender --background --factory-startup --python "%s"' % script
     if log is not None:
         log_file = open(log, 'a')
@@ -6,8 +6,8 @@ import sys
 import subprocess
 import time
 
-from meshlabxml.util import delete_all
-from meshlabxml import handle_error
+# Python 2.7 that runs the scripts (mm-api needs it)
+PYTHON27 = 'C:\\Python27\\pythonw.exe'
 
 
 def write_mmpyfunc(return_vars=None, script=None, function=None, **kwargs):
@@ -122,6 +122,14 @@ def make_solid(return_vars=None, script='TEMP3D_mix_default.py', **kwargs):
     return return_vars
 
 
+def clear_scene(return_vars=None, script='TEMP3D_mix_default.py', **kwargs):
+    """ Run the same function in mmlirious and return return_vars"""
+    function = 'clear_scene'
+    write_mmpyfunc(return_vars=return_vars, script=script,
+                   function=function, **kwargs)
+    return return_vars
+
+
 def command(cmd=None, script='TEMP3D_mix_default.py'):
     """ Write the command verbatim to the script file"""
     script_file = open(script, 'a')
@@ -129,12 +137,22 @@ def command(cmd=None, script='TEMP3D_mix_default.py'):
     script_file.close()
 
 
-def run(script='TEMP3D_mix_default.py', log=None):
+def run(script='TEMP3D_mix_default.py', log=None, launch=True, session=None,
+        python=PYTHON27):
     """Run MeshMixer in a subprocess and execute script.
 
+    launch (bool): start MeshMixer before running the script and terminate it
+        afterwards. Set to False if MeshMixer is already running.
+    session (mmsession.Session): run the script against an idle instance
+        of this (started) session instead of launching MeshMixer
+    python (str): the Python 2.7 interpreter that runs the script
+
     """
-    python27 = 'C:\\Python27\\pythonw.exe'
-    cmd = '"%s" "%s"' % (python27, script)
+    from meshlabxml import handle_error
+
+    cmd = '"%s" "%s"' % (python, script)
+    if session is not None:
+        launch = False
 
     if log is not None:
         log_file = open(log, 'a')
@@ -150,10 +168,11 @@ def run(script='TEMP3D_mix_default.py', log=None):
         if log is not None:
             # Find position in log_file before launching MeshMixer
             start_pos = log_file.tell()
-        # Launch MeshMixer
-        # TODO: experiment with passing current directory to meshmixer
-        mm_proc = subprocess.Popen(['meshmixer'], stdout=log_file,
-                                   stderr=log_file, universal_newlines=True)
+        if launch:
+            # Launch MeshMixer
+            # TODO: experiment with passing current directory to meshmixer
+            mm_proc = subprocess.Popen(['meshmixer'], stdout=log_file,
+                                       stderr=log_file, universal_newlines=True)
 
         if False:
         #if log is not None:
@@ -175,16 +194,20 @@ def run(script='TEMP3D_mix_default.py', log=None):
                         mm_ready = True
                 # log_file.seek(0,2) # Go to the end of the file
                 time.sleep(0.1)
-        else:
+        elif launch:
             # Use a fixed delay if there is no log. May not be enough if your
             # computer is slow.
             time.sleep(5)
 
         # Run mm python script
-        return_code = subprocess.call(cmd, shell=True, stdout=log_file,
-                                      stderr=log_file, universal_newlines=True)
+        if session is not None:
+            return_code = session.run_script(cmd, log_file)
+        else:
+            return_code = subprocess.call(cmd, shell=True, stdout=log_file,
+                                          stderr=log_file, universal_newlines=True)
         # return_code = 1 # for testing
-        mm_proc.terminate()
+        if launch:
+            mm_proc.terminate()
         if log is not None:
             log_file.close()
         if (return_code == 0) or handle_error(program_name='MeshMixer', cmd=cmd, log=log):
@@ -8,5 +8,7 @@ setup(name='pylirious',
       author_email='3DLirious@gmail.com',
       license='LGPL-2.1',
       packages=['pylirious'],
-      install_requires=['meshlabxml',],
+      install_requires=['meshlabxml', 'numpy'],
+      extras_require={'texture': ['Pillow']},
+      entry_points={'console_scripts': ['pylirious = pylirious.__main__:main']},
       include_package_data=True)
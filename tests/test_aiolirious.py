@@ -0,0 +1,44 @@
+"""Tests for aiolirious"""
+
+import sys
+import asyncio
+
+from pylirious import aiolirious
+
+ECHO = [sys.executable, '-c', 'print("done")']
+
+
+async def _jobs(count, program):
+    return await asyncio.gather(*[aiolirious.run(ECHO, program=program, log=None)
+                                  for _ in range(count)])
+
+
+def test_limit_across_event_loops(capsys):
+    limit = aiolirious.LIMITS['openscad']
+    aiolirious.set_limit('openscad', 1)
+    try:
+        # More jobs than the limit, so the jobs wait on the semaphore in both loops
+        assert asyncio.run(_jobs(3, 'openscad')) == [0, 0, 0]
+        assert asyncio.run(_jobs(3, 'openscad')) == [0, 0, 0]
+    finally:
+        aiolirious.set_limit('openscad', limit)
+    assert capsys.readouterr().out.splitlines().count('done') == 6
+
+
+def test_child_killed_on_error(tmp_path):
+    log = str(tmp_path / 'log.txt')
+    cmd = [sys.executable, '-c', 'import time\nprint("x", flush=True)\ntime.sleep(60)']
+
+    async def job():
+        task = asyncio.ensure_future(aiolirious.run(cmd, program='blender', log=log))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    assert asyncio.run(asyncio.wait_for(job(), 20))
+    with open(log) as log_file:
+        assert 'KILLED' in log_file.read()
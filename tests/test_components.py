@@ -0,0 +1,29 @@
+"""Tests for components"""
+
+import numpy as np
+
+from pylirious import components
+from test_decimate import _icosphere
+
+
+def test_union_find_isolated_vertex():
+    # A path 0-3-1 and a pair 4-2 given high endpoint first; 5 has no edges
+    roots = components.union_find(np.array([3, 1, 4]), np.array([0, 3, 2]), 6)
+    assert roots.tolist() == [0, 0, 2, 0, 2, 5]
+
+
+def test_label_disjoint_meshes():
+    sphere = _icosphere(2)
+    num_verts = len(sphere.vertices)
+    # Second sphere after one unused vertex; its faces come first
+    faces = np.concatenate((sphere.faces[:7] + num_verts + 1, sphere.faces,
+                            sphere.faces[7:] + num_verts + 1))
+    labels, count = components.label(faces, 2 * num_verts + 1)
+    # Numbered by lowest vertex; the unused vertex is not a component
+    assert count == 2
+    assert (labels[:7] == 1).all() and (labels[7:7 + len(sphere.faces)] == 0).all()
+    assert (labels[7 + len(sphere.faces):] == 1).all()
+
+    vertices = np.concatenate((sphere.vertices, [[0, 0, 0]], sphere.vertices + 50))
+    measured = components.measure(vertices, faces, labels)
+    assert measured['faces'].tolist() == [len(sphere.faces)] * 2
@@ -0,0 +1,54 @@
+"""Tests for convert"""
+
+import os
+
+import numpy as np
+import pytest
+
+from pylirious import convert, stl
+
+VERTICES = np.array([[0, 0, 0], [10, 0, 0], [0, 20, 0], [0, 0, 30]], dtype=np.float32)
+FACES = np.array([[0, 2, 1], [0, 1, 3], [0, 3, 2], [1, 2, 3]], dtype=np.int32)
+
+
+@pytest.mark.parametrize('scale_meta, real_factor', [('2', 0.5), ('-10', 10.0)])
+def test_normalize_round_trip(tmp_path, scale_meta, real_factor):
+    file_in = str(tmp_path / ('model(%sZ).stl' % scale_meta))
+    stl.write(file_in, VERTICES, FACES)
+
+    real = convert.normalize(file_in)
+    assert os.path.basename(real) == 'model(1Z).stl'
+    mesh = convert.read(real)
+    assert np.allclose(np.sort(mesh['vertices'], axis=0),
+                       np.sort(VERTICES * real_factor, axis=0), atol=1e-4)
+
+    back = convert.normalize(real, str(tmp_path / ('back(%sZ).stl' % scale_meta)),
+                             target_scale=scale_meta)
+    assert np.allclose(np.sort(convert.read(back)['vertices'], axis=0),
+                       np.sort(VERTICES, axis=0), atol=1e-4)
+
+
+def test_cli_round_trip(tmp_path, capsys):
+    file_in = str(tmp_path / 'model.stl')
+    stl.write(file_in, VERTICES, FACES)
+    assert convert.main([file_in, '--to', 'obj']) == 0
+    file_obj = str(tmp_path / 'model(1Z).obj')
+    assert capsys.readouterr().out == '%s -> %s\n' % (file_in, file_obj)
+
+    file_back = str(tmp_path / 'back.stl')
+    assert convert.main([file_obj, '-o', file_back]) == 0
+    mesh = convert.read(file_back)
+    assert np.array_equal(mesh['vertices'][mesh['faces']], VERTICES[FACES])
+
+
+def test_cli_keeps_input(tmp_path, capsys):
+    file_in = str(tmp_path / 'scan(1Z).stl')
+    stl.write(file_in, VERTICES, FACES)
+    with open(file_in, 'rb') as stl_file:
+        data = stl_file.read()
+    with pytest.raises(SystemExit) as error:
+        convert.main([file_in])
+    assert error.value.code == 1
+    assert 'same as the input' in capsys.readouterr().out
+    with open(file_in, 'rb') as stl_file:
+        assert stl_file.read() == data
@@ -0,0 +1,66 @@
+"""Tests for decimate"""
+
+import numpy as np
+
+from pylirious import decimate
+from pylirious.mesh import Mesh
+
+
+def _icosphere(level):
+    """Unit icosphere, subdivided level times"""
+    t = (1 + 5 ** 0.5) / 2
+    vertices = np.array([[-1, t, 0], [1, t, 0], [-1, -t, 0], [1, -t, 0], [0, -1, t], [0, 1, t],
+                         [0, -1, -t], [0, 1, -t], [t, 0, -1], [t, 0, 1], [-t, 0, -1],
+                         [-t, 0, 1]])
+    faces = np.array([[0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11], [1, 5, 9],
+                      [5, 11, 4], [11, 10, 2], [10, 7, 6], [7, 1, 8], [3, 9, 4], [3, 4, 2],
+                      [3, 2, 6], [3, 6, 8], [3, 8, 9], [4, 9, 5], [2, 4, 11], [6, 2, 10],
+                      [8, 6, 7], [9, 8, 1]])
+    for _ in range(level):
+        edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+        edges, inverse = np.unique(edges, axis=0, return_inverse=True)
+        mid = len(vertices) + inverse.reshape(-1, 3)
+        vertices = np.concatenate((vertices, (vertices[edges[:, 0]] + vertices[edges[:, 1]]) / 2))
+        a, b, c = faces.T
+        ab, bc, ca = mid.T
+        faces = np.concatenate([np.stack(tri, axis=1) for tri in
+                                ((a, ab, ca), (b, bc, ab), (c, ca, bc), (ab, bc, ca))])
+    vertices /= np.linalg.norm(vertices, axis=1)[:, None]
+    return Mesh(vertices * 10, faces)
+
+
+def _is_closed(mesh):
+    """Every directed edge is used once and its reverse once"""
+    edges = mesh.faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    keys = set(map(tuple, edges.tolist()))
+    return len(keys) == len(edges) and all((b, a) in keys for a, b in keys)
+
+
+def test_decimate_sphere():
+    mesh = _icosphere(4)
+    mesh.colors = np.full((len(mesh.vertices), 3), 200, dtype=np.uint8)
+    removed = decimate.decimate(mesh, target_faces=1000)
+    assert removed == 5120 - len(mesh.faces)
+    assert 999 <= len(mesh.faces) <= 1000
+    assert _is_closed(mesh)
+    radius = np.linalg.norm(mesh.vertices, axis=1)
+    assert np.allclose(radius, 10, atol=0.1)
+    assert (mesh.colors == 200).all()
+
+
+def test_max_error():
+    mesh = _icosphere(3)
+    assert decimate.decimate(mesh, target_faces=0, max_error=0.0) == 0
+    assert 0 < decimate.decimate(mesh, target_faces=0, max_error=0.1) < 1280
+    assert _is_closed(mesh)
+
+
+def test_seams_stay():
+    mesh = _icosphere(3)
+    # Split the vertices of one face off, as a uv seam would
+    seam = mesh.faces[0].copy()
+    mesh.faces[0] = len(mesh.vertices) + np.arange(3)
+    mesh.vertices = np.concatenate((mesh.vertices, mesh.vertices[seam]))
+    decimate.decimate(mesh, target_ratio=0.25, preserve_seams=True)
+    for position in mesh.vertices[-3:]:
+        assert (np.abs(mesh.vertices - position).max(axis=1) == 0).sum() == 2
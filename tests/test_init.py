@@ -0,0 +1,41 @@
+"""Tests for the package namespace"""
+
+import os
+import subprocess
+import sys
+
+import pylirious
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Upper bound for "import pylirious" in microseconds: it takes about 0.3 ms
+# lazily, against about 21 ms when everything was imported up front (NumPy
+# alone is over 30 ms)
+IMPORT_TIME_LIMIT = 10000
+
+
+def test_import_time():
+    """ "import pylirious" leaves meshlabxml and NumPy until they are used """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import pylirious'],
+                             cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True,
+                             check=True)
+    # import time: self [us] | cumulative | imported package
+    rows = [line.split('|') for line in process.stderr.splitlines()
+            if line.startswith('import time:') and 'cumulative' not in line]
+    modules = {row[2].strip() for row in rows}
+    assert 'pylirious' in modules
+    for heavy in ('meshlabxml', 'numpy'):
+        assert not [module for module in modules if module.split('.')[0] == heavy]
+    cumulative = {row[2].strip(): int(row[1]) for row in rows}
+    assert cumulative['pylirious'] < IMPORT_TIME_LIMIT
+
+
+def test_import_star():
+    namespace = {}
+    exec('from pylirious import *', namespace)
+    for name in ('render_scad', 'hollow_volume', 'scale_meta2scale', 'filename',
+                 'write_bpy', 'write_mmpy', 'convert', 'voxel'):
+        assert name in namespace
+    assert callable(namespace['setup_exe_paths'])
+    assert 'bpylirious' not in namespace
+    assert sorted(pylirious.__all__) == pylirious.__all__
@@ -0,0 +1,33 @@
+"""Tests for mesh"""
+
+import numpy as np
+
+from pylirious import stl
+from pylirious.mesh import Mesh
+from test_decimate import _is_closed
+from test_voxel import CUBE_FACES, CUBE_VERTICES
+
+
+def test_weld_stl_cube(tmp_path):
+    path = str(tmp_path / 'cube.stl')
+    stl.write(path, CUBE_VERTICES, CUBE_FACES)
+    data = stl.read(path, weld=False)
+    mesh = Mesh(data['vertices'], data['faces'])
+    assert mesh.vertices.shape == (36, 3)
+    assert mesh.weld() == 28
+    assert mesh.vertices.shape == (8, 3)
+    assert mesh.faces.shape == (12, 3)
+    assert _is_closed(mesh)
+    assert np.array_equal(mesh.vertices[mesh.faces], CUBE_VERTICES[CUBE_FACES])
+
+
+def test_weld_tolerance():
+    vertices = np.float32([[0, 0, 0], [-0.0, 0, 0], [1, 0, 0], [1.001, 0, 0], [0, 1, 0]])
+    mesh = Mesh(vertices, [[0, 2, 4], [1, 3, 4], [0, 1, 4]])
+    # -0.0 and 0.0 are the same vertex; 1 and 1.001 only with a tolerance
+    assert mesh.weld() == 1
+    assert len(mesh.faces) == 3
+    assert mesh.weld(tolerance=0.01) == 1
+    assert mesh.vertices.shape == (3, 3)
+    assert np.allclose(mesh.vertices[mesh.faces], [[[0, 0, 0], [1, 0, 0], [0, 1, 0]]] * 2,
+                       atol=0.01)
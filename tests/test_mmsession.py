@@ -0,0 +1,144 @@
+"""Tests for mmsession, against the stand-in server"""
+
+import os
+import sys
+import socket
+
+import pytest
+
+from pylirious import mmsession
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_ports():
+    """Two free UDP ports: (send_port, receive_port)"""
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(2)]
+    for sock in sockets:
+        sock.bind(('127.0.0.1', 0))
+    ports = tuple(sock.getsockname()[1] for sock in sockets)
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+@pytest.fixture
+def ports():
+    return _free_ports()
+
+
+def test_connect_round_trip(ports):
+    server = mmsession.StandIn(*ports)
+    server.start()
+    remote = mmsession.connect_packet(*ports)
+    try:
+        assert remote.send(b'command') == b'command'
+        mmsession.ping_packet(remote)
+        assert server.received == 2
+    finally:
+        remote.shutdown()
+        server.stop()
+
+
+def test_timeout(ports):
+    server = mmsession.StandIn(*ports, handler=lambda packet: None)
+    server.start()
+    remote = mmsession.PacketRemote(*ports, timeout=0.2)
+    remote.connect()
+    try:
+        with pytest.raises(socket.timeout):
+            remote.send(b'command')
+    finally:
+        remote.shutdown()
+        server.stop()
+
+
+def test_reconnect(ports):
+    server = mmsession.StandIn(*ports)
+    server.start()
+    remote = mmsession.PacketRemote(*ports, timeout=0.2)
+    remote.connect()
+    try:
+        assert remote.send(b'first') == b'first'
+        server.stop()
+        with pytest.raises(socket.timeout):
+            remote.send(b'lost')
+        server = mmsession.StandIn(*ports)
+        server.start()
+        remote.shutdown()
+        remote.connect()
+        assert remote.send(b'second') == b'second'
+    finally:
+        remote.shutdown()
+        server.stop()
+
+
+@pytest.fixture
+def session(ports, monkeypatch):
+    """Started session whose instance is a stand-in server process"""
+    monkeypatch.setenv('PYTHONPATH', ROOT)
+    program = [sys.executable, '-m', 'pylirious.mmsession', '--stand-in',
+               '--send-port', str(ports[0]), '--receive-port', str(ports[1])]
+    session = mmsession.Session(program=program, ports=[ports], startup_delay=1,
+                                connector=mmsession.connect_packet,
+                                ping=mmsession.ping_packet, clear=mmsession.clear_packet)
+    with session:
+        yield session
+    assert session.instances[0].proc is None
+
+
+def test_session_restarts_dead_instance(session):
+    remote = session.acquire(timeout=5)
+    assert remote.send(b'import a.obj') == b'1'
+    session.instances[0].proc.kill()
+    session.instances[0].proc.wait()
+    session.release(remote)
+
+    remote = session.acquire(timeout=5)
+    assert session.instances[0].restarts == 1
+    assert remote.send(b'list') == b''
+    session.release(remote)
+
+
+def test_session_clears_scene(session):
+    with session.job(timeout=5) as remote:
+        assert remote.send(b'import a.obj') == b'1'
+        assert remote.send(b'import b.obj') == b'2'
+        assert remote.send(b'list') == b'1 2'
+    with session.job(timeout=5) as remote:
+        assert remote.send(b'list') == b''
+    assert session.instances[0].restarts == 0
+
+
+def test_release_requeues_on_error(session):
+    def broken_clear(remote):
+        raise ValueError('clear failed')
+
+    session.instances[0].clear = broken_clear
+    remote = session.acquire(timeout=5)
+    with pytest.raises(ValueError):
+        session.release(remote)
+    session.instances[0].clear = mmsession.clear_packet
+    remote = session.acquire(timeout=1)
+    session.release(remote)
+
+
+def test_run_script(session, tmp_path):
+    from pylirious import write_mmpy
+
+    result = tmp_path / 'objects.txt'
+    script = tmp_path / 'script.py'
+    # Stands in for a write_mmpy script: connects like mmlirious.begin
+    script.write_text('\n'.join([
+        'import os',
+        'from pylirious import mmsession',
+        'remote = mmsession.connect_packet(int(os.environ[mmsession.SEND_PORT_VARIABLE]),',
+        '                                  int(os.environ[mmsession.RECEIVE_PORT_VARIABLE]))',
+        'remote.send(b"import a.obj")',
+        'open(%r, "wb").write(remote.send(b"list"))' % str(result),
+        'remote.shutdown()', '']))
+    assert write_mmpy.run(str(script), session=session, python=sys.executable) == 0
+    assert result.read_bytes() == b'1'
+    # The scene was cleared and the session's remote reconnected
+    with session.job(timeout=5) as remote:
+        assert remote.send(b'list') == b''
@@ -0,0 +1,130 @@
+"""Tests for nplirious"""
+
+import numpy as np
+
+from pylirious import nplirious, obj
+from pylirious.mesh import Mesh
+from test_decimate import _icosphere, _is_closed
+
+
+def _volume(mesh):
+    """Signed volume; positive for outward facing triangles"""
+    tri = mesh.vertices[mesh.faces].astype(np.float64)
+    return np.einsum('ij,ij->i', tri[:, 0], np.cross(tri[:, 1], tri[:, 2])).sum() / 6
+
+
+def _hollow_sphere():
+    """Sphere of radius 10 with a reversed sphere of radius 5 inside"""
+    outer = _icosphere(3)
+    inner = _icosphere(2)
+    faces = np.concatenate((outer.faces, inner.faces[:, ::-1] + len(outer.vertices)))
+    return Mesh(np.concatenate((outer.vertices, inner.vertices / 2)), faces)
+
+
+def test_plane_cut_through_vertices():
+    mesh = _icosphere(3)
+    volume = _volume(mesh)
+    # The equator of the icosphere is made of vertices
+    assert (np.abs(mesh.vertices[:, 2]) < 1e-6).sum() > 0
+    nplirious.plane_cut(mesh, axis='z', offset=0.0)
+    assert _is_closed(mesh)
+    assert mesh.vertices[:, 2].min() >= 0
+    assert np.isclose(_volume(mesh), volume / 2, rtol=1e-3)
+
+    mesh = _icosphere(3)
+    nplirious.plane_cut(mesh, axis='z', offset=0.0, direction=-1, poke=True)
+    assert _is_closed(mesh)
+    assert mesh.vertices[:, 2].max() <= 0
+    assert np.isclose(_volume(mesh), volume / 2, rtol=1e-3)
+
+
+def test_plane_cut_hole():
+    solid = _icosphere(3)
+    nplirious.plane_cut(solid, axis='x', offset=1.3)
+    inner = _icosphere(2)
+    inner.vertices /= 2
+    nplirious.plane_cut(inner, axis='x', offset=1.3)
+
+    mesh = _hollow_sphere()
+    nplirious.plane_cut(mesh, axis='x', offset=1.3)
+    assert _is_closed(mesh)
+    assert mesh.vertices[:, 0].min() >= 1.3 - 1e-5
+    # The inner outline is a hole in the cap, not a second cap
+    assert np.isclose(_volume(mesh), _volume(solid) - _volume(inner), rtol=1e-3)
+
+
+def test_extrude_bottom():
+    mesh = _icosphere(3)
+    nplirious.plane_cut(mesh, axis='z', offset=0.0)
+    volume = _volume(mesh)
+    bottom = nplirious.select_plane(mesh)
+    tri = mesh.vertices[mesh.faces[bottom]].astype(np.float64)
+    area = np.linalg.norm(np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0]), axis=1).sum() / 2
+
+    nplirious.extrude_bottom(mesh, distance=6)
+    assert _is_closed(mesh)
+    assert np.isclose(mesh.vertices[:, 2].min(), -6)
+    assert np.isclose(_volume(mesh), volume + 6 * area, rtol=1e-4)
+
+
+def test_project_uvs_view():
+    vertices = np.array([[0, 0, 0], [2, 0, 1], [2, 1, 2], [0, 1, 3]], dtype=np.float32)
+    uvs = nplirious.project_uvs(vertices, np.arange(4), view='TOP')
+    assert np.allclose(uvs, [[0, 0], [1, 0], [1, 1], [0, 1]])
+    uvs = nplirious.project_uvs(vertices, np.arange(4), view='FRONT', scale_to_bounds=False)
+    assert np.allclose(uvs, vertices[:, [0, 2]])
+
+
+def test_set_corner_uvs_negative_zero():
+    mesh = Mesh(np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]]),
+                np.array([[0, 1, 2], [0, 2, 3]]))
+    corner_uvs = np.array([[0, 0], [1, 0], [1, 1], [-0.0, 0], [1, 1], [0, 1]],
+                          dtype=np.float32)
+    nplirious._set_corner_uvs(mesh, corner_uvs)
+    assert len(mesh.vertices) == 4
+    assert np.array_equal(mesh.uvs[mesh.faces].reshape(-1, 2), corner_uvs)
+
+
+def test_sphere_project_seam():
+    mesh = _icosphere(3)
+    corners = mesh.vertices[mesh.faces]
+    num_verts = len(mesh.vertices)
+    nplirious.uv_sphere_project(mesh, view='FRONT')
+    # Only the vertices on the seam are split; faces keep their corners
+    assert num_verts < len(mesh.vertices) < 1.2 * num_verts
+    assert np.array_equal(mesh.vertices[mesh.faces], corners)
+    # No face away from the poles spans the seam
+    face_u = mesh.uvs[mesh.faces][:, :, 0]
+    equator = (np.abs(corners[:, :, 2]) < 9).all(axis=1)
+    assert (face_u.max(axis=1) - face_u.min(axis=1))[equator].max() < 0.1
+    # Poles along Z for the front view
+    top = np.argmax(mesh.vertices[:, 2])
+    bottom = np.argmin(mesh.vertices[:, 2])
+    assert np.isclose(mesh.uvs[top, 1], 1) and np.isclose(mesh.uvs[bottom, 1], 0)
+
+
+def _textured_quad(path):
+    """Unit quad with gray vertex colors and a uv at each corner"""
+    vertices = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]])
+    obj.write(path, vertices, np.array([[0, 1, 2], [0, 2, 3]]),
+              uvs=vertices[:, :2], face_uvs=np.array([[0, 1, 2], [0, 2, 3]]),
+              colors=np.full((4, 3), 0.5))
+
+
+def test_tex2vc_file(tmp_path):
+    file_in = str(tmp_path / 'quad.obj')
+    _textured_quad(file_in)
+    # Rows top to bottom: red, green / blue, white
+    image = np.array([[[255, 0, 0], [0, 255, 0]], [[0, 0, 255], [255, 255, 255]]],
+                     dtype=np.uint8)
+
+    file_out = nplirious.tex2vc_file(file_in, str(tmp_path / 'quad.ply'), image_file=image)
+    colors = Mesh.read(file_out).colors[:, :3]
+    # Bottom left, bottom right, top right, top left
+    assert np.array_equal(colors, [[0, 0, 255], [255, 255, 255], [0, 255, 0], [255, 0, 0]])
+
+    # Blend over the gray vertex colors instead of replacing them
+    file_out = nplirious.tex2vc_file(file_in, str(tmp_path / 'quad.ply'), image_file=image,
+                                     replace_active_layer=False)
+    colors = Mesh.read(file_out).colors[:, :3]
+    assert np.array_equal(colors, [[0, 0, 128], [128, 128, 128], [0, 128, 0], [128, 0, 0]])
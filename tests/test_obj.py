@@ -0,0 +1,72 @@
+"""Tests for obj"""
+
+import numpy as np
+
+from pylirious import obj
+
+
+def _write_colored(path, vertices, colors, faces, bad_line=None):
+    with open(path, 'w') as obj_file:
+        for index, (vertex, color) in enumerate(zip(vertices, colors)):
+            if index == bad_line:
+                obj_file.write('v %f %f nan_value %f %f %f\n' % (
+                    vertex[0], vertex[1], color[0], color[1], color[2]))
+            else:
+                obj_file.write('v %f %f %f %f %f %f\n' % (tuple(vertex) + tuple(color)))
+        for face in faces:
+            obj_file.write('f %d %d %d\n' % tuple(face + 1))
+
+
+def test_read_colored_chunks(tmp_path):
+    path = str(tmp_path / 'col.obj')
+    rng = np.random.default_rng(0)
+    vertices = rng.random((200, 3))
+    colors = rng.random((200, 3))
+    faces = rng.integers(0, 200, (300, 3))
+    _write_colored(path, vertices, colors, faces, bad_line=150)
+    # Small chunks: some have only faces, one needs the line by line parse
+    mesh = obj.read(path, chunk_size=2000)
+    single = obj.read(path)
+    assert mesh['vertices'].shape == (200, 3)
+    assert np.allclose(mesh['colors'], colors, atol=1e-6)
+    assert np.array_equal(mesh['faces'], faces)
+    assert np.isnan(mesh['vertices'][150, 2])
+    assert np.allclose(np.nan_to_num(mesh['vertices']), np.nan_to_num(single['vertices']))
+
+
+def test_read_polygon_order(tmp_path):
+    path = str(tmp_path / 'poly.obj')
+    with open(path, 'w') as obj_file:
+        obj_file.write(''.join('v %d 0 0\n' % index for index in range(6)))
+        obj_file.write('usemtl red\nf 1 2 3 4\nf 1 2 3\n'
+                       'usemtl blue\nf 1 2 3 4 5\nusemtl red\nf 2 3 4 5 6\n')
+    mesh = obj.read(path)
+    assert mesh['faces'].tolist() == [[0, 1, 2], [0, 2, 3], [0, 1, 2],
+                                      [0, 1, 2], [0, 2, 3], [0, 3, 4],
+                                      [1, 2, 3], [1, 3, 4], [1, 4, 5]]
+    assert mesh['materials'] == ['red', 'blue']
+    assert mesh['face_materials'].tolist() == [0, 0, 0, 1, 1, 1, 0, 0, 0]
+
+
+def test_sanitize(tmp_path):
+    path = str(tmp_path / 'bad.obj')
+    vertices = np.float32([[0, 0, 0], [1e-5, 0, 0], [0, 1.234567e-5, 0], [0, 0, 1e-5]])
+    with open(path, 'w') as obj_file:
+        obj_file.write('# MeshMixer output\n')
+        for index, vertex in enumerate(vertices):
+            obj_file.write('v %r %r %r\n' % tuple(map(float, vertex)))
+            if index == 1:
+                obj_file.write('v -1.#IND 0 0\n')
+        obj_file.write('vn 0 0 1\nvn nan 0 1\n')
+        obj_file.write('f 1//1 2//1 4//1\nf 1 4 2\nf 2 4 5//2\nf 1 3 5\n')
+    stats = obj.sanitize(path)
+    assert stats == {'vertices': 1, 'normals': 1, 'uvs': 0, 'faces': 1, 'small_faces': 0}
+    with open(path) as obj_file:
+        lines = obj_file.read().splitlines()
+    assert lines[0] == '# MeshMixer output'
+    assert [line for line in lines if line.startswith('f ')] == [
+        'f 1//1 2//1 3//1', 'f 1 3 2', 'f 2 3 4']
+    # Small values keep their single precision
+    mesh = obj.read(path)
+    assert np.array_equal(mesh['vertices'], vertices)
+    assert len(mesh['normals']) == 1
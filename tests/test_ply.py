@@ -0,0 +1,43 @@
+"""Tests for ply"""
+
+import numpy as np
+
+from pylirious import ply
+
+
+def _write_binary(path, faces, texcoords=False):
+    """Binary PLY with polygon faces and optional per face texcoord lists"""
+    header = ['ply', 'format binary_little_endian 1.0', 'element vertex 5',
+              'property float x', 'property float y', 'property float z',
+              'element face %d' % len(faces), 'property list uchar int vertex_indices']
+    if texcoords:
+        header.append('property list uchar float texcoord')
+    header.append('end_header')
+    with open(path, 'wb') as ply_file:
+        ply_file.write(('\n'.join(header) + '\n').encode())
+        ply_file.write(np.arange(15, dtype='<f4').tobytes())
+        for face in faces:
+            ply_file.write(np.uint8(len(face)).tobytes() + np.array(face, '<i4').tobytes())
+            if texcoords:
+                ply_file.write(np.uint8(2 * len(face)).tobytes() +
+                               np.arange(2 * len(face), dtype='<f4').tobytes())
+
+
+def test_binary_quads(tmp_path):
+    path = str(tmp_path / 'quads.ply')
+    _write_binary(path, [[0, 1, 2, 3], [1, 2, 3, 4]], texcoords=True)
+    mesh = ply.read(path)
+    assert mesh['faces'].tolist() == [[0, 1, 2], [0, 2, 3], [1, 2, 3], [1, 3, 4]]
+    assert mesh['elements']['face']['texcoord'].shape == (2, 8)
+
+
+def test_binary_mixed_polygons(tmp_path):
+    path = str(tmp_path / 'mixed.ply')
+    faces = [[0, 1, 2], [0, 1, 2, 3], [1, 2, 3, 4, 0], [2, 3, 4]]
+    _write_binary(path, faces, texcoords=True)
+    face = ply.read(path)['elements']['face']
+    assert face['vertex_indices_count'].tolist() == [3, 4, 5, 3]
+    assert face['vertex_indices'][2].tolist() == [1, 2, 3, 4, 0, -1, -1, -1, -1, -1]
+    assert face['vertex_indices'][0].tolist()[:4] == [0, 1, 2, -1]
+    assert face['texcoord'][1].tolist()[:9] == [0, 1, 2, 3, 4, 5, 6, 7, -1]
+    assert len(ply.read(path)['faces']) == 1 + 2 + 3 + 1
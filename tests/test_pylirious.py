@@ -0,0 +1,70 @@
+"""Tests for pylirious.pylirious"""
+
+import asyncio
+import os
+import sys
+import stat
+
+import pylirious
+from pylirious import aiolirious
+
+# Stand-in for openscad: writes the -o file with the -D constants
+FAKE_OPENSCAD = '''#!%s
+import sys
+args = sys.argv[1:]
+with open(args[args.index('-o') + 1], 'w') as out:
+    out.write(' '.join(args))
+'''
+
+
+def _fake_openscad(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    program = bin_dir / 'openscad'
+    program.write_text(FAKE_OPENSCAD % sys.executable)
+    program.chmod(program.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ['PATH'])
+
+
+def test_render_scad_sweep_twice(tmp_path, monkeypatch):
+    _fake_openscad(tmp_path, monkeypatch)
+    script = str(tmp_path / 'box.scad')
+    open(script, 'w').close()
+    file_out = str(tmp_path / 'box_{width}_{size[0]}.stl')
+    limit = aiolirious.LIMITS['openscad']
+    # More variants than processes, in two event loops
+    first = pylirious.render_scad_sweep(
+        script, {'width': [1, 2, 3], 'size': [(1, 2), (3, 4)]},
+        file_out=file_out, log=str(tmp_path / 'log.txt'), processes=2)
+    assert [variant['return_code'] for variant in first] == [0] * 6
+    assert all(os.path.isfile(variant['file_out']) for variant in first)
+    mtimes = [os.path.getmtime(variant['file_out']) for variant in first]
+    assert aiolirious.LIMITS['openscad'] == limit
+
+    # Same constants (tuples included): nothing is rendered again
+    second = pylirious.render_scad_sweep(
+        script, {'width': [1, 2, 3], 'size': [(1, 2), (3, 4)]},
+        file_out=file_out, log=str(tmp_path / 'log.txt'), processes=2)
+    assert [variant['return_code'] for variant in second] == [0] * 6
+    assert [os.path.getmtime(variant['file_out']) for variant in second] == mtimes
+
+    third = pylirious.render_scad_sweep(
+        script, {'width': [1, 2, 3], 'size': [(1, 2), (3, 4)]},
+        file_out=file_out, log=str(tmp_path / 'log.txt'), processes=2, force=True)
+    assert [variant['return_code'] for variant in third] == [0] * 6
+    assert aiolirious.LIMITS['openscad'] == limit
+
+
+def test_render_scad_default_file_out(tmp_path, monkeypatch):
+    _fake_openscad(tmp_path, monkeypatch)
+    script = str(tmp_path / 'box.scad')
+    open(script, 'w').close()
+    variants = pylirious.render_scad_sweep(
+        script, [{'width': 1}, {'width': 2}], log=str(tmp_path / 'log.txt'))
+    assert [variant['file_out'] for variant in variants] == [
+        str(tmp_path / 'box_0.stl'), str(tmp_path / 'box_1.stl')]
+    assert all(os.path.isfile(variant['file_out']) for variant in variants)
+
+    assert asyncio.run(aiolirious.render_scad(
+        script=script, log=str(tmp_path / 'log.txt'))) == 0
+    assert os.path.isfile(str(tmp_path / 'box.stl'))
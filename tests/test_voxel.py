@@ -0,0 +1,49 @@
+"""Tests for voxel and bvh"""
+
+import warnings
+
+import numpy as np
+import pytest
+
+from pylirious import bvh, voxel
+from pylirious.mesh import Mesh
+
+CUBE_VERTICES = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+                          [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]], dtype=np.float32) * 10
+CUBE_FACES = np.array([[0, 2, 1], [0, 3, 2], [4, 5, 6], [4, 6, 7], [0, 1, 5], [0, 5, 4],
+                       [1, 2, 6], [1, 6, 5], [2, 3, 7], [2, 7, 6], [3, 0, 4], [3, 4, 7]])
+
+
+def _sorted_triangles(mesh):
+    """Corner positions of each face, in an order independent of indices"""
+    tris = np.round(mesh.vertices[mesh.faces].reshape(len(mesh.faces), -1), 4)
+    return tris[np.lexsort(tris.T[::-1])]
+
+
+@pytest.mark.parametrize('offset, solid_resolution, mesh_resolution',
+                         [(0.5, 20, 20), (-2.0, 20, 20), (1.0, 20, 28), (3.0, 20, 28)])
+def test_make_solid_in_slabs(offset, solid_resolution, mesh_resolution):
+    mesh = Mesh(CUBE_VERTICES, CUBE_FACES)
+    grid, origin, spacing = voxel.signed_distance_grid(mesh, solid_resolution, offset,
+                                                       chunk_size=1000)
+    if mesh_resolution != solid_resolution:
+        grid, origin, spacing = voxel.resample(grid, origin, spacing, mesh_resolution, 1000,
+                                               offset)
+        # Spacing of the mesh (not the padded grid) at mesh_resolution
+        assert spacing * mesh_resolution == pytest.approx(10, abs=10 / solid_resolution)
+    whole = voxel.marching_tetrahedra(grid, origin, spacing, offset, chunk_size=1000)
+    solid = voxel.make_solid(mesh, offset, solid_resolution, mesh_resolution, chunk_size=3)
+    # Same surface; only the order of the faces depends on the slabs
+    assert solid.faces.shape == whole.faces.shape
+    assert np.allclose(_sorted_triangles(solid), _sorted_triangles(whole), atol=1e-5)
+    extent = solid.vertices.max(axis=0) - solid.vertices.min(axis=0)
+    assert np.allclose(extent, 10 + 2 * offset, atol=0.2)
+
+
+def test_ray_parallel_to_face():
+    tree = bvh.BVH(CUBE_VERTICES, CUBE_FACES)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        distance, face = tree.ray_cast([[5, 5, -5], [-5, 5, 5]], [[1, 1, 0], [1, 0, 0]])
+    assert distance[0] == np.inf and face[0] == -1
+    assert distance[1] == pytest.approx(5)
@@ -0,0 +1,54 @@
+"""Tests for pylirious.write_bpy"""
+
+from pylirious import write_bpy
+
+
+def _calls(script):
+    """ Return the bpylirious calls written to script after begin """
+    with open(script) as script_file:
+        lines = script_file.read().splitlines()
+    return [line for line in lines
+            if line.startswith('bpylirious.') and line != 'bpylirious.begin()']
+
+
+def test_coalesce_transforms(tmp_path):
+    script = str(tmp_path / 'script.py')
+    write_bpy.begin(script=script, coalesce_transforms=True)
+    write_bpy.rotate(script=script, mesh_object='mesh', axis='z', angle=90)
+    write_bpy.translate(script=script, mesh_object='mesh', value=(1, 2, 3))
+    write_bpy.scale(script=script, mesh_object='mesh', value=(2, 2, 2))
+    # Nothing is lost when the script ends with a transform
+    calls = _calls(script)
+    assert len(calls) == 1
+    assert calls[0].startswith('bpylirious.transform(')
+    assert 'mesh_object=mesh' in calls[0]
+    assert ('matrix=bpylirious.scale_matrix(value=(2, 2, 2)) * '
+            'bpylirious.translation_matrix(value=(1, 2, 3)) * '
+            'bpylirious.rotation_matrix(axis="z", angle=90)') in calls[0]
+
+
+def test_coalesce_flushes_on_new_object(tmp_path):
+    script = str(tmp_path / 'script.py')
+    write_bpy.begin(script=script, coalesce_transforms=True)
+    write_bpy.rotate(script=script, mesh_object='first', axis='x', angle=10)
+    write_bpy.rotate(script=script, mesh_object='second', axis='y', angle=20)
+    write_bpy.export_mesh(script=script, mesh_object='second', file_out='out.stl')
+    write_bpy.translate(script=script, mesh_object='second', value=(0, 0, 1))
+    calls = _calls(script)
+    assert len(calls) == 4
+    assert 'mesh_object=first' in calls[0] and 'angle=10' in calls[0]
+    assert 'mesh_object=second' in calls[1] and 'angle=20' in calls[1]
+    assert calls[2].startswith('bpylirious.export_mesh(')
+    assert calls[3].startswith('bpylirious.transform(')
+    assert 'rotation_matrix' not in calls[3]
+
+
+def test_begin_restarts_script(tmp_path):
+    script = str(tmp_path / 'script.py')
+    write_bpy.begin(script=script, coalesce_transforms=True)
+    write_bpy.rotate(script=script, mesh_object='mesh', axis='z', angle=90)
+    write_bpy.begin(script=script)
+    write_bpy.scale(script=script, mesh_object='mesh', value=(2, 2, 2))
+    calls = _calls(script)
+    assert len(calls) == 1
+    assert calls[0].startswith('bpylirious.scale(')